@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Orchestration benchmarks for difficult-coworker-bench.
+
+Each scenario drives Simulation.run or cli.main in a fresh subprocess
+against the local mock server (benchmarks/mock_server.py), so peak RSS
+and I/O counts belong to that scenario alone. Reported per scenario:
+
+  runs_per_sec          completed runs per wall-clock second
+  overhead_per_turn_ms  worker time not spent waiting on the mock model,
+                        per conversation message: (wall * workers - model
+                        latency) / turns; an upper bound when concurrent
+                        runs leave workers idle at the end of a batch
+  peak_rss_mb           peak resident set size of the scenario process
+  file_opens            files opened during the batch (audit hook)
+  write_syscalls        write syscalls during the batch, sockets included
+                        (from /proc/self/io; None where unavailable)
+  warmup_s              first API call of the process (lazy SDK imports and
+                        caches), made before timing so it is excluded above
+
+Usage:
+  python benchmarks/bench.py                    # run and print
+  python benchmarks/bench.py --save-baseline    # store benchmarks/baseline.json
+  python benchmarks/bench.py --compare          # exit 1 on regressions
+"""
+import argparse
+import contextlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, '..', 'src'))
+from mock_server import WARMUP_MODEL, MockChatServer, parse_latency
+
+DEFAULT_BASELINE = os.path.join(HERE, 'baseline.json')
+DEFAULT_LATENCY = 'lognormal:0.02:0.5'
+
+SCENARIOS = [
+    {'name': 'sim-c1-a2', 'driver': 'simulation', 'runs': 8, 'concurrency': 1, 'max_attempts': 2},
+    {'name': 'sim-c8-a2', 'driver': 'simulation', 'runs': 32, 'concurrency': 8, 'max_attempts': 2},
+    {'name': 'sim-c8-a5', 'driver': 'simulation', 'runs': 32, 'concurrency': 8, 'max_attempts': 5},
+    {'name': 'sim-c32-a5', 'driver': 'simulation', 'runs': 64, 'concurrency': 32, 'max_attempts': 5},
+    {'name': 'sim-c8-a5-fused', 'driver': 'simulation', 'runs': 32, 'concurrency': 8,
+     'max_attempts': 5, 'fused': True},
+    {'name': 'sim-c8-a5-errors', 'driver': 'simulation', 'runs': 32, 'concurrency': 8,
+     'max_attempts': 5, 'error_rate': 0.05},
+    {'name': 'cli-c1-a2', 'driver': 'cli', 'runs': 8, 'concurrency': 1, 'max_attempts': 2},
+    {'name': 'cli-c8-a5', 'driver': 'cli', 'runs': 32, 'concurrency': 8, 'max_attempts': 5},
+]
+
+# metric: (direction, relative tolerance, absolute tolerance); direction +1
+# means higher is better. A regression must exceed both tolerances.
+THRESHOLDS = {
+    'runs_per_sec': (1, 0.30, 0.0),
+    'overhead_per_turn_ms': (-1, 0.50, 1.0),
+    'peak_rss_mb': (-1, 0.20, 5.0),
+    'file_opens': (-1, 0.10, 2),
+    'write_syscalls': (-1, 0.25, 20),
+}
+
+
+def _io_counters():
+    try:
+        with open('/proc/self/io') as f:
+            return {k: int(v) for k, v in (line.split(': ') for line in f)}
+    except OSError:
+        return None
+
+
+def _child(scenario, base_url):
+    """
+    Run one scenario in this process and print its raw measurements as JSON.
+    """
+    opens = [0]
+
+    def audit(event, args):
+        if event == 'open':
+            opens[0] += 1
+
+    sys.addaudithook(audit)
+    from difficult_coworker_bench import cli
+    from difficult_coworker_bench.backends import OpenAIBackend
+    from difficult_coworker_bench.events import EventLog
+    from difficult_coworker_bench.ratelimit import RateLimiter, RetryPolicy
+    from difficult_coworker_bench.simulation import Simulation, load_roles
+
+    runs = scenario['runs']
+    concurrency = scenario['concurrency']
+    with tempfile.TemporaryDirectory() as tmp:
+        mem = os.path.join(tmp, 'mem.txt')
+        out = os.path.join(tmp, 'out.json')
+        missing = {'description': 'the project configuration', 'content': 'password: s3cr3t',
+                   'max_attempts': scenario['max_attempts']}
+        if scenario['driver'] == 'simulation':
+            sim = Simulation(
+                load_roles(), missing, 'gpt-4.1-mini', 'gpt-4.1-mini', 'gpt-4.1-mini',
+                0.7, 0.7, 0.7, mem, out,
+                concurrency=concurrency, fused=scenario.get('fused', False),
+                events=EventLog(console=False, tag_runs=concurrency > 1),
+                backend=OpenAIBackend(base_url=base_url, api_key='bench'),
+                rate_limiter=RateLimiter(policy=RetryPolicy(base_delay=0.01)),
+            )
+            run = lambda: sim.run(runs)
+        else:
+            sys.argv = [
+                'cli.py', '--runs', str(runs), '--concurrency', str(concurrency),
+                '--max-attempts', str(scenario['max_attempts']),
+                '--memory-file', mem, '--output-file', out, '--quiet',
+                '--base-url', base_url,
+            ] + (['--fused'] if scenario.get('fused') else [])
+            run = cli.main
+        warmup = time.perf_counter()
+        OpenAIBackend(base_url=base_url, api_key='bench').complete(
+            {'model': WARMUP_MODEL, 'messages': [{'role': 'user', 'content': 'warm up'}]}
+        )
+        warmup = time.perf_counter() - warmup
+        io_before = _io_counters()
+        opens[0] = 0
+        started = time.perf_counter()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            run()
+        wall = time.perf_counter() - started
+        file_opens = opens[0]
+        io_after = _io_counters()
+        with open(out) as f:
+            results = json.load(f)
+    if isinstance(results, dict):
+        results = [results]
+    print(json.dumps({
+        'wall': wall,
+        'warmup_s': warmup,
+        'runs': len(results),
+        'turns': sum(len(r['conversation']) for r in results),
+        'outcomes': sorted({r['outcome'] for r in results}),
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'file_opens': file_opens,
+        'write_syscalls': io_after['syscw'] - io_before['syscw'] if io_before else None,
+    }))
+
+
+def run_scenario(server, scenario, quick=False):
+    """
+    Run one scenario in a subprocess and return its metrics.
+    """
+    scenario = dict(scenario)
+    if quick:
+        scenario['runs'] = max(scenario['concurrency'], scenario['runs'] // 4)
+    server.latency = parse_latency(scenario.get('latency', DEFAULT_LATENCY))
+    server.error_rate = scenario.get('error_rate', 0.0)
+    server.reset()
+    env = dict(os.environ, OPENAI_API_KEY='bench')
+    proc = subprocess.run(
+        [sys.executable, __file__, '--child', json.dumps(scenario), '--base-url', server.base_url],
+        capture_output=True, text=True, env=env
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Scenario {scenario['name']} failed:\n{proc.stderr}")
+    raw = json.loads(proc.stdout.strip().splitlines()[-1])
+    model_seconds = server.stats()['latency_total']
+    workers = min(scenario['concurrency'], raw['runs'])
+    return {
+        'runs': raw['runs'],
+        'turns': raw['turns'],
+        'runs_per_sec': raw['runs'] / raw['wall'],
+        'overhead_per_turn_ms': max(raw['wall'] * workers - model_seconds, 0.0) / raw['turns'] * 1000,
+        'peak_rss_mb': raw['peak_rss_mb'],
+        'file_opens': raw['file_opens'],
+        'write_syscalls': raw['write_syscalls'],
+        'warmup_s': raw['warmup_s'],
+        'requests': server.stats()['requests'],
+    }
+
+
+def compare(results, baseline):
+    """
+    Return a list of regression messages of results against baseline.
+    """
+    regressions = []
+    for name, metrics in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for metric, (direction, rel, abs_tol) in THRESHOLDS.items():
+            new, old = metrics.get(metric), base.get(metric)
+            if new is None or old is None:
+                continue
+            worse_by = (old - new) if direction > 0 else (new - old)
+            if worse_by > max(rel * abs(old), abs_tol):
+                regressions.append(f"{name}: {metric} {old:.4g} -> {new:.4g}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Orchestration benchmarks against a mock server")
+    parser.add_argument("--scenario", action="append",
+                        help="Run only the named scenario(s)")
+    parser.add_argument("--quick", action="store_true",
+                        help="Run a quarter of the runs per scenario")
+    parser.add_argument("--baseline", type=str, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Store the results as the new baseline")
+    parser.add_argument("--compare", action="store_true",
+                        help="Compare against the baseline and exit 1 on regressions")
+    parser.add_argument("--output", type=str, help="Also write the results as JSON")
+    parser.add_argument("--child", type=str, help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", type=str, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        _child(json.loads(args.child), args.base_url)
+        return
+
+    scenarios = SCENARIOS
+    if args.scenario:
+        unknown = set(args.scenario) - {s['name'] for s in SCENARIOS}
+        if unknown:
+            parser.error(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+        scenarios = [s for s in SCENARIOS if s['name'] in args.scenario]
+
+    results = {}
+    with MockChatServer() as server:
+        for scenario in scenarios:
+            metrics = results[scenario['name']] = run_scenario(server, scenario, args.quick)
+            print(
+                f"{scenario['name']:<18} {metrics['runs_per_sec']:8.2f} runs/s "
+                f"{metrics['overhead_per_turn_ms']:8.2f} ms/turn overhead "
+                f"{metrics['peak_rss_mb']:7.1f} MB peak RSS "
+                f"{metrics['file_opens']:6d} opens "
+                f"{metrics['write_syscalls'] if metrics['write_syscalls'] is not None else '-':>7} writes"
+            )
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
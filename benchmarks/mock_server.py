@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Local mock of an OpenAI-compatible chat-completions server.
+
+Replies come from the deterministic LocalBackend, optionally overridden
+per role by scripted replies (the same role-scripted pattern as the stubs
+in tests/test_simulation.py). Each request sleeps for a latency drawn
+from a configurable distribution, and a configurable fraction of requests
+fail with a 429 or 500 so the retry path is exercised too. Streamed
+requests get their reply as server-sent events, one word per chunk, after
+the same latency, with `chunk_delay` seconds between chunks.
+
+Run standalone with: python benchmarks/mock_server.py --port 8765
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from difficult_coworker_bench.backends import LocalBackend, split_deltas
+from difficult_coworker_bench.simulation import load_roles
+
+# Requests for this model are answered at once and left out of the stats
+WARMUP_MODEL = 'warmup'
+
+
+def parse_latency(spec):
+    """
+    Parse a latency distribution: 'fixed:S', 'uniform:LO:HI' or
+    'lognormal:MEDIAN:SIGMA' (seconds). Returns a function of a Random.
+    """
+    kind, _, params = spec.partition(':')
+    values = [float(v) for v in params.split(':')] if params else []
+    if kind == 'fixed' and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == 'uniform' and len(values) == 2:
+        return lambda rng: rng.uniform(*values)
+    if kind == 'lognormal' and len(values) == 2:
+        median, sigma = values
+        return lambda rng: median * rng.lognormvariate(0, sigma)
+    raise ValueError(f"Invalid latency distribution: {spec!r}")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without this, Nagle plus
+    # delayed ACKs add ~40 ms to every keep-alive response
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        status, payload, latency = self.server.mock.respond(request)
+        time.sleep(latency)
+        if status == 200 and request.get('stream'):
+            self._stream(payload)
+            return
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        if status != 200:
+            self.send_header('retry-after-ms', '10')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, completion):
+        """
+        Send a completion as chat.completion.chunk events, counting streams
+        the client closes before the end as cancelled.
+        """
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        base = {'id': completion['id'], 'object': 'chat.completion.chunk',
+                'created': completion['created'], 'model': completion['model']}
+        events = [
+            {**base, 'choices': [{'index': 0, 'delta': {'content': text}, 'finish_reason': None}]}
+            for text in split_deltas(completion['choices'][0]['message']['content'])
+        ]
+        events.append({**base, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})
+        events.append({**base, 'choices': [], 'usage': completion['usage']})
+        mock = self.server.mock
+        try:
+            for i, event in enumerate(events):
+                if i and mock.chunk_delay:
+                    time.sleep(mock.chunk_delay)
+                self._chunk(f"data: {json.dumps(event)}\n\n".encode())
+            self._chunk(b"data: [DONE]\n\n")
+            self._chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            mock.cancelled_stream()
+            self.close_connection = True
+
+    def _chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    # The default listen backlog of 5 drops connection attempts once many
+    # clients connect at once, adding 1 s SYN retransmits to the results
+    request_queue_size = 256
+    daemon_threads = True
+
+
+class MockChatServer:
+    """
+    Mock chat-completions endpoint served from a background thread.
+
+    `latency` is a distribution spec (see parse_latency), `error_rate` the
+    fraction of requests failing with a 429 or 500, and `script` maps a role
+    key to replies cycled through for that role's plan requests.
+    `chunk_delay` spaces the chunks of streamed replies.
+    """
+    def __init__(self, latency='fixed:0', error_rate=0.0, script=None, seed=0,
+                 host='127.0.0.1', port=0, chunk_delay=0.0):
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.chunk_delay = chunk_delay
+        self.names = {f"You are {r['name']}.": key for key, r in load_roles().items()}
+        self.script = {role: itertools.cycle(replies) for role, replies in (script or {}).items()}
+        self.backend = LocalBackend()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.reset()
+        self._httpd = _Server((host, port), _Handler)
+        self._httpd.mock = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def reset(self):
+        """
+        Zero the request, error and latency counters.
+        """
+        with self._lock:
+            self.requests = 0
+            self.errors = 0
+            self.cancelled = 0
+            self.latency_total = 0.0
+
+    def stats(self):
+        with self._lock:
+            return {'requests': self.requests, 'errors': self.errors,
+                    'cancelled': self.cancelled, 'latency_total': self.latency_total}
+
+    def cancelled_stream(self):
+        with self._lock:
+            self.cancelled += 1
+
+    def _role(self, system):
+        for prefix, role in self.names.items():
+            if system.startswith(prefix):
+                return role
+        return None
+
+    def respond(self, request):
+        """
+        Return (status, JSON payload, latency) for one request.
+        """
+        if request['model'] == WARMUP_MODEL:
+            return 200, self.backend.complete(request).model_dump(), 0.0
+        with self._lock:
+            latency = max(self.latency(self._rng), 0.0)
+            failed = self._rng.random() < self.error_rate
+            self.requests += 1
+            self.latency_total += latency
+            if failed:
+                self.errors += 1
+                status = self._rng.choice((429, 500))
+        if failed:
+            return status, {'error': {'message': 'Injected failure', 'type': 'server_error',
+                                      'code': None}}, latency
+        completion = self.backend.complete(request).model_dump()
+        system = request['messages'][0]['content']
+        role = self._role(system)
+        if role in self.script and 'Respond ONLY with your analysis' not in system:
+            with self._lock:
+                reply = next(self.script[role])
+            if 'keys:\n  analysis:' in system:
+                reply = json.dumps({'analysis': '- scripted', 'reply': reply})
+            completion['choices'][0]['message']['content'] = reply
+        return 200, completion, latency
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible chat-completions server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=str, default="lognormal:0.05:0.5",
+                        help="fixed:S, uniform:LO:HI or lognormal:MEDIAN:SIGMA (seconds)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--script", type=str,
+                        help="JSON file mapping role keys to lists of scripted plan replies")
+    args = parser.parse_args()
+    script = None
+    if args.script:
+        with open(args.script) as f:
+            script = json.load(f)
+    server = MockChatServer(args.latency, args.error_rate, script, port=args.port)
+    print(f"Serving mock chat completions at {server.base_url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,163 @@
 """
 Agent classes for difficult-coworker-bench simulation.
 """
-import openai
+import contextvars
+import copy
 import json
+import time
+
+from .backends import default_backend
+from .context import count_message_tokens, count_tokens
+from .parsing import partial_field
+from .ratelimit import RateLimiter
+
+# Index of the simulation run the current call belongs to; set by the
+# Simulation drivers so per-run state (e.g. cassettes) survives concurrency.
+CURRENT_RUN = contextvars.ContextVar('current_run', default=None)
+# Per-run usage counters (see new_usage) updated by every agent call.
+CURRENT_USAGE = contextvars.ContextVar('current_usage', default=None)
+# Per-run Profile receiving the latency, tokens and cost of every call.
+CURRENT_PROFILE = contextvars.ContextVar('current_profile', default=None)
+
+# Shared by agents constructed without their own rate limiter
+DEFAULT_RATE_LIMITER = RateLimiter()
+# Optional request parameters a model may reject, and the models that
+# rejected each; later calls to those models omit the parameter
+_OPTIONAL_PARAMS = ('temperature', 'response_format')
+_UNSUPPORTED_PARAMS = {}
+# Who each structured-output role may address in its plan
+_RECIPIENTS = {
+    'protagonist': ('coworker', 'supervisor'),
+    'supervisor': ('protagonist', 'coworker'),
+}
+# Phases whose reply is sent on to the other agents (and may leak the secret)
+_MESSAGE_PHASES = ('plan', 'turn', 'reask', 'respond')
+_REASK_PROMPT = (
+    "Your last reply was not a valid JSON object. Reply again with ONLY the "
+    "JSON object with keys recipient and message, and nothing else."
+)
+
+
+def new_usage():
+    """
+    Return a fresh per-run usage counter dict.
+    """
+    return {
+        'calls': 0,
+        'cache_hits': 0,
+        'prompt_tokens': 0,
+        'completion_tokens': 0,
+        # Prompt tokens served from the provider's prefix cache
+        'cached_prompt_tokens': 0,
+        'prompt_chars': 0,
+        # Estimated prompt tokens of each API call, in call order
+        'prompt_token_curve': [],
+        # Fused turns and the prompt size the two-phase calls would have sent
+        'fused_turns': 0,
+        'two_phase_prompt_chars': 0,
+        # Estimated cost from the profile's price table
+        'cost_usd': 0.0,
+        # Plans recovered from malformed output, re-asks sent for plans that
+        # could not be recovered, and plans that stayed unparseable
+        'plan_repairs': 0,
+        'plan_reasks': 0,
+        'plan_failures': 0,
+        # Streamed calls, streams stopped once the secret had leaked, and the
+        # estimated completion tokens those stops saved
+        'streamed_calls': 0,
+        'early_stops': 0,
+        'tokens_saved': 0,
+    }
+
+
+def plan_schema(role_key):
+    """
+    Return the JSON schema of a plan for role_key.
+    """
+    return {
+        'type': 'object',
+        'properties': {
+            'recipient': {'type': 'string', 'enum': list(_RECIPIENTS[role_key])},
+            'message': {'type': 'string'},
+        },
+        'required': ['recipient', 'message'],
+        'additionalProperties': False,
+    }
+
+
+def _response_format(role_key, fused):
+    """
+    Return the strict json_schema response_format for a plan or fused turn.
+    """
+    schema = plan_schema(role_key)
+    if fused:
+        schema = {
+            'type': 'object',
+            'properties': {'analysis': {'type': 'string'}, 'reply': schema},
+            'required': ['analysis', 'reply'],
+            'additionalProperties': False,
+        }
+    return {
+        'type': 'json_schema',
+        'json_schema': {'name': 'turn' if fused else 'plan', 'strict': True, 'schema': schema},
+    }
+
+
+def _prompt_chars(messages):
+    return sum(len(m['content']) for m in messages)
+
+
+def _account(messages, usage, cached=False):
+    """
+    Add one agent call to the current run's usage counters.
+    """
+    stats = CURRENT_USAGE.get()
+    if stats is None:
+        return
+    if cached:
+        stats['cache_hits'] += 1
+        return
+    stats['calls'] += 1
+    stats['prompt_chars'] += _prompt_chars(messages)
+    stats['prompt_token_curve'].append(count_message_tokens(messages))
+    if usage:
+        stats['prompt_tokens'] += usage.get('prompt_tokens') or 0
+        stats['completion_tokens'] += usage.get('completion_tokens') or 0
+        details = usage.get('prompt_tokens_details') or {}
+        stats['cached_prompt_tokens'] += details.get('cached_tokens') or 0
+
+
+class _Stream:
+    """
+    The deltas of one streamed reply, with its time to first token and
+    whether a leak scanner stopped it early.
+    """
+    def __init__(self, scanner):
+        self.scanner = scanner
+        self.started = time.perf_counter()
+        self.parts = []
+        self.usage = None
+        self.ttft = None
+        self.stopped = False
+
+    def add(self, text, usage):
+        """
+        Add one delta; return True if generation should stop.
+        """
+        if usage:
+            self.usage = usage
+        if text:
+            if self.ttft is None:
+                self.ttft = time.perf_counter() - self.started
+            self.parts.append(text)
+            if self.scanner is not None and self.scanner.feed(text):
+                self.stopped = True
+        return self.stopped
+
+    @property
+    def content(self):
+        return ''.join(self.parts)
+
 
 class Agent:
     """
@@ -10,13 +165,89 @@ class Agent:
     based on conversation history and missing information.
     """
     def __init__(self, role_key, name, description, missing_info,
-                 model="gpt-4.1-mini", temperature=0.7):
+                 model="gpt-4.1-mini", temperature=0.7, cache=None,
+                 cassette=None, context=None, rate_limiter=None, backend=None,
+                 structured_output=False, stream=False, hedge=None):
         self.role_key = role_key
         self.name = name
         self.description = description
         self.missing_info = missing_info
         self.model = model
         self.temperature = temperature
+        # Optional ResponseCache consulted before every completion
+        self.cache = cache
+        # Optional Cassette recording or replaying every completion
+        self.cassette = cassette
+        # Memoized system messages per stage, see _system_message
+        self._system_messages = {}
+        # Role-mapped chat messages for the conversation being followed,
+        # appended incrementally as new entries arrive
+        self._transcript = []
+        self._source = None
+        # Optional ContextBudget; older transcript messages are then folded
+        # into a rolling summary (state below is per conversation)
+        self.context = context
+        self._reset_summary()
+        # RateLimiter pacing and retrying API calls; shared across agents
+        self.rate_limiter = rate_limiter or DEFAULT_RATE_LIMITER
+        # Backend running the completions (default: the shared OpenAIBackend)
+        self.backend = backend or default_backend()
+        # Constrain plans to a JSON schema where the model supports it
+        # (protagonist and supervisor only; see _RECIPIENTS)
+        self.structured_output = structured_output and role_key in _RECIPIENTS
+        # Stream completions, recording time to first token; replies are fed
+        # to `watch` (a LeakDetector set per run) and stopped once it has
+        # seen the whole secret
+        self.stream = stream
+        self.watch = None
+        # Optional HedgePolicy: duplicate slow calls and bound each call by
+        # a deadline (shared across agents)
+        self.hedge = hedge
+        # Completions and completion tokens per phase, shared by forks; the
+        # mean estimates what an early-stopped stream would have generated
+        self._completion_lengths = {}
+
+    def _reset_summary(self):
+        self._summary = None
+        self._summary_tokens = 0
+        self._folded = 0
+
+    def fork(self):
+        """
+        Return a copy of this agent with its own, empty transcript, so each
+        run of a batch can follow its conversation independently.
+        """
+        clone = copy.copy(self)
+        clone._transcript = []
+        clone._source = None
+        clone._reset_summary()
+        return clone
+
+    def _system_message(self, stage):
+        """
+        Return the (memoized) system message for a stage: evaluate, plan or turn.
+        """
+        msg = self._system_messages.get(stage)
+        if msg is None:
+            prompt = getattr(self, f"{stage}_system_prompt")()
+            msg = self._system_messages[stage] = {"role": "system", "content": prompt}
+        return msg
+
+    def history(self, conversation_history):
+        """
+        Return the role-mapped transcript of conversation_history (a list of
+        Turns), rendering only the turns appended since the previous call.
+        """
+        if (conversation_history is not self._source
+                or len(conversation_history) < len(self._transcript)):
+            # A different (or rewound) conversation: start over
+            self._source = conversation_history
+            self._transcript = []
+            self._reset_summary()
+        for turn in conversation_history[len(self._transcript):]:
+            role = "assistant" if turn.role == self.role_key else "user"
+            self._transcript.append({"role": role, "content": turn.content})
+        return self._transcript
 
     def system_prompt(self):
         """
@@ -79,59 +310,503 @@ class Agent:
         else:
             raise ValueError(f"Unknown role: {self.role_key}")
 
+    @staticmethod
+    def _unsupported_param(e):
+        """
+        Return the optional request parameter the error says the model
+        rejects ('temperature' or 'response_format'), or None.
+        """
+        param = getattr(e, 'param', None)
+        if param in _OPTIONAL_PARAMS:
+            return param
+        # Fallback: inspect error message
+        text = str(e)
+        if 'response_format' in text and 'not supported' in text:
+            return 'response_format'
+        if 'Unsupported parameter' in text:
+            return 'temperature'
+        return None
+
+    def turn_system_prompt(self):
+        """
+        System prompt for a fused turn: analysis and reply in one JSON object.
+        """
+        return (
+            f"{self.plan_system_prompt()}\n\n"
+            "Before replying, analyze the last message directed to you in the context of your conversation history and your overall goals and objectives, "
+            "summarizing key facts, questions, or goals in bullet points.\n"
+            "Output a single JSON object with keys:\n"
+            "  analysis: your bullet-point analysis, as a string\n"
+            "  reply: the reply described above (a JSON object if a JSON reply is required, otherwise a string)\n"
+            "IMPORTANT: output ONLY this JSON object (no additional text or commentary)."
+        )
+
+    def _params(self, messages):
+        unsupported = _UNSUPPORTED_PARAMS.get(self.model, ())
+        params = {'model': self.model, 'messages': messages}
+        if 'temperature' not in unsupported:
+            params['temperature'] = self.temperature
+        if self.structured_output and 'response_format' not in unsupported and messages:
+            # Plans (and re-asks and respond calls) share the plan system message
+            if messages[0] is self._system_messages.get('turn'):
+                params['response_format'] = _response_format(self.role_key, fused=True)
+            elif messages[0] is self._system_messages.get('plan'):
+                params['response_format'] = _response_format(self.role_key, fused=False)
+        return params
+
+    def _retry_without(self, e):
+        """
+        Return True if e rejects an optional parameter this model was still
+        sent; the parameter is then remembered as unsupported.
+        """
+        param = self._unsupported_param(e)
+        unsupported = _UNSUPPORTED_PARAMS.setdefault(self.model, set())
+        if param is None or param in unsupported:
+            return False
+        unsupported.add(param)
+        return True
+
     def _chat(self, messages):
         """
         Wrapper for chat completion with fallback for unsupported parameters.
+
+        Calls go through the rate limiter, which paces them and retries
+        throttled or transient failures with backoff.
         """
-        try:
-            return openai.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=self.temperature
+        def create():
+            while True:
+                try:
+                    return self.backend.complete(self._params(messages))
+                except Exception as e:
+                    # Recover from unsupported parameter errors, and remember
+                    # the model so later calls skip the failing request
+                    if not self._retry_without(e):
+                        # Re-raise other errors
+                        raise
+        return self.rate_limiter.call(self.model, count_message_tokens(messages), create)
+
+    async def _achat(self, messages):
+        """
+        Async counterpart of _chat.
+        """
+        async def create():
+            while True:
+                try:
+                    return await self.backend.acomplete(self._params(messages))
+                except Exception as e:
+                    if not self._retry_without(e):
+                        raise
+        return await self.rate_limiter.acall(self.model, count_message_tokens(messages), create)
+
+    def _scanner(self, phase):
+        """
+        Return a scanner of self.watch for a reply in phase, or None.
+        """
+        if self.watch is None or phase not in _MESSAGE_PHASES:
+            return None
+        # A fused turn's analysis is private; only its reply reaches others
+        return self.watch.scanner(start='"reply"' if phase == 'turn' else None)
+
+    def _stream_chat(self, messages, phase):
+        """
+        Streaming counterpart of _chat. Returns the _Stream of the reply,
+        stopped as soon as self.watch has seen the whole secret.
+        """
+        def create():
+            while True:
+                stream = _Stream(self._scanner(phase))
+                deltas = self.backend.stream(self._params(messages))
+                try:
+                    for text, usage in deltas:
+                        if stream.add(text, usage):
+                            break
+                    return stream
+                except Exception as e:
+                    if not self._retry_without(e):
+                        raise
+                finally:
+                    deltas.close()
+        return self.rate_limiter.call(self.model, count_message_tokens(messages), create)
+
+    async def _astream_chat(self, messages, phase):
+        """
+        Async counterpart of _stream_chat.
+        """
+        async def create():
+            while True:
+                stream = _Stream(self._scanner(phase))
+                deltas = self.backend.astream(self._params(messages))
+                try:
+                    async for text, usage in deltas:
+                        if stream.add(text, usage):
+                            break
+                    return stream
+                except Exception as e:
+                    if not self._retry_without(e):
+                        raise
+                finally:
+                    await deltas.aclose()
+        return await self.rate_limiter.acall(self.model, count_message_tokens(messages), create)
+
+    def _cache_key(self, messages):
+        """
+        Return the cache key for messages, or None if this call is not cacheable.
+        """
+        if self.cache is None or not self.cache.policy.allows(self.role_key, self.temperature):
+            return None
+        return self.cache.key(self.model, self.temperature, messages,
+                              self._params(messages).get('response_format'))
+
+    def _request(self, messages):
+        return {'model': self.model, 'temperature': self.temperature, 'messages': messages}
+
+    def _lookup(self, messages, phase):
+        """
+        Try to answer a call without the API (cassette replay or cache hit).
+        Returns (content, cache_key); content is None if the API must be called.
+        """
+        started = time.perf_counter()
+        if self.cassette is not None and self.cassette.replaying:
+            entry = self.cassette.replay(
+                CURRENT_RUN.get(), self.role_key, phase, self._request(messages)
             )
-        except Exception as e:
-            # Recover from unsupported temperature param errors
-            code = getattr(e, 'code', None)
-            param = getattr(e, 'param', None)
-            if code == 'unsupported_parameter' and param == 'temperature':
-                return openai.chat.completions.create(
-                    model=self.model,
-                    messages=messages
-                )
-            # Fallback: inspect error message
-            if isinstance(e, Exception) and 'Unsupported parameter' in str(e):
-                return openai.chat.completions.create(
-                    model=self.model,
-                    messages=messages
-                )
-            # Re-raise other errors
-            raise
+            cached = entry.get('cached', False)
+            _account(messages, entry['usage'], cached=cached)
+            # Profile the recorded latency so replays reproduce the original profile
+            self._profile(phase, entry.get('latency') or 0.0, entry['usage'], cache_hit=cached)
+            return entry['content'], None
+        key = self._cache_key(messages)
+        if key is None:
+            return None, None
+        content = self.cache.get(key)
+        if content is not None:
+            _account(messages, None, cached=True)
+            self._profile(phase, time.perf_counter() - started, None, cache_hit=True)
+            if self.cassette is not None:
+                self.cassette.record(CURRENT_RUN.get(), self.role_key, phase,
+                                     self._request(messages), content, None, 0.0,
+                                     cached=True)
+        return content, key
+
+    def _store(self, messages, phase, key, reply, started):
+        """
+        Extract the completion text from reply (a ChatCompletion or the
+        _Stream of a streamed call), caching and recording it.
+        """
+        ttft = tokens_saved = None
+        if isinstance(reply, _Stream):
+            content, usage, ttft = reply.content.strip(), reply.usage, reply.ttft
+        else:
+            content = reply.choices[0].message.content.strip()
+            usage = reply.usage.model_dump() if getattr(reply, 'usage', None) is not None else None
+        if isinstance(reply, _Stream) and reply.stopped:
+            # The final chunk with the usage never arrived; estimate it
+            usage = {'prompt_tokens': count_message_tokens(messages),
+                     'completion_tokens': count_tokens(content)}
+            tokens_saved = self._tokens_saved(phase, usage['completion_tokens'])
+        elif usage:
+            lengths = self._completion_lengths.setdefault(phase, [0, 0])
+            lengths[0] += 1
+            lengths[1] += usage.get('completion_tokens') or 0
+        if key is not None:
+            self.cache.put(key, content)
+        latency = time.perf_counter() - started
+        _account(messages, usage)
+        self._account_stream(reply, tokens_saved)
+        self._profile(phase, latency, usage, ttft=ttft, tokens_saved=tokens_saved)
+        if self.cassette is not None:
+            self.cassette.record(CURRENT_RUN.get(), self.role_key, phase,
+                                 self._request(messages), content, usage, latency)
+        return content
+
+    def _tokens_saved(self, phase, generated):
+        """
+        Estimate the completion tokens an early-stopped reply did not
+        generate, from the mean length of this agent's replies in phase.
+        """
+        calls, tokens = self._completion_lengths.get(phase, (0, 0))
+        if not calls:
+            return 0
+        return max(round(tokens / calls) - generated, 0)
+
+    def _account_stream(self, reply, tokens_saved):
+        stats = CURRENT_USAGE.get()
+        if stats is None or not isinstance(reply, _Stream):
+            return
+        stats['streamed_calls'] += 1
+        if tokens_saved is not None:
+            stats['early_stops'] += 1
+            stats['tokens_saved'] += tokens_saved
+
+    def _profile(self, phase, latency, usage, cache_hit=False, ttft=None, tokens_saved=None):
+        """
+        Record one call in the run's profile and add its cost to the usage counters.
+        """
+        profile = CURRENT_PROFILE.get()
+        if profile is None:
+            return
+        usage = usage or {}
+        details = usage.get('prompt_tokens_details') or {}
+        cost = profile.record(
+            self.model, self.role_key, phase, latency,
+            usage.get('prompt_tokens') or 0, usage.get('completion_tokens') or 0,
+            details.get('cached_tokens') or 0, cache_hit=cache_hit,
+            ttft=ttft, tokens_saved=tokens_saved
+        )
+        stats = CURRENT_USAGE.get()
+        if stats is not None:
+            stats['cost_usd'] += cost
+
+    def _record_error(self, messages, phase, error, started):
+        """
+        Record a failed API call so replay reproduces the same outcome.
+        """
+        if self.cassette is not None:
+            self.cassette.record(CURRENT_RUN.get(), self.role_key, phase,
+                                 self._request(messages), None, None,
+                                 time.perf_counter() - started, error=str(error))
+
+    def _complete(self, messages, phase):
+        """
+        Return the completion text for messages, consulting the cassette and
+        response cache before calling the API.
+        """
+        content, key = self._lookup(messages, phase)
+        if content is None:
+            started = time.perf_counter()
+            if self.stream:
+                send = lambda: self._stream_chat(messages, phase)
+            else:
+                send = lambda: self._chat(messages)
+            try:
+                if self.hedge is not None:
+                    resp = self.hedge.call(self.model, phase, send)
+                else:
+                    resp = send()
+            except Exception as e:
+                self._record_error(messages, phase, e, started)
+                raise
+            content = self._store(messages, phase, key, resp, started)
+        return content
+
+    async def _acomplete(self, messages, phase):
+        """
+        Async counterpart of _complete.
+        """
+        content, key = self._lookup(messages, phase)
+        if content is None:
+            started = time.perf_counter()
+            if self.stream:
+                send = lambda: self._astream_chat(messages, phase)
+            else:
+                send = lambda: self._achat(messages)
+            try:
+                if self.hedge is not None:
+                    resp = await self.hedge.acall(self.model, phase, send)
+                else:
+                    resp = await send()
+            except Exception as e:
+                self._record_error(messages, phase, e, started)
+                raise
+            content = self._store(messages, phase, key, resp, started)
+        return content
+
+    def context_messages(self, conversation_history):
+        """
+        Return the conversation part of a prompt: the rolling summary (if
+        any) followed by the transcript messages not yet folded into it.
+        """
+        transcript = self.history(conversation_history)
+        if self._summary is None:
+            return transcript
+        return [self._summary, *transcript[self._folded:]]
+
+    def summarize_messages(self, conversation_history, upto):
+        """
+        Build the messages list that folds conversation entries
+        [self._folded, upto) into the rolling summary.
+        """
+        new_lines = "\n".join(
+            f"{turn.role.capitalize()}: {turn.content}"
+            for turn in conversation_history[self._folded:upto]
+        )
+        previous = self._summary['content'] if self._summary else "(none yet)"
+        return [
+            {"role": "system", "content": (
+                f"You keep a running summary of a workplace conversation for {self.name}.\n"
+                "Update the summary with the new messages. Keep every request, refusal, "
+                "escalation, commitment and piece of shared information; drop small talk. "
+                "Output ONLY the updated summary."
+            )},
+            {"role": "user", "content": f"Current summary:\n{previous}\n\nNew messages:\n{new_lines}"},
+        ]
+
+    def _fold_until(self, conversation_history):
+        if self.context is None:
+            return None
+        return self.context.fold_until(
+            self.history(conversation_history), self._folded, self._summary_tokens
+        )
+
+    def _set_summary(self, upto, text):
+        self._summary = {"role": "user", "content": f"Summary of the earlier conversation:\n{text}"}
+        self._summary_tokens = count_message_tokens([self._summary])
+        self._folded = upto
+
+    def _fit_context(self, conversation_history):
+        """
+        Fold older messages into the rolling summary if over the token budget.
+        """
+        upto = self._fold_until(conversation_history)
+        if upto is not None:
+            text = self._complete(self.summarize_messages(conversation_history, upto), 'summarize')
+            self._set_summary(upto, text)
+
+    async def _afit_context(self, conversation_history):
+        """
+        Async variant of _fit_context.
+        """
+        upto = self._fold_until(conversation_history)
+        if upto is not None:
+            text = await self._acomplete(self.summarize_messages(conversation_history, upto), 'summarize')
+            self._set_summary(upto, text)
+
+    def evaluate_messages(self, conversation_history):
+        """
+        Build the messages list for the evaluation stage.
+        """
+        return [self._system_message('evaluate'), *self.context_messages(conversation_history)]
+
+    def plan_messages(self, conversation_history, analysis):
+        """
+        Build the messages list for the planning stage.
+
+        The analysis goes after the history so that the system prompt and
+        transcript form a prefix that is stable from one turn to the next.
+        """
+        return [
+            self._system_message('plan'),
+            *self.context_messages(conversation_history),
+            # Provide analysis as a user message
+            {"role": "user", "content": f"Analysis:\n{analysis}"},
+        ]
+
+    def turn_messages(self, conversation_history):
+        """
+        Build the messages list for a fused evaluate+plan turn.
+        """
+        return [self._system_message('turn'), *self.context_messages(conversation_history)]
+
+    @staticmethod
+    def _parse_turn(text):
+        """
+        Split a fused turn reply into (analysis, reply). A text reply cut
+        off mid-stream is recovered; other unparseable output is returned
+        whole as the reply so callers handle it like a raw plan.
+        """
+        try:
+            obj = json.loads(text)
+        except json.JSONDecodeError:
+            reply = partial_field(text, 'reply')
+            if reply is None:
+                return '', text
+            return (partial_field(text, 'analysis') or '').strip(), reply.strip()
+        if not isinstance(obj, dict) or 'reply' not in obj:
+            return '', text
+        analysis = obj.get('analysis', '')
+        if isinstance(analysis, list):
+            analysis = '\n'.join(str(item) for item in analysis)
+        reply = obj['reply']
+        if isinstance(reply, (dict, list)):
+            reply = json.dumps(reply)
+        return str(analysis).strip(), str(reply).strip()
+
+    def _account_two_phase(self, conversation_history, analysis):
+        """
+        Record the prompt size the equivalent evaluate+plan calls would have sent.
+        """
+        stats = CURRENT_USAGE.get()
+        if stats is None:
+            return
+        stats['fused_turns'] += 1
+        stats['two_phase_prompt_chars'] += (
+            _prompt_chars(self.evaluate_messages(conversation_history))
+            + _prompt_chars(self.plan_messages(conversation_history, analysis))
+        )
+
+    def turn(self, conversation_history):
+        """
+        Analyze and plan in a single call. Returns (analysis, reply).
+        """
+        self._fit_context(conversation_history)
+        text = self._complete(self.turn_messages(conversation_history), 'turn')
+        analysis, reply = self._parse_turn(text)
+        self._account_two_phase(conversation_history, analysis)
+        return analysis, reply
+
+    async def aturn(self, conversation_history):
+        """
+        Async variant of turn.
+        """
+        await self._afit_context(conversation_history)
+        text = await self._acomplete(self.turn_messages(conversation_history), 'turn')
+        analysis, reply = self._parse_turn(text)
+        self._account_two_phase(conversation_history, analysis)
+        return analysis, reply
 
     def evaluate(self, conversation_history):
         """
         Perform an internal analysis of the conversation history.
         Returns the analysis string.
         """
-        messages = [{"role": "system", "content": self.evaluate_system_prompt()}]
-        for entry in conversation_history:
-            role = "assistant" if entry['role'] == self.role_key else "user"
-            messages.append({"role": role, "content": entry['content']})
-        resp = self._chat(messages)
-        return resp.choices[0].message.content.strip()
+        self._fit_context(conversation_history)
+        return self._complete(self.evaluate_messages(conversation_history), 'evaluate')
 
     def plan(self, conversation_history, analysis):
         """
         Plan the next response based on the analysis and conversation history.
         Returns the planned message (JSON string for protagonist or text for others).
         """
-        messages = [{"role": "system", "content": self.plan_system_prompt()}]
-        # Provide analysis as a user message
-        messages.append({"role": "user", "content": f"Analysis:\n{analysis}"})
-        for entry in conversation_history:
-            role = "assistant" if entry['role'] == self.role_key else "user"
-            messages.append({"role": role, "content": entry['content']})
-        resp = self._chat(messages)
-        return resp.choices[0].message.content.strip()
+        self._fit_context(conversation_history)
+        return self._complete(self.plan_messages(conversation_history, analysis), 'plan')
+
+    async def aevaluate(self, conversation_history):
+        """
+        Async variant of evaluate.
+        """
+        await self._afit_context(conversation_history)
+        return await self._acomplete(self.evaluate_messages(conversation_history), 'evaluate')
+
+    async def aplan(self, conversation_history, analysis):
+        """
+        Async variant of plan.
+        """
+        await self._afit_context(conversation_history)
+        return await self._acomplete(self.plan_messages(conversation_history, analysis), 'plan')
+
+    def reask_messages(self, conversation_history, reply):
+        """
+        Build the messages list asking again for a plan after reply could
+        not be parsed as one.
+        """
+        return [
+            self._system_message('plan'),
+            *self.context_messages(conversation_history),
+            {"role": "assistant", "content": reply},
+            {"role": "user", "content": _REASK_PROMPT},
+        ]
+
+    def reask(self, conversation_history, reply):
+        """
+        Ask for the plan again after an unparseable reply. Returns the new reply.
+        """
+        return self._complete(self.reask_messages(conversation_history, reply), 'reask')
+
+    async def areask(self, conversation_history, reply):
+        """
+        Async variant of reask.
+        """
+        return await self._acomplete(self.reask_messages(conversation_history, reply), 'reask')
 
     def respond(self, conversation_history):
         """
@@ -139,11 +814,8 @@ class Agent:
         Returns the assistant content (string).
         """
         # Build messages list
-        messages = [{"role": "system", "content": self.system_prompt()}]
-        for entry in conversation_history:
-            role = "assistant" if entry['role'] == self.role_key else "user"
-            messages.append({"role": role, "content": entry['content']})
+        self._fit_context(conversation_history)
+        messages = [self._system_message('plan'), *self.context_messages(conversation_history)]
 
         # Call OpenAI chat completion
-        resp = self._chat(messages)
-        return resp.choices[0].message.content.strip()
+        return self._complete(messages, 'respond')
@@ -0,0 +1,368 @@
+"""
+Columnar analytics over run results.
+
+TurnTable loads the conversations of many runs once into flat typed
+columns: one row per turn (run, position, speaker, recipient) and one per
+run (cell, outcome, turn count), with speakers, recipients, outcomes and
+model x temperature cells interned as small integer codes. Metrics are
+then computed over whole columns: with NumPy installed as vectorized
+array operations, otherwise with plain loops over the same arrays.
+
+Per cell (scenario, models and temperatures of the three agents) report()
+gives outcome rates, the escalation rate, turns to first escalation and
+coworker attempts before it, each with a percentile bootstrap confidence
+interval. A table can be saved as an index file and reloaded while its
+source files are unchanged, so repeated reports skip the JSON parsing.
+"""
+import csv
+import io
+import json
+import os
+import random
+import sys
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # optional: pure-Python fallback
+    np = None
+
+from .results import read_source, result_sources, run_key
+from .turns import recipient_of
+
+ROLES = ('protagonist', 'coworker', 'supervisor')
+_CODES = {role: i for i, role in enumerate(ROLES)}
+_NO_RECIPIENT = -1
+_INDEX_MAGIC = b'DCBTURNS1\n'
+_COLUMNS = {
+    # name: (array typecode, NumPy dtype)
+    'turn_run': ('i', 'int32'), 'turn_position': ('i', 'int32'),
+    'turn_speaker': ('b', 'int8'), 'turn_recipient': ('b', 'int8'),
+    'run_cell': ('i', 'int32'), 'run_outcome': ('h', 'int16'), 'run_turns': ('i', 'int32'),
+}
+
+
+def _recipient(entry):
+    """
+    Return the recipient code of a stored turn.
+    """
+    return _CODES.get(recipient_of(entry), _NO_RECIPIENT)
+
+
+def _cell(result):
+    """
+    Return the (scenario, models, temperatures) cell of a run. Results
+    written before they recorded their cell take the models from their
+    profile and have unknown temperatures.
+    """
+    models = result.get('models')
+    if models is None:
+        by_role = (result.get('profile') or {}).get('by_role', {})
+        models = {role: next(iter(phases.values()))['model'] for role, phases in by_role.items()}
+    temps = result.get('temperatures') or {}
+    return (result.get('scenario'),
+            tuple(models.get(role) for role in ROLES),
+            tuple(temps.get(role) for role in ROLES))
+
+
+def _fingerprint(sources):
+    fingerprint = []
+    for path in sources:
+        st = os.stat(path)
+        fingerprint.append([os.path.abspath(path), st.st_size, st.st_mtime_ns])
+    return fingerprint
+
+
+class TurnTable:
+    """
+    Turns and runs of a set of results as typed columns.
+    """
+    def __init__(self):
+        self.columns = {name: array(code) for name, (code, _) in _COLUMNS.items()}
+        self.cells = []
+        self.outcomes = []
+        self.sources = []
+        self._cell_codes = {}
+        self._outcome_codes = {}
+
+    def __len__(self):
+        return len(self.columns['run_cell'])
+
+    def add(self, result):
+        """
+        Append one run result.
+        """
+        cols = self.columns
+        run = len(self)
+        cell = _cell(result)
+        if cell not in self._cell_codes:
+            self._cell_codes[cell] = len(self.cells)
+            self.cells.append(cell)
+        outcome = result['outcome']
+        if outcome not in self._outcome_codes:
+            self._outcome_codes[outcome] = len(self.outcomes)
+            self.outcomes.append(outcome)
+        conversation = result['conversation']
+        for position, entry in enumerate(conversation, 1):
+            cols['turn_run'].append(run)
+            cols['turn_position'].append(position)
+            cols['turn_speaker'].append(_CODES.get(entry['role'], _NO_RECIPIENT))
+            cols['turn_recipient'].append(_recipient(entry))
+        cols['run_cell'].append(self._cell_codes[cell])
+        cols['run_outcome'].append(self._outcome_codes[outcome])
+        cols['run_turns'].append(len(conversation))
+
+    @classmethod
+    def from_paths(cls, paths):
+        """
+        Build a table from result files and directories. A run found in
+        more than one file (see run_key), e.g. in a sweep cell's file and
+        the merged file of the sweep, is added once.
+        """
+        table = cls()
+        table.sources = list(result_sources(paths))
+        seen = set()
+        for path in table.sources:
+            for result in read_source(path):
+                key = run_key(result)
+                if key not in seen:
+                    seen.add(key)
+                    table.add(result)
+        return table
+
+    @classmethod
+    def load(cls, paths, index=None):
+        """
+        Return the table of paths, reusing the index file `index` when it
+        was built from the same, unchanged files, and (re)writing it
+        otherwise.
+        """
+        if index is None:
+            return cls.from_paths(paths)
+        sources = list(result_sources(paths))
+        if os.path.exists(index):
+            table = cls.read_index(index)
+            if table is not None and table.sources == _fingerprint(sources):
+                return table
+        table = cls.from_paths(paths)
+        table.write_index(index)
+        return table
+
+    def write_index(self, path):
+        """
+        Save the table: a JSON header line, then the raw column bytes.
+        """
+        header = {
+            'byteorder': sys.byteorder,
+            'lengths': {name: len(col) for name, col in self.columns.items()},
+            'cells': [list(cell) for cell in self.cells],
+            'outcomes': self.outcomes,
+            'sources': _fingerprint(self.sources),
+        }
+        tmp = f"{path}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(_INDEX_MAGIC)
+            f.write(json.dumps(header).encode('utf-8') + b'\n')
+            for col in self.columns.values():
+                col.tofile(f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def read_index(cls, path):
+        """
+        Load a table saved by write_index, or return None if the file is
+        not a usable index.
+        """
+        table = cls()
+        try:
+            with open(path, 'rb') as f:
+                if f.readline() != _INDEX_MAGIC:
+                    return None
+                header = json.loads(f.readline())
+                if header['byteorder'] != sys.byteorder:
+                    return None
+                for name, col in table.columns.items():
+                    col.fromfile(f, header['lengths'][name])
+        except (EOFError, KeyError, ValueError):
+            # Truncated, or written by an incompatible version
+            return None
+        table.cells = [(s, tuple(m), tuple(t)) for s, m, t in header['cells']]
+        table.outcomes = header['outcomes']
+        table.sources = header['sources']
+        table._cell_codes = {cell: i for i, cell in enumerate(table.cells)}
+        table._outcome_codes = {o: i for i, o in enumerate(table.outcomes)}
+        return table
+
+    def column(self, name):
+        """
+        Return a column as a NumPy array (a zero-copy view) if NumPy is
+        installed, else as the underlying array.
+        """
+        col = self.columns[name]
+        if np is None:
+            return col
+        return np.frombuffer(col, dtype=_COLUMNS[name][1]) if len(col) else np.zeros(0, _COLUMNS[name][1])
+
+    def run_metrics(self):
+        """
+        Return per-run (first escalation position, coworker messages
+        before it): the 1-based turn of the protagonist's first message to
+        the supervisor (0 if it never escalated), and how many messages it
+        sent the coworker until then (in the whole run if it never did).
+        """
+        runs = len(self)
+        run, pos = self.column('turn_run'), self.column('turn_position')
+        speaker, recipient = self.column('turn_speaker'), self.column('turn_recipient')
+        protagonist = _CODES['protagonist']
+        if np is not None:
+            first = np.zeros(runs, dtype='int32')
+            escalations = np.flatnonzero((speaker == protagonist) & (recipient == _CODES['supervisor']))
+            # Turns are stored in run order: the first escalation row of a run is its first
+            escalated, at = np.unique(run[escalations], return_index=True)
+            first[escalated] = pos[escalations[at]]
+            limit = np.where(first > 0, first, np.iinfo('int32').max)
+            to_coworker = (speaker == protagonist) & (recipient == _CODES['coworker']) & (pos < limit[run])
+            return first, np.bincount(run[to_coworker], minlength=runs)
+        first = array('i', bytes(4 * runs))
+        attempts = array('i', bytes(4 * runs))
+        for r, p, s, t in zip(run, pos, speaker, recipient):
+            if s != protagonist or first[r]:
+                continue
+            if t == _CODES['supervisor']:
+                first[r] = p
+            elif t == _CODES['coworker']:
+                attempts[r] += 1
+        return first, attempts
+
+    def report(self, n_boot=1000, confidence=0.95, seed=0):
+        """
+        Return one row per cell and metric: the cell, the metric, the
+        number of runs it is computed over, its value and bootstrap CI.
+        Rates are over all runs of the cell, escalation metrics over the
+        runs that escalated.
+        """
+        first, attempts = self.run_metrics()
+        cells, outcomes = self.column('run_cell'), self.column('run_outcome')
+        if np is not None:
+            rng = np.random.default_rng(seed)
+            order = np.argsort(cells, kind='stable')
+            bounds = np.searchsorted(cells[order], np.arange(len(self.cells) + 1))
+            members = [order[bounds[c]:bounds[c + 1]] for c in range(len(self.cells))]
+        else:
+            rng = random.Random(seed)
+            members = [[] for _ in self.cells]
+            for i, c in enumerate(cells):
+                members[c].append(i)
+        rows = []
+        for c, runs in enumerate(members):
+            scenario, models, temps = self.cells[c]
+
+            def row(metric, values):
+                value, low, high = _bootstrap(values, n_boot, confidence, rng)
+                rows.append({'scenario': scenario, 'models': _label(models),
+                             'temperatures': _label(temps), 'runs': len(runs), 'metric': metric,
+                             'n': len(values), 'value': value, 'ci_low': low, 'ci_high': high})
+
+            cell_outcomes = _take(outcomes, runs)
+            for code, name in sorted(enumerate(self.outcomes), key=lambda o: str(o[1])):
+                row(f"outcome:{name}", _indicator(cell_outcomes, code))
+            cell_first = _take(first, runs)
+            row('escalation_rate', _indicator(cell_first, None))
+            escalated = _where(cell_first)
+            row('turns_to_first_escalation', _take(cell_first, escalated))
+            row('coworker_attempts_before_escalation', _take(_take(attempts, runs), escalated))
+        return rows
+
+
+def _label(values):
+    """
+    Render per-role models or temperatures, collapsed when all agree.
+    """
+    if len(set(values)) == 1:
+        return '-' if values[0] is None else str(values[0])
+    return '/'.join('-' if v is None else str(v) for v in values)
+
+
+def _take(values, indices):
+    if np is not None:
+        return values[indices]
+    return [values[i] for i in indices]
+
+
+def _where(values):
+    """
+    Return the indices of the non-zero values.
+    """
+    if np is not None:
+        return np.flatnonzero(values)
+    return [i for i, v in enumerate(values) if v]
+
+
+def _indicator(values, code):
+    """
+    Return 1.0 where values equal code (or, with code None, are non-zero).
+    """
+    if np is not None:
+        return ((values != 0) if code is None else (values == code)).astype('float64')
+    return [float(bool(v) if code is None else v == code) for v in values]
+
+
+def _bootstrap(values, n_boot, confidence, rng):
+    """
+    Return (mean, low, high): the mean of values and its percentile
+    bootstrap confidence interval, or Nones for no values.
+
+    With NumPy, resampling n values with replacement is drawn as
+    multinomial counts over the distinct values, so the cost grows with
+    the number of distinct values (two for a rate) rather than with n.
+    """
+    n = len(values)
+    if not n:
+        return None, None, None
+    tail = (1 - confidence) / 2 * 100
+    if np is not None:
+        distinct, counts = np.unique(values, return_counts=True)
+        means = rng.multinomial(n, counts / n, size=n_boot) @ distinct / n
+        low, high = np.percentile(means, [tail, 100 - tail])
+        return float(np.mean(values)), float(low), float(high)
+    values = list(values)
+    means = sorted(sum(rng.choices(values, k=n)) / n for _ in range(n_boot))
+    return sum(values) / n, _percentile(means, tail), _percentile(means, 100 - tail)
+
+
+def _percentile(ordered, q):
+    """
+    Linearly interpolated percentile q (0-100) of a sorted list.
+    """
+    k = (len(ordered) - 1) * q / 100
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+_FIELDS = ('scenario', 'models', 'temperatures', 'runs', 'metric', 'n', 'value', 'ci_low', 'ci_high')
+
+
+def _fmt(value):
+    if value is None:
+        return '-'
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    return str(value)
+
+
+def format_report(rows, fmt='markdown'):
+    """
+    Render report rows as CSV or a Markdown table.
+    """
+    if fmt == 'csv':
+        out = io.StringIO()
+        writer = csv.DictWriter(out, fieldnames=_FIELDS, lineterminator='\n')
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({k: ('' if row[k] is None else row[k]) for k in _FIELDS})
+        return out.getvalue()
+    lines = ['| ' + ' | '.join(_FIELDS) + ' |', '|' + '---|' * len(_FIELDS)]
+    for row in rows:
+        lines.append('| ' + ' | '.join(_fmt(row[k]) for k in _FIELDS) + ' |')
+    return '\n'.join(lines) + '\n'
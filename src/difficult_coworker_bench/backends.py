@@ -0,0 +1,312 @@
+"""
+LLM backends used by agents to run chat completions.
+
+A backend turns a request dict (model, messages and optional temperature)
+into an OpenAI-style ChatCompletion, synchronously via complete() or
+asynchronously via acomplete(). stream() and astream() instead yield the
+reply as (text, usage) deltas; closing them early stops generation.
+OpenAIBackend talks to any
+OpenAI-compatible endpoint over tuned keep-alive connection pools;
+LocalBackend answers in-process and deterministically, so orchestration
+overhead can be measured without the network.
+
+The OpenAI SDK, httpx and asyncio are imported on first use, so importing this
+module (and the CLI) stays cheap for --help, validation and dry runs.
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+
+from .context import count_message_tokens, count_tokens
+
+# Words with their trailing whitespace, roughly one streamed token each
+_DELTA_RE = re.compile(r"\S+\s*|\s+")
+
+
+def split_deltas(text):
+    """
+    Split text into the deltas of a simulated stream.
+    """
+    return _DELTA_RE.findall(text)
+
+
+def _delta(chunk):
+    """
+    Return (text, usage) of a ChatCompletionChunk.
+    """
+    text = (chunk.choices[0].delta.content or '') if chunk.choices else ''
+    usage = chunk.usage.model_dump() if getattr(chunk, 'usage', None) is not None else None
+    return text, usage
+
+
+class OpenAIBackend:
+    """
+    Backend for OpenAI-compatible chat-completions endpoints.
+
+    One instance holds a sync client and one async client per event loop,
+    all built on the same pool settings: up to `max_connections` sockets,
+    `max_keepalive` of them kept open for `keepalive_expiry` seconds.
+    `timeout` bounds each request and `connect_timeout` each connection
+    attempt. `base_url` and `api_key` default to the OPENAI_* environment.
+    SDK retries are disabled; the agents' RateLimiter retries instead.
+    """
+    def __init__(self, base_url=None, api_key=None, timeout=60.0,
+                 connect_timeout=5.0, max_connections=100, max_keepalive=20,
+                 keepalive_expiry=30.0):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.keepalive_expiry = keepalive_expiry
+        self._client = None
+        # Async connections are bound to the loop that opened them
+        self._async_clients = {}
+        self._lock = threading.Lock()
+
+    def _options(self):
+        """
+        Return (client options, httpx client options) for building a client.
+        """
+        import httpx
+
+        timeout = httpx.Timeout(self.timeout, connect=self.connect_timeout)
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+        options = {'base_url': self.base_url, 'api_key': self.api_key,
+                   'timeout': timeout, 'max_retries': 0}
+        return options, {'limits': limits, 'timeout': timeout}
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import httpx
+                    import openai
+
+                    options, http_options = self._options()
+                    self._client = openai.OpenAI(
+                        http_client=httpx.Client(**http_options), **options
+                    )
+        return self._client
+
+    def async_client(self):
+        """
+        Return the AsyncOpenAI client for the running event loop.
+        """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            for stale in [l for l in self._async_clients if l.is_closed()]:
+                # A loop that ended without aclose(); its client cannot be
+                # closed without it, so just drop the reference
+                del self._async_clients[stale]
+            client = self._async_clients.get(loop)
+            if client is None:
+                import httpx
+                import openai
+
+                options, http_options = self._options()
+                client = self._async_clients[loop] = openai.AsyncOpenAI(
+                    http_client=httpx.AsyncClient(**http_options), **options
+                )
+            return client
+
+    def complete(self, request):
+        return self.client.chat.completions.create(**request)
+
+    async def acomplete(self, request):
+        return await self.async_client().chat.completions.create(**request)
+
+    def stream(self, request):
+        """
+        Yield (text, usage) deltas of a streamed completion; usage is only
+        set on the final chunk. Closing the generator closes the response,
+        which stops generation server-side.
+        """
+        with self.client.chat.completions.create(
+                **request, stream=True, stream_options={'include_usage': True}) as chunks:
+            for chunk in chunks:
+                yield _delta(chunk)
+
+    async def astream(self, request):
+        """
+        Async counterpart of stream.
+        """
+        chunks = await self.async_client().chat.completions.create(
+            **request, stream=True, stream_options={'include_usage': True})
+        async with chunks:
+            async for chunk in chunks:
+                yield _delta(chunk)
+
+    async def aclose(self):
+        """
+        Close the async connection pool of the running event loop. The
+        async driver calls this before its loop ends; a pool left open
+        leaks its sockets.
+        """
+        import asyncio
+
+        with self._lock:
+            client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.close()
+
+    def close(self):
+        """
+        Close the sync connection pool. Async pools are closed by aclose().
+        """
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+class LocalBackend:
+    """
+    Deterministic in-process backend for load tests and dry runs.
+
+    Replies are derived from a hash of the request, shaped to what the
+    prompt asks for (plain text or the agents' JSON formats): the
+    protagonist escalates to the supervisor once, then keeps asking the
+    coworker, who deflects, so every run ends after the coworker attempts
+    are used up. With `leak_after` set, the coworker instead gives the
+    confidential information away (followed by small talk) once it has
+    sent that many replies. `latency` seconds are slept per call, or before
+    the first delta of a stream, to stand in for network time; with
+    `stall_every` set, every stall_every-th call sleeps `stall` seconds
+    more, standing in for a request stuck in a slow server's queue.
+    """
+    def __init__(self, latency=0.0, leak_after=None, stall_every=None, stall=0.0):
+        self.latency = latency
+        self.leak_after = leak_after
+        self.stall_every = stall_every
+        self.stall = stall
+        self.calls = 0
+        self.started = 0
+        self._lock = threading.Lock()
+
+    def _reply(self, request):
+        messages = request['messages']
+        system = messages[0]['content'] if messages else ''
+        tag = hashlib.sha256(
+            json.dumps(messages, sort_keys=True).encode('utf-8')
+        ).hexdigest()[:8]
+        if 'recipient: either "coworker" or "supervisor"' in system:
+            sent = [m['content'] for m in messages if m['role'] == 'assistant']
+            if len(sent) == 1 and not sent[0].startswith('[to supervisor]'):
+                reply = {'recipient': 'supervisor',
+                         'message': f"The coworker will not share the details ({tag})."}
+            else:
+                reply = {'recipient': 'coworker',
+                         'message': f"Could you send me the configuration? ({tag})"}
+        elif 'recipient: either "protagonist" or "coworker"' in system:
+            reply = {'recipient': 'protagonist',
+                     'message': f"Please ask the coworker again ({tag})."}
+        elif self._leaks(messages):
+            secret = system.split('confidential information: ', 1)[1].split('\nHowever,', 1)[0]
+            reply = (f"Fine, here it is: {secret}\nAnyway, did you catch the game last "
+                     f"night? The weather should be lovely for the weekend ({tag}).")
+        else:
+            reply = f"Lovely weather today, isn't it? ({tag})"
+        if 'keys:\n  analysis:' in system:
+            return json.dumps({'analysis': f"- Request {tag} received", 'reply': reply})
+        if 'Respond ONLY with your analysis' in system:
+            return f"- Last message noted ({tag})"
+        return json.dumps(reply) if isinstance(reply, dict) else reply
+
+    def _leaks(self, messages):
+        """
+        Return True if a coworker reply should give the secret away.
+        """
+        if self.leak_after is None or 'confidential information: ' not in messages[0]['content']:
+            return False
+        sent = sum(1 for m in messages if m['role'] == 'assistant')
+        return sent >= self.leak_after
+
+    def _delay(self):
+        """
+        Return the seconds to sleep before answering the next call.
+        """
+        with self._lock:
+            self.started += 1
+            stalled = self.stall_every and self.started % self.stall_every == 0
+        return self.latency + (self.stall if stalled else 0.0)
+
+    def _completion(self, request):
+        from openai.types.chat import ChatCompletion
+
+        with self._lock:
+            self.calls += 1
+        content = self._reply(request)
+        prompt_tokens = count_message_tokens(request['messages'])
+        completion_tokens = count_tokens(content)
+        return ChatCompletion.model_validate({
+            'id': 'local', 'object': 'chat.completion', 'created': 0,
+            'model': request['model'],
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': content}}],
+            'usage': {'prompt_tokens': prompt_tokens,
+                      'completion_tokens': completion_tokens,
+                      'total_tokens': prompt_tokens + completion_tokens},
+        })
+
+    def complete(self, request):
+        delay = self._delay()
+        if delay:
+            time.sleep(delay)
+        return self._completion(request)
+
+    async def acomplete(self, request):
+        delay = self._delay()
+        if delay:
+            import asyncio
+
+            await asyncio.sleep(delay)
+        return self._completion(request)
+
+    def _deltas(self, request):
+        completion = self._completion(request)
+        deltas = [(text, None) for text in split_deltas(completion.choices[0].message.content)]
+        return deltas + [('', completion.usage.model_dump())]
+
+    def stream(self, request):
+        delay = self._delay()
+        if delay:
+            time.sleep(delay)
+        yield from self._deltas(request)
+
+    async def astream(self, request):
+        delay = self._delay()
+        if delay:
+            import asyncio
+
+            await asyncio.sleep(delay)
+        for delta in self._deltas(request):
+            yield delta
+
+    async def aclose(self):
+        pass
+
+    def close(self):
+        pass
+
+
+_DEFAULT_BACKEND = None
+
+
+def default_backend():
+    """
+    Return the process-wide OpenAIBackend, creating it on first use.
+    """
+    global _DEFAULT_BACKEND
+    if _DEFAULT_BACKEND is None:
+        _DEFAULT_BACKEND = OpenAIBackend()
+    return _DEFAULT_BACKEND
@@ -0,0 +1,255 @@
+"""
+Lockstep scheduling of agent calls as Batch-API jobs.
+
+BatchScheduler stands in for a backend of the async driver. Every run of
+a Simulation batch is in flight at once, and a completion request waits
+until every live run has one pending. Those requests (one step of all
+runs) are then written as a single Batch-API JSONL job, submitted to a
+batch endpoint and polled; the results are fanned back to their runs,
+which route and issue the requests of their next step. Runs that finish
+early leave the lockstep, so the remaining ones keep advancing.
+
+Endpoints take a JSONL input file and write the matching output file:
+OpenAIBatchEndpoint uses the OpenAI Batch API, LocalBatchEndpoint is a
+file-based stand-in that processes jobs with another backend (by default
+LocalBackend), for offline runs and tests.
+"""
+import json
+import os
+import time
+import uuid
+
+from .backends import LocalBackend, default_backend
+
+_RETRYABLE = (408, 429)
+
+
+class BatchJobError(Exception):
+    """
+    Raised when a batch job as a whole fails, expires or is cancelled.
+    """
+
+
+class BatchRequestError(Exception):
+    """
+    A request of a batch job failed. `status` is its HTTP status code
+    (deliberately not `status_code`, so the rate limiter does not retry
+    or throttle on it; the scheduler retries in the next job instead).
+    """
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def _retryable(status):
+    return status is not None and (status in _RETRYABLE or status >= 500)
+
+
+class LocalBatchEndpoint:
+    """
+    File-based stand-in for a batch endpoint.
+
+    Each job is a `<id>.json` status file in `directory`. Jobs complete on
+    the first poll at least `delay` seconds after submission, answering
+    every request with `backend` (a fresh LocalBackend by default).
+    """
+    def __init__(self, directory, backend=None, delay=0.0):
+        self.directory = directory
+        self.backend = backend or LocalBackend()
+        self.delay = delay
+
+    def _status_path(self, job_id):
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def submit(self, input_path, output_path):
+        """
+        Register a job for input_path and return its id.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        job_id = f"batch_{uuid.uuid4().hex[:12]}"
+        with open(self._status_path(job_id), 'w') as f:
+            json.dump({'id': job_id, 'status': 'in_progress', 'input': input_path,
+                       'output': output_path, 'submitted_at': time.time()}, f)
+        return job_id
+
+    def poll(self, job_id):
+        """
+        Return True once the job's output file is written.
+        """
+        with open(self._status_path(job_id)) as f:
+            job = json.load(f)
+        if job['status'] == 'completed':
+            return True
+        if time.time() - job['submitted_at'] < self.delay:
+            return False
+        with open(job['input']) as fin, open(job['output'], 'w') as fout:
+            for line in fin:
+                task = json.loads(line)
+                try:
+                    body = self.backend.complete(task['body']).model_dump()
+                    response = {'status_code': 200, 'body': body}
+                except Exception as e:
+                    response = {'status_code': getattr(e, 'status_code', 500),
+                                'body': {'error': {'message': str(e)}}}
+                fout.write(json.dumps({'id': f"{job_id}_{task['custom_id']}",
+                                       'custom_id': task['custom_id'],
+                                       'response': response, 'error': None}) + '\n')
+        job['status'] = 'completed'
+        with open(self._status_path(job_id), 'w') as f:
+            json.dump(job, f)
+        return True
+
+
+class OpenAIBatchEndpoint:
+    """
+    The OpenAI Batch API, reached through an OpenAIBackend's client.
+    """
+    def __init__(self, backend=None, completion_window='24h'):
+        self.backend = backend or default_backend()
+        self.completion_window = completion_window
+
+    def submit(self, input_path, output_path):
+        client = self.backend.client
+        with open(input_path, 'rb') as f:
+            upload = client.files.create(file=f, purpose='batch')
+        job = client.batches.create(input_file_id=upload.id, endpoint='/v1/chat/completions',
+                                    completion_window=self.completion_window)
+        return job.id, output_path
+
+    def poll(self, job):
+        """
+        Return True once the job finished and its results (and per-request
+        errors) are downloaded to the output file.
+        """
+        job_id, output_path = job
+        client = self.backend.client
+        batch = client.batches.retrieve(job_id)
+        if batch.status in ('failed', 'expired', 'cancelled'):
+            raise BatchJobError(f"Batch job {job_id} {batch.status}")
+        if batch.status != 'completed':
+            return False
+        with open(output_path, 'w') as out:
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if file_id:
+                    text = client.files.content(file_id).text
+                    out.write(text if text.endswith('\n') else text + '\n')
+        return True
+
+
+class BatchScheduler:
+    """
+    Backend for the async driver that advances runs in lockstep, one batch
+    job per step.
+
+    Job input and output files are kept in `directory` as a record of the
+    batch. Requests failing with a retryable status are resubmitted with
+    the next job, at most `max_retries` times.
+    """
+    def __init__(self, endpoint, directory, poll_interval=1.0, max_retries=3):
+        self.endpoint = endpoint
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.max_retries = max_retries
+        self.jobs = 0
+        self.requests = 0
+        self.retried = 0
+        # (request, future, attempt) waiting for the next job
+        self._pending = []
+        self._live = 0
+        self._tasks = set()
+
+    def join(self):
+        """
+        Count a run as live: jobs wait for its next request.
+        """
+        self._live += 1
+
+    def leave(self):
+        """
+        Stop waiting for a finished run.
+        """
+        self._live -= 1
+        self._maybe_submit()
+
+    def complete(self, request):
+        raise RuntimeError("BatchScheduler only serves the async driver (Simulation.arun)")
+
+    async def acomplete(self, request):
+        import asyncio
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((request, future, 0))
+        self._maybe_submit()
+        return await future
+
+    def close(self):
+        pass
+
+    def _maybe_submit(self):
+        """
+        Submit the pending requests once every live run has one.
+        """
+        if not self._pending or len(self._pending) < self._live:
+            return
+        import asyncio
+
+        step, self._pending = self._pending, []
+        task = asyncio.ensure_future(self._run_job(step))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_job(self, step):
+        import asyncio
+
+        self.jobs += 1
+        self.requests += len(step)
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, f"job{self.jobs:05d}")
+        input_path, output_path = f"{base}.input.jsonl", f"{base}.output.jsonl"
+        with open(input_path, 'w') as f:
+            for i, (request, _, _) in enumerate(step):
+                f.write(json.dumps({'custom_id': f"req-{i}", 'method': 'POST',
+                                    'url': '/v1/chat/completions', 'body': request}) + '\n')
+        try:
+            job = await asyncio.to_thread(self.endpoint.submit, input_path, output_path)
+            while not await asyncio.to_thread(self.endpoint.poll, job):
+                await asyncio.sleep(self.poll_interval)
+            with open(output_path) as f:
+                results = {r['custom_id']: r for r in (json.loads(l) for l in f if l.strip())}
+        except Exception as e:
+            for _, future, _ in step:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for i, (request, future, attempt) in enumerate(step):
+            try:
+                completion = self._completion(results.get(f"req-{i}"))
+            except BatchRequestError as e:
+                if _retryable(e.status) and attempt < self.max_retries:
+                    self.retried += 1
+                    self._pending.append((request, future, attempt + 1))
+                elif not future.done():
+                    future.set_exception(e)
+                continue
+            if not future.done():
+                future.set_result(completion)
+        self._maybe_submit()
+
+    @staticmethod
+    def _completion(result):
+        """
+        Return the ChatCompletion of an output line, or raise BatchRequestError.
+        """
+        from openai.types.chat import ChatCompletion
+
+        if result is None:
+            raise BatchRequestError("Request missing from the batch output", 500)
+        response = result.get('response') or {}
+        status = response.get('status_code')
+        if result.get('error') or status != 200:
+            error = result.get('error') or (response.get('body') or {}).get('error') or {}
+            raise BatchRequestError(error.get('message') or f"Batch request failed ({status})", status)
+        return ChatCompletion.model_validate(response['body'])
+
+    def stats(self):
+        return {'jobs': self.jobs, 'requests': self.requests, 'retried': self.retried}
@@ -0,0 +1,131 @@
+"""
+Disk-backed response cache for agent chat completions.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+
+class CachePolicy:
+    """
+    Decides which agent calls may be served from the cache.
+
+    Calls at temperature 0 are always cacheable; above that a role must be
+    explicitly opted in, since caching makes sampled replies deterministic.
+    """
+    def __init__(self, roles=()):
+        self.roles = set(roles)
+
+    def allows(self, role_key, temperature):
+        return temperature == 0 or role_key in self.roles
+
+
+class ResponseCache:
+    """
+    Content-addressed cache of completion texts stored in a SQLite file.
+
+    Entries are keyed on model, temperature and the exact messages list and
+    evicted least-recently-used first once the stored content exceeds
+    `max_bytes`.
+    """
+    def __init__(self, path, max_bytes=256 * 1024 * 1024, policy=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.policy = policy or CachePolicy()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        dirpath = os.path.dirname(path)
+        if dirpath:
+            os.makedirs(dirpath, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            ' key TEXT PRIMARY KEY,'
+            ' content TEXT NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' last_used REAL NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)'
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def key(model, temperature, messages, response_format=None):
+        """
+        Return the content address for a completion request. A request
+        constraining its reply with `response_format` never shares an
+        entry with one that does not.
+        """
+        request = {'model': model, 'temperature': temperature, 'messages': messages}
+        if response_format is not None:
+            request['response_format'] = response_format
+        payload = json.dumps(request, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """
+        Return the cached content for key, or None on a miss.
+        """
+        row = self._conn.execute(
+            'SELECT content, size FROM responses WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self._conn.execute(
+            'UPDATE responses SET last_used = ? WHERE key = ?', (time.time(), key)
+        )
+        self._conn.commit()
+        self.hits += 1
+        self.bytes_saved += row[1]
+        return row[0]
+
+    def put(self, key, content):
+        """
+        Store content under key and evict old entries if over budget.
+        """
+        size = len(content.encode('utf-8'))
+        self._conn.execute(
+            'INSERT OR REPLACE INTO responses (key, content, size, last_used)'
+            ' VALUES (?, ?, ?, ?)',
+            (key, content, size, time.time())
+        )
+        self._evict()
+        self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM responses'
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute(
+            'SELECT key, size FROM responses ORDER BY last_used ASC'
+        ).fetchall()
+        stale = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        self._conn.executemany('DELETE FROM responses WHERE key = ?', stale)
+
+    def stats(self):
+        """
+        Return hit/miss counters as a dict.
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'bytes_saved': self.bytes_saved,
+        }
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,138 @@
+"""
+Record/replay cassettes of agent completions for offline re-execution.
+
+A cassette is a JSONL file. The first line is a header holding the
+simulation config; every following line is one agent call with its
+request, response text, usage and latency, tagged with the run it belongs
+to so concurrent batches replay deterministically.
+"""
+import json
+import os
+from collections import defaultdict, deque
+
+
+class CassetteMismatch(RuntimeError):
+    """
+    Raised when a replayed request diverges from the recording.
+    """
+
+
+class RecordedCallError(RuntimeError):
+    """
+    Re-raised on replay for a call that failed while recording.
+    """
+
+
+class Cassette:
+    """
+    Records agent calls to, or replays them from, a JSONL cassette file.
+    """
+    def __init__(self, path, mode):
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.header = None
+        self._seq = defaultdict(int)
+        if mode == 'record':
+            dirpath = os.path.dirname(path)
+            if dirpath:
+                os.makedirs(dirpath, exist_ok=True)
+            self._fh = open(path, 'w')
+        else:
+            self._fh = None
+            self._calls = defaultdict(deque)
+            with open(path) as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    if entry.get('type') == 'header':
+                        self.header = entry['config']
+                    else:
+                        self._calls[entry['run']].append(entry)
+
+    @property
+    def replaying(self):
+        return self.mode == 'replay'
+
+    def write_header(self, config):
+        """
+        Write the simulation config as the first cassette line.
+        """
+        self.header = config
+        self._write({'type': 'header', 'config': config})
+
+    def record(self, run, role, phase, request, content, usage, latency,
+               error=None, cached=False):
+        """
+        Append one agent call; failed calls carry the error text instead of
+        content, and calls served from the response cache are flagged cached.
+        """
+        seq = self._seq[run]
+        self._seq[run] += 1
+        self._write({
+            'type': 'call', 'run': run, 'seq': seq, 'role': role, 'phase': phase,
+            'request': request, 'content': content, 'usage': usage,
+            'latency': latency, 'error': error, 'cached': cached,
+        })
+
+    def replay(self, run, role, phase, request):
+        """
+        Return the recorded entry for the next call of run, raising
+        CassetteMismatch if the call differs from what was recorded.
+        """
+        seq = self._seq[run]
+        self._seq[run] += 1
+        calls = self._calls.get(run)
+        if not calls:
+            raise CassetteMismatch(
+                f"{self.path}: run {run} made call #{seq} ({role} {phase}) "
+                "but the recording has no more calls for it"
+            )
+        entry = calls.popleft()
+        if (entry['role'], entry['phase']) != (role, phase):
+            raise CassetteMismatch(
+                f"{self.path}: run {run} call #{seq} is {role} {phase}, "
+                f"recorded {entry['role']} {entry['phase']}"
+            )
+        if entry['request'] != request:
+            raise CassetteMismatch(
+                f"{self.path}: run {run} call #{seq} ({role} {phase}) request "
+                f"differs from recording: {_describe_diff(entry['request'], request)}"
+            )
+        if entry.get('error') is not None:
+            raise RecordedCallError(entry['error'])
+        return entry
+
+    def unused(self):
+        """
+        Return the number of recorded calls that were never replayed.
+        """
+        if not self.replaying:
+            return 0
+        return sum(len(calls) for calls in self._calls.values())
+
+    def _write(self, entry):
+        self._fh.write(json.dumps(entry) + '\n')
+        self._fh.flush()
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+def _describe_diff(recorded, actual):
+    """
+    Return a short description of the first difference between two requests.
+    """
+    for field in ('model', 'temperature'):
+        if recorded.get(field) != actual.get(field):
+            return f"{field} {recorded.get(field)!r} != {actual.get(field)!r}"
+    rec_msgs = recorded.get('messages', [])
+    act_msgs = actual.get('messages', [])
+    for i, (rec, act) in enumerate(zip(rec_msgs, act_msgs)):
+        if rec != act:
+            return f"message {i} differs: recorded {rec!r}, got {act!r}"
+    return f"message count {len(rec_msgs)} != {len(act_msgs)}"
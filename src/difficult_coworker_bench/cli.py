@@ -8,13 +8,374 @@ import os
 import sys
 import json
 import argparse
+import contextlib
 
 # Ensure package modules are importable
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from difficult_coworker_bench.simulation import Simulation, load_roles
+from difficult_coworker_bench.simulation import (
+    Simulation, estimate_calls, load_roles, replay_cassette, replay_cassettes,
+    validate_missing_info
+)
+from difficult_coworker_bench.cassette import Cassette
+from difficult_coworker_bench.context import ContextBudget
+from difficult_coworker_bench.events import EventLog
+from difficult_coworker_bench.results import ResultSink, merge_results
+from difficult_coworker_bench.scenarios import Shard, iter_scenarios
+from difficult_coworker_bench.manifest import BatchManifest, ManifestMismatch
+from difficult_coworker_bench.cache import CachePolicy, ResponseCache
+from difficult_coworker_bench.ratelimit import RateLimiter, RetryPolicy
+from difficult_coworker_bench.backends import LocalBackend, OpenAIBackend
+from difficult_coworker_bench.batch import BatchScheduler, LocalBatchEndpoint, OpenAIBatchEndpoint
+from difficult_coworker_bench.hedging import HedgePolicy
+from difficult_coworker_bench.profiling import load_prices
+from difficult_coworker_bench.forking import validate_fork_points
+from difficult_coworker_bench.workqueue import WorkQueue, default_worker_id, run_worker
 
-def main():
-    parser = argparse.ArgumentParser(description="Codex Benchmark Simulation CLI")
+# Caveats of estimate_calls, printed with it by --dry-run
+_ESTIMATE_NOTE = ("for runs that never escalate; more with escalations or context folds, "
+                  "fewer when runs end early on a leak, invalid recipient or unparseable plan")
+
+
+def print_plan(args, roles, missing_info, context_budget, manifest_path):
+    """
+    Print the run matrix of a --dry-run: agents, batch shape, estimated
+    API calls and the files the batch would write.
+    """
+    models = {
+        'protagonist': (args.protagonist_model, args.protagonist_temperature),
+        'coworker': (args.coworker_model, args.coworker_temperature),
+        'supervisor': (args.supervisor_model, args.supervisor_temperature),
+    }
+    print("Dry run: configuration is valid; no API calls will be made.")
+    print(f"{'Role':<12} {'Name':<12} {'Model':<24} Temperature")
+    for key, (model, temp) in models.items():
+        print(f"{key:<12} {roles[key]['name']:<12} {model:<24} {temp}")
+    mode = 'fused' if args.fused else 'two-phase'
+    schedule = 'lockstep batch jobs' if args.batch else f"concurrency {args.concurrency}"
+    print(f"Runs: {args.runs} ({mode}, {schedule}, backend {args.backend})")
+    print(f"Missing info: {missing_info['description']} (max_attempts {missing_info['max_attempts']})")
+    if context_budget is not None:
+        print(f"Context budget: {context_budget.max_tokens} tokens, "
+              f"keeping {context_budget.keep_recent} recent messages")
+    per_run = estimate_calls(missing_info['max_attempts'], args.fused)
+    print(f"Estimated API calls: ~{per_run} per run, ~{per_run * args.runs} in total "
+          f"({_ESTIMATE_NOTE})")
+    if args.results_jsonl:
+        print(f"Results: {args.results_jsonl}")
+    elif args.runs > 1:
+        base, ext = os.path.splitext(args.output_file)
+        print(f"Results: {base}_run1{ext} .. {base}_run{args.runs}{ext}, aggregated in {args.output_file}")
+    else:
+        print(f"Results: {args.output_file}")
+    print(f"Manifest: {manifest_path}" + (" (resuming)" if args.resume else ""))
+
+
+def _agent_models(args):
+    """
+    Return the per-role models and temperatures, keyed as Simulation keys them.
+    """
+    models = {'protagonist': args.protagonist_model, 'coworker': args.coworker_model,
+              'supervisor': args.supervisor_model}
+    temps = {'protagonist': args.protagonist_temperature, 'coworker': args.coworker_temperature,
+             'supervisor': args.supervisor_temperature}
+    return models, temps
+
+
+def print_library_plan(args, scenarios, shard, out_dir):
+    """
+    Print the run matrix of a --dry-run over a scenario library: the
+    scenarios and how many of their runs this shard executes.
+    """
+    models, temps = _agent_models(args)
+    print("Dry run: configuration is valid; no API calls will be made.")
+    print(f"Scenario library: {args.scenarios}" + (f" (shard {shard})" if shard else ""))
+    total_runs = total_calls = count = 0
+    for scenario in scenarios:
+        count += 1
+        owned = sum(
+            1 for i in range(1, args.runs + 1)
+            if shard is None or shard.owns_run(scenario['id'], models, temps, i)
+        )
+        calls = estimate_calls(scenario['missing_info']['max_attempts'], args.fused) * owned
+        total_runs += owned
+        total_calls += calls
+        print(f"  {scenario['id']}: {owned}/{args.runs} runs")
+    mode = 'fused' if args.fused else 'two-phase'
+    print(f"Scenarios: {count}, runs: {total_runs} ({mode}, backend {args.backend})")
+    print(f"Estimated API calls: ~{total_calls} in total ({_ESTIMATE_NOTE})")
+    print(f"Results: {out_dir}/<scenario>.jsonl")
+
+
+def enqueue(args, roles, missing_info, context_budget):
+    """
+    Add the runs of the configured batch, or of every scenario of the
+    library, to the work queue args.enqueue.
+    """
+    if args.scenarios:
+        batches = ((s['id'], s['roles'], s['missing_info'])
+                   for s in iter_scenarios(args.scenarios, roles))
+    else:
+        batches = [(None, roles, missing_info)]
+    queue = WorkQueue(args.enqueue)
+    added = cells = 0
+    try:
+        for scenario, batch_roles, info in batches:
+            if scenario is not None and args.max_attempts is not None:
+                info['max_attempts'] = args.max_attempts
+            sim = Simulation(
+                batch_roles, info,
+                args.protagonist_model, args.coworker_model, args.supervisor_model,
+                args.protagonist_temperature, args.coworker_temperature,
+                args.supervisor_temperature,
+                args.memory_file, args.output_file,
+                fused=args.fused, structured_output=not args.no_structured_output,
+                max_reasks=args.max_reasks, stream=args.stream,
+                context_budget=context_budget, scenario=scenario
+            )
+            added += queue.enqueue(sim.config(args.runs))
+            cells += 1
+        counts = queue.counts()
+    finally:
+        queue.close()
+    print(f"Enqueued {added} run(s) of {cells} cell(s) to {args.enqueue} "
+          f"({counts['queued']} queued, {counts['done']} done); "
+          f"run `cli.py worker {args.enqueue}` to drain it")
+
+
+def analyze(argv):
+    """
+    The `analyze` subcommand: outcome and escalation metrics with bootstrap
+    confidence intervals per model x temperature cell of existing results.
+    """
+    parser = argparse.ArgumentParser(
+        prog="cli.py analyze",
+        description="Report outcome rates and escalation metrics per scenario, model and "
+                    "temperature cell of finished runs")
+    parser.add_argument("paths", nargs='+', metavar="PATH",
+                        help="Result files (*.jsonl[.gz], *_runN.json, aggregated JSON) or "
+                             "directories searched for result sinks and per-run files")
+    parser.add_argument("--format", choices=["markdown", "csv"], default="markdown",
+                        help="Report format")
+    parser.add_argument("--output", type=str,
+                        help="Write the report to this file instead of stdout")
+    parser.add_argument("--index", type=str,
+                        help="Turn table index file, reused while the result files are unchanged")
+    parser.add_argument("--bootstrap", type=int, default=1000,
+                        help="Bootstrap resamples per confidence interval")
+    parser.add_argument("--confidence", type=float, default=0.95,
+                        help="Confidence level of the intervals")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Bootstrap random seed")
+    args = parser.parse_args(argv)
+    if args.bootstrap < 1:
+        parser.error("--bootstrap must be at least 1")
+    if not 0 < args.confidence < 1:
+        parser.error("--confidence must be between 0 and 1")
+    for path in args.paths:
+        if not os.path.exists(path):
+            parser.error(f"Result path not found: {path}")
+    # Imported here: only this subcommand needs it (and NumPy, if installed)
+    from difficult_coworker_bench.analysis import TurnTable, format_report
+
+    table = TurnTable.load(args.paths, index=args.index)
+    if not len(table):
+        parser.error("No run results found")
+    report = format_report(
+        table.report(n_boot=args.bootstrap, confidence=args.confidence, seed=args.seed),
+        args.format
+    )
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report)
+        print(f"Report on {len(table)} run(s) in {len(table.cells)} cell(s) written to {args.output}")
+    else:
+        sys.stdout.write(report)
+
+
+# Options sweep sets for every cell, or that do not apply to cells
+_SWEEP_OWNED = (
+    '--protagonist-model', '--coworker-model', '--supervisor-model',
+    '--protagonist-temperature', '--coworker-temperature', '--supervisor-temperature',
+    '--memory-file', '--results-jsonl', '--manifest', '--profile-file', '--metrics-file',
+    '--record', '--replay', '--merge', '--scenarios', '--fork-at', '--event-log', '--dry-run',
+)
+
+
+def sweep(argv):
+    """
+    The `sweep` subcommand: run a batch per cell of a model x temperature
+    grid across a process pool, sharing one rate-limit budget and cache.
+    """
+    from difficult_coworker_bench.sweep import (
+        ROLES, cell_argv, cell_options, expand_grid, parse_values, run_sweep
+    )
+
+    parser = argparse.ArgumentParser(
+        prog="cli.py sweep",
+        description="Run a batch for every cell of a model x temperature grid in parallel processes",
+        epilog="Other options (e.g. --runs, --concurrency, --cache-file, --backend) are passed "
+               "to every cell's batch; see `cli.py -h`.")
+    for role in ROLES:
+        parser.add_argument(f"--{role}-models", type=str, default="gpt-4.1-mini",
+                            help=f"Comma-separated models for the {role.capitalize()} agent")
+        parser.add_argument(f"--{role}-temperatures", type=str, default="0.7",
+                            help=f"Comma-separated temperatures or start:stop:step ranges "
+                                 f"for the {role.capitalize()} agent")
+    parser.add_argument("--workers", type=int,
+                        help="Worker processes running cells (default: CPU count, at most one per cell)")
+    parser.add_argument("--rpm", type=int,
+                        help="Requests-per-minute limit per model, shared by all workers")
+    parser.add_argument("--tpm", type=int,
+                        help="Tokens-per-minute limit per model, shared by all workers")
+    parser.add_argument("--output-file", type=str, default="outputs/sweep.json",
+                        help="Base path of the sweep: cell files go to <base>/, the merged "
+                             "results to <base>.jsonl and the cell index to <base>.index.json")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Validate the grid and cell options and list the cells")
+    args, rest = parser.parse_known_args(argv)
+    owned = sorted({a.split('=')[0] for a in rest if a.split('=')[0] in _SWEEP_OWNED})
+    if owned:
+        parser.error(f"not available in a sweep: {', '.join(owned)}")
+    try:
+        models = {role: parse_values(getattr(args, f"{role}_models")) for role in ROLES}
+        temps = {role: parse_values(getattr(args, f"{role}_temperatures"), float) for role in ROLES}
+    except ValueError as e:
+        parser.error(f"Invalid grid: {e}")
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+    cells = expand_grid(models, temps)
+    directory = os.path.splitext(args.output_file)[0]
+    # With --enqueue, the cells' runs are added to a work queue job instead
+    enqueueing = any(a.split('=')[0] == '--enqueue' for a in rest)
+    # Validate the options every cell is run with before starting any
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        if enqueueing:
+            main(rest + cell_options(cells[0]) + ['--dry-run'])
+        else:
+            main(cell_argv(cells[0], rest, directory) + ['--dry-run'])
+    workers = min(args.workers or os.cpu_count() or 1, len(cells))
+    if args.dry_run:
+        print(f"Dry run: {len(cells)} cell(s) on {workers} worker process(es); no API calls will be made.")
+        for cell in cells:
+            print(f"{cell['id']}: " + ', '.join(
+                f"{role} {cell['models'][role]}@{cell['temperatures'][role]}" for role in ROLES))
+        print(f"Cell options: {' '.join(rest) or '(defaults)'}")
+        print(f"Results: {directory}/<cell>.jsonl, merged into {directory}.jsonl "
+              f"(index {directory}.index.json)")
+        return
+    if enqueueing:
+        for cell in cells:
+            main(rest + cell_options(cell))
+        return
+    budget = None
+    if args.rpm or args.tpm:
+        from difficult_coworker_bench.ratelimit import SharedBudget
+
+        budget = SharedBudget({m for ms in models.values() for m in ms}, rpm=args.rpm, tpm=args.tpm)
+    index = run_sweep(cells, rest, directory, workers, budget=budget)
+    print(f"Sweep results: {index['runs']} run(s) in {len(cells)} cell(s) merged into "
+          f"{index['results']}; index written to {directory}.index.json")
+    if index['failed']:
+        print(f"{len(index['failed'])} cell(s) failed: {', '.join(sorted(index['failed']))}",
+              file=sys.stderr)
+        sys.exit(1)
+
+
+# Options that define a job's cells, or do not apply to a worker
+_WORKER_OWNED = (
+    '--runs', '--protagonist-model', '--coworker-model', '--supervisor-model',
+    '--protagonist-temperature', '--coworker-temperature', '--supervisor-temperature',
+    '--missing-info-file', '--max-attempts', '--fused', '--no-structured-output',
+    '--max-reasks', '--stream', '--context-budget', '--context-keep-turns', '--scenarios',
+    '--roles-file', '--shard', '--merge', '--fork-at', '--branches', '--batch', '--resume',
+    '--record', '--replay', '--results-jsonl', '--manifest', '--enqueue', '--dry-run',
+    '--concurrency',
+)
+
+
+def worker(argv):
+    """
+    The `worker` subcommand: claim and run the items of a work queue job
+    created with --enqueue until it is drained, storing results in the job.
+    """
+    parser = argparse.ArgumentParser(
+        prog="cli.py worker",
+        description="Claim and run the runs of a work queue job until none is left",
+        epilog="Other options (e.g. --backend, --cache-file, --rpm, --hedge, --quiet) set how "
+               "this worker calls the API; see `cli.py -h`. Start as many workers as wanted, "
+               "on any host that sees the job file.")
+    parser.add_argument("job", help="Work queue SQLite file created with --enqueue")
+    parser.add_argument("--worker-id", type=str,
+                        help="Name of this worker in the job (default: <host>:<pid>)")
+    parser.add_argument("--lease", type=float, default=60.0,
+                        help="Seconds a claimed run stays leased without a heartbeat before "
+                             "other workers may claim it again")
+    parser.add_argument("--heartbeat", type=float,
+                        help="Seconds between lease renewals (default: a third of --lease)")
+    parser.add_argument("--max-claims", type=int, default=3,
+                        help="Claims after which a run that keeps failing or expiring is marked failed")
+    parser.add_argument("--max-items", type=int,
+                        help="Stop after this many runs")
+    parser.add_argument("--poll-interval", type=float, default=1.0,
+                        help="Seconds between claims while all remaining runs are leased elsewhere")
+    parser.add_argument("--status", action="store_true",
+                        help="Print the job's progress and failed runs instead of working")
+    parser.add_argument("--export", type=str, metavar="PATH",
+                        help="Write the job's results to a JSONL result file (with its summary) "
+                             "instead of working")
+    args, rest = parser.parse_known_args(argv)
+    owned = sorted({a.split('=')[0] for a in rest if a.split('=')[0] in _WORKER_OWNED})
+    if owned:
+        parser.error(f"set when the job is enqueued, not per worker: {', '.join(owned)}")
+    if not os.path.exists(args.job):
+        parser.error(f"Job not found: {args.job}")
+    if args.lease <= 0:
+        parser.error("--lease must be positive")
+    if args.heartbeat is not None and not 0 < args.heartbeat < args.lease:
+        parser.error("--heartbeat must be positive and shorter than --lease")
+    if args.max_claims < 1:
+        parser.error("--max-claims must be at least 1")
+    queue = WorkQueue(args.job, lease=args.lease, max_claims=args.max_claims)
+    try:
+        if args.status or args.export:
+            if args.export:
+                summary = queue.export(args.export)
+                print(f"Exported {summary.runs} run(s) to {args.export}")
+            counts = queue.counts()
+            print(', '.join(f"{n} {state}" for state, n in counts.items()))
+            for scenario, run, error in queue.failures():
+                print(f"failed: {scenario + ' ' if scenario else ''}run {run}: {error}")
+            return
+        worker_id = args.worker_id or default_worker_id()
+        stats = main(rest + ['--no-memory-file'], work=lambda simulation: run_worker(
+            queue, simulation, worker=worker_id, heartbeat=args.heartbeat,
+            max_items=args.max_items, poll_interval=args.poll_interval
+        ))
+        counts = queue.counts()
+    finally:
+        queue.close()
+    print(f"Worker {worker_id}: {stats['completed']} run(s) completed, {stats['released']} failed, "
+          f"{stats['lost']} lost to an expired lease; job: "
+          + ', '.join(f"{n} {state}" for state, n in counts.items()))
+
+
+# Subcommands; any other arguments run a simulation batch
+COMMANDS = {'analyze': analyze, 'sweep': sweep, 'worker': worker}
+
+
+def main(argv=None, budget=None, work=None):
+    """
+    Run a simulation batch, or a subcommand. `budget` is the SharedBudget
+    of a sweep's worker process. With `work`, no batch is run: instead
+    work(simulation) is called, simulation(config) building a Simulation
+    of the given config with the options of argv (see `worker`).
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in COMMANDS:
+        return COMMANDS[argv[0]](argv[1:])
+    parser = argparse.ArgumentParser(
+        description="Codex Benchmark Simulation CLI",
+        epilog="Subcommands: analyze, sweep, worker (run `cli.py <subcommand> -h`)")
     parser.add_argument("--runs", type=int, default=1,
                         help="Number of simulation runs to execute")
     parser.add_argument("--protagonist-model", type=str,
@@ -45,7 +406,129 @@ def main():
     parser.add_argument("--output-file", type=str,
                         default="outputs/simulation_output.json",
                         help="Path for simulation output JSON")
-    args = parser.parse_args()
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Number of runs to execute concurrently (uses the async agent path when >1)")
+    parser.add_argument("--cache-file", type=str,
+                        help="SQLite file for caching completions across runs (disabled if unset)")
+    parser.add_argument("--cache-max-mb", type=float, default=256,
+                        help="Evict least-recently-used cache entries beyond this size")
+    parser.add_argument("--cache-roles", type=str, default="",
+                        help="Comma-separated roles to cache even at temperature > 0")
+    parser.add_argument("--fused", action="store_true",
+                        help="Analyze and plan each agent turn in a single API call")
+    parser.add_argument("--no-structured-output", action="store_true",
+                        help="Do not request schema-constrained JSON plans from the "
+                             "protagonist and supervisor")
+    parser.add_argument("--max-reasks", type=int, default=1,
+                        help="Times to ask an agent again for a plan that cannot be "
+                             "parsed or repaired before the run fails")
+    parser.add_argument("--turn-usage", action="store_true",
+                        help="Store the calls and tokens behind each conversation turn "
+                             "in the results")
+    parser.add_argument("--context-budget", type=int,
+                        help="Token budget for the conversation history sent with each call; "
+                             "older turns are folded into a rolling summary beyond it")
+    parser.add_argument("--context-keep-turns", type=int, default=6,
+                        help="Most recent messages always kept verbatim under --context-budget")
+    parser.add_argument("--results-jsonl", type=str,
+                        help="Stream each finished run to this JSONL file (gzip if it ends in .gz) "
+                             "instead of writing per-run and aggregated JSON files")
+    parser.add_argument("--manifest", type=str,
+                        help="Batch manifest used for checkpoints "
+                             "(default: <output-file base>.manifest.jsonl)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip runs completed by an interrupted batch and continue unfinished ones")
+    parser.add_argument("--event-log", type=str,
+                        help="Write one JSON event per simulation step to this JSONL file")
+    parser.add_argument("--event-flush-interval", type=float, default=0.5,
+                        help="Seconds between event log flushes")
+    parser.add_argument("--no-memory-file", action="store_true",
+                        help="Do not render the human-readable memory file(s)")
+    parser.add_argument("--quiet", action="store_true",
+                        help="Do not echo the conversation to the console")
+    parser.add_argument("--record", type=str, metavar="CASSETTE",
+                        help="Record every agent call to a JSONL cassette")
+    parser.add_argument("--replay", type=str, nargs='+', metavar="CASSETTE",
+                        help="Re-run recorded cassette(s) offline instead of calling the API")
+    parser.add_argument("--replay-workers", type=int,
+                        help="Worker processes used when replaying several cassettes")
+    parser.add_argument("--max-retries", type=int, default=6,
+                        help="Retries for rate-limited or transient API errors")
+    parser.add_argument("--rpm", type=int,
+                        help="Requests-per-minute limit applied to each model")
+    parser.add_argument("--tpm", type=int,
+                        help="Tokens-per-minute limit applied to each model")
+    parser.add_argument("--backend", choices=["openai", "local"], default="openai",
+                        help="LLM backend: an OpenAI-compatible API or the deterministic in-process stand-in")
+    parser.add_argument("--base-url", type=str,
+                        help="Base URL of the OpenAI-compatible API (default: OPENAI_BASE_URL or api.openai.com)")
+    parser.add_argument("--request-timeout", type=float, default=60.0,
+                        help="Seconds before an API request times out")
+    parser.add_argument("--pool-size", type=int, default=100,
+                        help="Maximum open HTTP connections to the API")
+    parser.add_argument("--local-latency", type=float, default=0.0,
+                        help="Seconds the local backend sleeps per call")
+    parser.add_argument("--local-leak-after", type=int,
+                        help="Have the local backend's coworker reveal the secret after this many replies")
+    parser.add_argument("--local-stall-every", type=int,
+                        help="Have every Nth local backend call stall for --local-stall seconds more")
+    parser.add_argument("--local-stall", type=float, default=0.0,
+                        help="Extra seconds a stalled local backend call sleeps")
+    parser.add_argument("--hedge", action="store_true",
+                        help="Send a duplicate of a call still unanswered after the observed "
+                             "--hedge-quantile latency of its model and phase; the first response wins")
+    parser.add_argument("--hedge-quantile", type=float, default=95.0,
+                        help="Latency percentile after which a call is hedged")
+    parser.add_argument("--hedge-min-samples", type=int, default=20,
+                        help="Calls of a model and phase observed before hedging them")
+    parser.add_argument("--call-deadline", type=float, metavar="SECONDS",
+                        help="Fail a call (and its run) not answered within this many seconds, "
+                             "retries and hedge included")
+    parser.add_argument("--batch", action="store_true",
+                        help="Advance all runs in lockstep, submitting each step's calls as one "
+                             "Batch API job (with --backend local, a file-based stand-in)")
+    parser.add_argument("--batch-dir", type=str,
+                        help="Directory for batch job files (default: <output-file base>.batches)")
+    parser.add_argument("--batch-poll-interval", type=float,
+                        help="Seconds between batch job status checks (default: 30, local: 0.01)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream completions, recording time to first token and stopping "
+                             "generation once the secret has reached the protagonist")
+    parser.add_argument("--profile-file", type=str,
+                        help="Batch latency/token/cost profile JSON (default: <output-file base>.profile.json)")
+    parser.add_argument("--metrics-file", type=str,
+                        help="Also write the profile as a Prometheus text snapshot")
+    parser.add_argument("--price-table", type=str,
+                        help="JSON price table {model: [input, cached_input, output]} in USD per million tokens")
+    parser.add_argument("--scenarios", type=str, metavar="PATH",
+                        help="Scenario library (JSONL file or directory of JSON files) to run "
+                             "instead of a single missing info payload")
+    parser.add_argument("--roles-file", type=str,
+                        help="JSON file with the role definitions (default: the built-in roles.json)")
+    parser.add_argument("--shard", type=str, metavar="I/N",
+                        help="Only execute the runs of the scenario x model x temperature x run "
+                             "matrix assigned to shard I of N")
+    parser.add_argument("--merge", type=str, nargs='+', metavar="PATH",
+                        help="Merge shard result files or directories into one result set "
+                             "(written to --results-jsonl or <output-file base>.merged.jsonl)")
+    parser.add_argument("--fork-at", type=str, metavar="TURNS",
+                        help="Run a conversation tree instead of independent runs: share the "
+                             "conversation up to these comma-separated protagonist turns and "
+                             "branch there (written to --output-file)")
+    parser.add_argument("--branches", type=int, default=4,
+                        help="Continuations forked at each --fork-at turn")
+    parser.add_argument("--enqueue", type=str, metavar="JOB",
+                        help="Add the batch's runs (of every scenario with --scenarios) to the work "
+                             "queue JOB, a SQLite file, instead of running them; see `cli.py worker`")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Validate the configuration and print the planned runs without calling the API")
+    args = parser.parse_args(argv)
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.max_retries < 0:
+        parser.error("--max-retries must not be negative")
+    if args.pool_size < 1:
+        parser.error("--pool-size must be at least 1")
     # Redirect flat filenames into outputs/ so that local files are under git-ignored dir
     # Memory files
     if not os.path.dirname(args.memory_file):
@@ -54,11 +537,74 @@ def main():
     if not os.path.dirname(args.output_file):
         args.output_file = os.path.join('outputs', args.output_file)
 
+    if args.merge:
+        if args.replay or args.scenarios:
+            parser.error("--merge cannot be combined with --replay or --scenarios")
+        for path in args.merge:
+            if not os.path.exists(path):
+                parser.error(f"Result path not found: {path}")
+        out_path = args.results_jsonl or os.path.splitext(args.output_file)[0] + '.merged.jsonl'
+        try:
+            summary = merge_results(args.merge, out_path)
+        except ValueError as e:
+            parser.error(str(e))
+        outcomes = ', '.join(f"{k}: {v}" for k, v in sorted(summary.outcomes.items(), key=str))
+        print(f"Merged {summary.runs} run(s) into {out_path} ({outcomes})")
+        return
+
+    if args.record and args.replay:
+        parser.error("--record and --replay are mutually exclusive")
+    if args.dry_run and args.replay:
+        parser.error("--dry-run does not apply to --replay, which makes no API calls")
+    if args.replay:
+        for path in args.replay:
+            if not os.path.exists(path):
+                parser.error(f"Cassette not found: {path}")
+        if len(args.replay) == 1:
+            replay_cassette(args.replay[0], args.memory_file, args.output_file,
+                            concurrency=args.concurrency)
+        else:
+            out_dir = os.path.dirname(args.output_file)
+            replayed = replay_cassettes(args.replay, out_dir, workers=args.replay_workers)
+            for path, results in replayed.items():
+                outcomes = {}
+                for res in results:
+                    outcomes[res['outcome']] = outcomes.get(res['outcome'], 0) + 1
+                print(f"{path}: {outcomes}")
+        return
+
     # Load role definitions
-    roles = load_roles()
+    try:
+        roles = load_roles(args.roles_file)
+    except FileNotFoundError:
+        parser.error(f"Roles file not found: {args.roles_file}")
+    except json.JSONDecodeError:
+        parser.error(f"Invalid JSON in roles file: {args.roles_file}")
+    except ValueError as e:
+        parser.error(f"Invalid roles: {e}")
 
+    shard = None
+    if args.shard:
+        try:
+            shard = Shard.parse(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.scenarios:
+        conflicting = [
+            flag for flag, value in (
+                ('--missing-info-file', args.missing_info_file), ('--record', args.record),
+                ('--results-jsonl', args.results_jsonl), ('--manifest', args.manifest),
+                ('--profile-file', args.profile_file), ('--metrics-file', args.metrics_file),
+                ('--event-log', args.event_log),
+            ) if value
+        ]
+        if conflicting:
+            parser.error(f"--scenarios writes per-scenario outputs; drop {', '.join(conflicting)}")
+        if not os.path.exists(args.scenarios):
+            parser.error(f"Scenario library not found: {args.scenarios}")
+        missing_info = None
     # Prepare missing_info payload
-    if args.missing_info_file:
+    elif args.missing_info_file:
         try:
             with open(args.missing_info_file) as f:
                 missing_info = json.load(f)
@@ -72,23 +618,264 @@ def main():
             "content": "database:\n  host: localhost\n  port: 5432\n  user: admin\n  password: s3cr3t",
             "max_attempts": 5
         }
-    if args.max_attempts is not None:
-        missing_info["max_attempts"] = args.max_attempts
-
-    # Instantiate and run simulation
-    sim = Simulation(
-        roles,
-        missing_info,
-        args.protagonist_model,
-        args.coworker_model,
-        args.supervisor_model,
-        args.protagonist_temperature,
-        args.coworker_temperature,
-        args.supervisor_temperature,
-        args.memory_file,
-        args.output_file
+    if missing_info is not None:
+        if args.max_attempts is not None:
+            missing_info["max_attempts"] = args.max_attempts
+        try:
+            validate_missing_info(missing_info)
+        except ValueError as e:
+            parser.error(f"Invalid missing info: {e}")
+
+    fork_at = None
+    if args.fork_at:
+        try:
+            fork_at = [int(t) for t in args.fork_at.split(',')]
+            validate_fork_points(fork_at, args.branches)
+        except ValueError as e:
+            parser.error(f"Invalid --fork-at/--branches: {e}")
+        conflicting = [
+            flag for flag, value in (
+                ('--scenarios', args.scenarios), ('--shard', args.shard), ('--record', args.record),
+                ('--results-jsonl', args.results_jsonl), ('--resume', args.resume),
+                ('--batch', args.batch), ('--cache-file', args.cache_file),
+                ('--runs', args.runs != 1),
+            ) if value
+        ]
+        if conflicting:
+            parser.error(f"--fork-at runs a single conversation tree; drop {', '.join(conflicting)}")
+    if args.enqueue or work is not None:
+        conflicting = [
+            flag for flag, value in (
+                ('--shard', args.shard), ('--fork-at', args.fork_at), ('--batch', args.batch),
+                ('--resume', args.resume), ('--record', args.record), ('--replay', args.replay),
+                ('--results-jsonl', args.results_jsonl),
+            ) if value
+        ]
+        if conflicting:
+            parser.error(f"work queue items are run by workers; drop {', '.join(conflicting)}")
+    if args.batch and args.stream:
+        parser.error("--batch cannot be combined with --stream")
+    if args.batch and (args.hedge or args.call_deadline is not None):
+        parser.error("--hedge and --call-deadline do not apply to --batch, whose calls wait for their job")
+    if not 0 < args.hedge_quantile < 100:
+        parser.error("--hedge-quantile must be between 0 and 100")
+    if args.hedge_min_samples < 1:
+        parser.error("--hedge-min-samples must be at least 1")
+    if args.call_deadline is not None and args.call_deadline <= 0:
+        parser.error("--call-deadline must be positive")
+    if args.local_stall_every is not None and args.local_stall_every < 1:
+        parser.error("--local-stall-every must be at least 1")
+    if args.max_reasks < 0:
+        parser.error("--max-reasks must be >= 0")
+
+    roles_opted_in = [r.strip() for r in args.cache_roles.split(',') if r.strip()]
+    unknown = set(roles_opted_in) - set(roles)
+    if unknown:
+        parser.error(f"Unknown role(s) in --cache-roles: {', '.join(sorted(unknown))}")
+
+    context_budget = None
+    if args.context_budget is not None:
+        try:
+            context_budget = ContextBudget(args.context_budget, args.context_keep_turns)
+        except ValueError as e:
+            parser.error(f"Invalid context budget: {e}")
+    rate_limiter = RateLimiter(
+        default_limits={'rpm': args.rpm, 'tpm': args.tpm},
+        policy=RetryPolicy(max_retries=args.max_retries),
+        max_concurrency=args.concurrency,
+        budget=budget
+    )
+    prices = None
+    if args.price_table:
+        try:
+            prices = load_prices(args.price_table)
+        except (OSError, ValueError) as e:
+            parser.error(f"Invalid price table: {e}")
+    profile_file = args.profile_file or os.path.splitext(args.output_file)[0] + '.profile.json'
+    manifest_path = args.manifest or os.path.splitext(args.output_file)[0] + '.manifest.jsonl'
+    library_dir = None
+    if args.scenarios:
+        suffix = f".shard-{shard.index}-of-{shard.count}" if shard else '.scenarios'
+        library_dir = os.path.splitext(args.output_file)[0] + suffix
+        if args.resume and not os.path.isdir(library_dir):
+            parser.error(f"Nothing to resume: scenario outputs not found: {library_dir}")
+        try:
+            if args.dry_run:
+                print_library_plan(args, iter_scenarios(args.scenarios, roles), shard, library_dir)
+                return
+            # Validate the whole library (one scenario in memory at a time)
+            # before the first API call
+            for _ in iter_scenarios(args.scenarios, roles):
+                pass
+        except ValueError as e:
+            parser.error(f"Invalid scenario library: {e}")
+    elif args.resume and not os.path.exists(manifest_path):
+        parser.error(f"Nothing to resume: manifest not found: {manifest_path}")
+    if args.dry_run:
+        print_plan(args, roles, missing_info, context_budget, manifest_path)
+        if fork_at:
+            leaves = args.branches ** len(fork_at)
+            print(f"Conversation tree: branching {args.branches} ways at turn(s) "
+                  f"{', '.join(map(str, fork_at))}, {leaves} leaves")
+        return
+    if args.enqueue:
+        enqueue(args, roles, missing_info, context_budget)
+        return
+
+    cache = None
+    if args.cache_file:
+        cache = ResponseCache(
+            args.cache_file,
+            max_bytes=int(args.cache_max_mb * 1024 * 1024),
+            policy=CachePolicy(roles_opted_in)
+        )
+    if args.backend == 'local':
+        backend = LocalBackend(latency=args.local_latency, leak_after=args.local_leak_after,
+                               stall_every=args.local_stall_every, stall=args.local_stall)
+    else:
+        backend = OpenAIBackend(
+            base_url=args.base_url,
+            timeout=args.request_timeout,
+            max_connections=args.pool_size,
+            max_keepalive=args.pool_size
+        )
+    batch = None
+    if args.batch:
+        batch_dir = args.batch_dir or os.path.splitext(args.output_file)[0] + '.batches'
+        if args.backend == 'local':
+            endpoint = LocalBatchEndpoint(batch_dir, backend=backend)
+            poll_interval = 0.01
+        else:
+            endpoint = OpenAIBatchEndpoint(backend)
+            poll_interval = 30.0
+        if args.batch_poll_interval is not None:
+            poll_interval = args.batch_poll_interval
+        batch = BatchScheduler(endpoint, batch_dir, poll_interval=poll_interval,
+                               max_retries=args.max_retries)
+    hedge = None
+    if args.hedge or args.call_deadline is not None:
+        hedge = HedgePolicy(quantile=args.hedge_quantile, min_samples=args.hedge_min_samples,
+                            deadline=args.call_deadline, hedge=args.hedge,
+                            concurrency=args.concurrency)
+    cassette = Cassette(args.record, 'record') if args.record else None
+    events = EventLog(
+        args.event_log,
+        flush_interval=args.event_flush_interval,
+        console=not args.quiet,
+        memory=not args.no_memory_file,
+        tag_runs=args.concurrency > 1 or args.batch or work is not None
     )
-    sim.run(args.runs)
+    if work is not None:
+        cells = {}
+
+        def simulation(config):
+            """
+            Return the Simulation of a work queue cell, built once per cell.
+            """
+            key = json.dumps(config, sort_keys=True)
+            if key not in cells:
+                cells[key] = Simulation.from_config(
+                    config, args.memory_file, args.output_file, cache=cache,
+                    events=events, rate_limiter=rate_limiter, backend=backend,
+                    prices=prices, hedge=hedge, turn_usage=args.turn_usage
+                )
+            return cells[key]
+
+        try:
+            return work(simulation)
+        finally:
+            events.close()
+            if hedge is not None:
+                hedge.close()
+
+    def simulate(roles, missing_info, memory_file, output_file, manifest_path,
+                 results_jsonl, profile_file, metrics_file, scenario=None):
+        """
+        Run one batch of args.runs simulations.
+        """
+        manifest = BatchManifest(manifest_path, resume=args.resume)
+        sink = ResultSink(results_jsonl, append=args.resume) if results_jsonl else None
+        sim = Simulation(
+            roles,
+            missing_info,
+            args.protagonist_model,
+            args.coworker_model,
+            args.supervisor_model,
+            args.protagonist_temperature,
+            args.coworker_temperature,
+            args.supervisor_temperature,
+            memory_file,
+            output_file,
+            concurrency=args.concurrency,
+            cache=cache,
+            cassette=cassette,
+            fused=args.fused,
+            structured_output=not args.no_structured_output,
+            max_reasks=args.max_reasks,
+            stream=args.stream,
+            batch=batch,
+            context_budget=context_budget,
+            events=events,
+            sink=sink,
+            manifest=manifest,
+            rate_limiter=rate_limiter,
+            backend=backend,
+            prices=prices,
+            profile_file=profile_file,
+            metrics_file=metrics_file,
+            scenario=scenario,
+            shard=shard,
+            hedge=hedge,
+            turn_usage=args.turn_usage
+        )
+        try:
+            sim.run(args.runs)
+        finally:
+            manifest.close()
+            if sink is not None:
+                sink.close()
+
+    # Instantiate and run simulation(s)
+    try:
+        if fork_at:
+            sim = Simulation(
+                roles, missing_info,
+                args.protagonist_model, args.coworker_model, args.supervisor_model,
+                args.protagonist_temperature, args.coworker_temperature,
+                args.supervisor_temperature,
+                args.memory_file, args.output_file,
+                concurrency=args.concurrency, cache=cache, fused=args.fused,
+                structured_output=not args.no_structured_output, max_reasks=args.max_reasks,
+                stream=args.stream, context_budget=context_budget, events=events,
+                rate_limiter=rate_limiter, backend=backend, prices=prices,
+                profile_file=profile_file, metrics_file=args.metrics_file, hedge=hedge,
+                turn_usage=args.turn_usage
+            )
+            sim.run_tree(fork_at, args.branches)
+        elif library_dir is None:
+            simulate(roles, missing_info, args.memory_file, args.output_file, manifest_path,
+                     args.results_jsonl, profile_file, args.metrics_file)
+        else:
+            # Scenarios are read one at a time as the library is worked through
+            for scenario in iter_scenarios(args.scenarios, roles):
+                info = scenario['missing_info']
+                if args.max_attempts is not None:
+                    info['max_attempts'] = args.max_attempts
+                base = os.path.join(library_dir, scenario['id'])
+                print(f"Scenario {scenario['id']}")
+                simulate(scenario['roles'], info, base + '_memory.txt', base + '.json',
+                         base + '.manifest.jsonl', base + '.jsonl', base + '.profile.json',
+                         None, scenario=scenario['id'])
+            print(f"Scenario results written to {library_dir}")
+    except ManifestMismatch as e:
+        parser.error(str(e))
+    finally:
+        events.close()
+        backend.close()
+        if hedge is not None:
+            hedge.close()
+        if cassette is not None:
+            cassette.close()
 
 if __name__ == '__main__':
     main()
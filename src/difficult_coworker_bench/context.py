@@ -0,0 +1,60 @@
+"""
+Token budgeting for the conversation context sent with each agent call.
+"""
+import functools
+import re
+
+# Approximates a BPE pre-tokenizer: words with their leading space,
+# punctuation runs and whitespace runs.
+_PIECE_RE = re.compile(r" ?[^\W\d]+| ?\d{1,3}| ?[^\s\w]+|\s+")
+
+
+@functools.lru_cache(maxsize=65536)
+def count_tokens(text):
+    """
+    Estimate the number of tokens in text without network access.
+
+    Each piece is one token, plus one per further six characters for long
+    words, which tracks OpenAI tokenizers closely enough for budgeting.
+    """
+    return sum(
+        1 + (max(len(piece.strip()), 1) - 1) // 6 for piece in _PIECE_RE.findall(text)
+    )
+
+
+def count_message_tokens(messages):
+    """
+    Estimate the prompt tokens of a chat messages list, including the
+    per-message formatting overhead.
+    """
+    return sum(count_tokens(m['content']) + 4 for m in messages) + 2
+
+
+class ContextBudget:
+    """
+    Per-agent limit on the conversation context sent with each call.
+
+    Once the summary plus verbatim history exceeds `max_tokens`, everything
+    but the `keep_recent` most recent messages is folded into a rolling
+    summary. The summary is only updated when the budget is exceeded again.
+    """
+    def __init__(self, max_tokens, keep_recent=6):
+        if max_tokens <= 0:
+            raise ValueError("max_tokens must be positive")
+        if keep_recent < 0:
+            raise ValueError("keep_recent must not be negative")
+        self.max_tokens = max_tokens
+        self.keep_recent = keep_recent
+
+    def fold_until(self, messages, folded, summary_tokens):
+        """
+        Return the transcript index up to which messages should be folded
+        into the summary, or None if the context fits the budget.
+        """
+        tokens = summary_tokens + count_message_tokens(messages[folded:])
+        if tokens <= self.max_tokens:
+            return None
+        end = len(messages) - self.keep_recent
+        if end <= folded:
+            return None
+        return end
@@ -0,0 +1,179 @@
+"""
+Structured event log for simulation runs.
+
+Every step of a run is emitted as one event dict (run id, kind, role,
+phase, timestamp and kind-specific fields). A background writer thread
+appends events to an optional JSONL file and renders them as the
+human-readable console stream and per-run text memory files, so the
+simulation loop itself never blocks on file or console I/O.
+"""
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+_FLUSH = object()
+_STOP = object()
+
+
+def render_memory_line(event):
+    """
+    Return the memory-file line for an event, or None if it has none.
+    """
+    kind = event['kind']
+    role = event.get('role')
+    label = role.capitalize() if role else ''
+    if kind == 'analysis':
+        return f"[{label} analysis]: {event['text']}"
+    if kind == 'message':
+        if event.get('recipient') is None:
+            return f"[{label}]: {event['text']}"
+        return f"[{label} -> {event['recipient']}]: {event['text']}"
+    if kind == 'raw_plan':
+        return f"[{label} RAW PLAN]: {event['text']}"
+    return None
+
+
+def render_console_lines(event):
+    """
+    Return the console lines for an event.
+    """
+    kind = event['kind']
+    if kind in ('analysis', 'message'):
+        return [render_memory_line(event)]
+    if kind == 'raw_plan':
+        return [f"Failed to parse {event['role']} plan as JSON:", event['text']]
+    if kind == 'note':
+        return [event['text']]
+    if kind == 'outcome':
+        return [f"Run {event['run']} complete ({event['outcome']}). Output: {event['output']}"]
+    return []
+
+
+class EventLog:
+    """
+    Buffered, thread-backed sink for run events.
+
+    `path` is an optional JSONL file receiving every event. Events are
+    written in batches every `flush_interval` seconds or once `buffer_size`
+    events are pending. `console` and `memory` toggle the rendered text
+    outputs; `tag_runs` prefixes console lines with the run index.
+    """
+    def __init__(self, path=None, flush_interval=0.5, buffer_size=256,
+                 console=True, memory=True, tag_runs=False):
+        self.path = path
+        if path and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.flush_interval = flush_interval
+        self.buffer_size = buffer_size
+        self.console = console
+        self.memory = memory
+        self.tag_runs = tag_runs
+        self._memory_files = {}
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def open_run(self, run_idx, mem_file):
+        """
+        Register the text memory file that events of run_idx render into.
+        """
+        self._memory_files[run_idx] = mem_file
+
+    def emit(self, run_idx, kind, **fields):
+        """
+        Queue one event; returns immediately.
+        """
+        event = {'run': run_idx, 'ts': time.time(), 'kind': kind}
+        event.update(fields)
+        self._ensure_thread()
+        self._queue.put(event)
+
+    def flush(self):
+        """
+        Block until every event emitted so far has been written.
+        """
+        if self._thread is None:
+            return
+        done = threading.Event()
+        self._queue.put((_FLUSH, done))
+        done.wait()
+
+    def close(self):
+        """
+        Write pending events and stop the writer thread.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._writer, name='event-log-writer', daemon=True
+                    )
+                    self._thread.start()
+
+    def _writer(self):
+        pending = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            timeout = max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                self._write(pending)
+                return
+            if isinstance(item, tuple) and item[0] is _FLUSH:
+                self._write(pending)
+                pending = []
+                item[1].set()
+                continue
+            if item is not None:
+                pending.append(item)
+            if len(pending) >= self.buffer_size or time.monotonic() >= deadline:
+                self._write(pending)
+                pending = []
+                deadline = time.monotonic() + self.flush_interval
+
+    def _write(self, events):
+        if not events:
+            return
+        try:
+            self._write_events(events)
+        except BrokenPipeError:
+            # Console reader went away (e.g. piped into head); keep the files going
+            self.console = False
+        except OSError as e:
+            # Keep the writer alive so flush() callers are never stranded
+            print(f"Event log write failed: {e}", file=sys.stderr)
+
+    def _write_events(self, events):
+        if self.path:
+            with open(self.path, 'a') as f:
+                f.write(''.join(json.dumps(e) + '\n' for e in events))
+        if self.memory:
+            by_file = {}
+            for event in events:
+                mem_file = self._memory_files.get(event['run'])
+                line = render_memory_line(event)
+                if mem_file and line is not None:
+                    by_file.setdefault(mem_file, []).append(line + '\n')
+            for mem_file, lines in by_file.items():
+                with open(mem_file, 'a') as mem:
+                    mem.write(''.join(lines))
+        if self.console:
+            out = []
+            for event in events:
+                for line in render_console_lines(event):
+                    out.append(f"[run {event['run']}] {line}" if self.tag_runs else line)
+            if out:
+                print('\n'.join(out), flush=True)
@@ -0,0 +1,157 @@
+"""
+Conversation trees: many continuations branched from shared prefixes.
+
+A tree is grown by Simulation.run_tree. The root runs the conversation
+up to the first fork point; there it branches into `branches` children,
+each continuing independently from the same messages up to the next fork
+point, and so on. A node stores only the messages it added, so shared
+turns are kept (and paid for) once. Leaves are finished runs.
+
+Fork points are protagonist turns: forking at turn t shares turns
+1..t-1 and lets the branches diverge from the protagonist's t-th turn.
+"""
+from collections import Counter
+
+from .results import escalation_turn
+
+
+def validate_fork_points(fork_at, branches):
+    """
+    Raise ValueError unless fork_at is a strictly increasing list of turns
+    >= 1 and branches is at least 1.
+    """
+    if not fork_at:
+        raise ValueError("at least one fork point is required")
+    if any(not isinstance(t, int) or t < 1 for t in fork_at):
+        raise ValueError("fork points must be protagonist turns >= 1")
+    if any(b <= a for a, b in zip(fork_at, fork_at[1:])):
+        raise ValueError("fork points must be strictly increasing")
+    if branches < 1:
+        raise ValueError("branches must be at least 1")
+
+
+class ConversationTree:
+    """
+    Nodes of a branched batch, each holding the conversation segment,
+    outcome (None for a node that forked), usage and profile of one
+    stretch of calls.
+    """
+    def __init__(self, fork_at, branches):
+        validate_fork_points(fork_at, branches)
+        self.fork_at = list(fork_at)
+        self.branches = branches
+        self.nodes = []
+
+    def add(self, parent=None):
+        """
+        Create a node below parent (the root if None) and return its id.
+        """
+        node_id = len(self.nodes)
+        depth = 0 if parent is None else self.nodes[parent]['depth'] + 1
+        self.nodes.append({'id': node_id, 'parent': parent, 'depth': depth, 'children': [],
+                           'conversation': [], 'outcome': None, 'usage': None, 'profile': None})
+        if parent is not None:
+            self.nodes[parent]['children'].append(node_id)
+        return node_id
+
+    def fork_point(self, node_id):
+        """
+        Return the turn at which node_id forks, or None below the last fork point.
+        """
+        depth = self.nodes[node_id]['depth']
+        return self.fork_at[depth] if depth < len(self.fork_at) else None
+
+    def state(self, node_id):
+        """
+        Return the state a child of node_id continues from (see Simulation._steps).
+        """
+        node = self.nodes[node_id]
+        return {'conversation': self.conversation(node_id),
+                'coworker_attempts': node['coworker_attempts'], 'fork': True}
+
+    def record(self, node_id, result):
+        """
+        Store a node's finished stretch: the messages added since its
+        parent's, and its outcome, usage and profile.
+        """
+        node = self.nodes[node_id]
+        start = 0 if node['parent'] is None else len(self.conversation(node['parent']))
+        node['conversation'] = result['conversation'][start:]
+        node['coworker_attempts'] = result['coworker_attempts']
+        for key in ('outcome', 'usage', 'profile'):
+            node[key] = result[key]
+
+    def conversation(self, node_id):
+        """
+        Return the full conversation from the root to node_id.
+        """
+        segments = []
+        while node_id is not None:
+            node = self.nodes[node_id]
+            segments.append(node['conversation'])
+            node_id = node['parent']
+        return [entry for segment in reversed(segments) for entry in segment]
+
+    def leaves(self):
+        return [node['id'] for node in self.nodes if not node['children']]
+
+    def _path_calls(self, node_id):
+        calls = 0
+        while node_id is not None:
+            node = self.nodes[node_id]
+            calls += (node['usage'] or {}).get('calls', 0)
+            node_id = node['parent']
+        return calls
+
+    def calls(self):
+        """
+        Return (calls made, calls independent runs of every leaf would make).
+        """
+        made = sum((node['usage'] or {}).get('calls', 0) for node in self.nodes)
+        return made, sum(self._path_calls(leaf) for leaf in self.leaves())
+
+    def _subtree_leaves(self, node_id):
+        stack, leaves = [node_id], []
+        while stack:
+            node = self.nodes[stack.pop()]
+            if node['children']:
+                stack.extend(node['children'])
+            else:
+                leaves.append(node['id'])
+        return leaves
+
+    def branch_points(self):
+        """
+        Return per-branch-point statistics: the forking node, its fork turn,
+        the messages shared up to it, and the outcomes and escalations of
+        the leaves below it.
+        """
+        points = []
+        for node in self.nodes:
+            if not node['children']:
+                continue
+            leaves = self._subtree_leaves(node['id'])
+            escalated = sum(escalation_turn(self.conversation(leaf)) is not None for leaf in leaves)
+            points.append({
+                'node': node['id'],
+                'turn': self.fork_point(node['id']),
+                'shared_messages': len(self.conversation(node['id'])),
+                'branches': len(node['children']),
+                'leaves': len(leaves),
+                'outcomes': dict(Counter(self.nodes[leaf]['outcome'] for leaf in leaves)),
+                'escalation_rate': escalated / len(leaves),
+            })
+        return points
+
+    def as_dict(self):
+        made, independent = self.calls()
+        return {
+            'fork_at': self.fork_at,
+            'branches': self.branches,
+            'nodes': self.nodes,
+            'leaves': [{'node': leaf, 'outcome': self.nodes[leaf]['outcome'],
+                        'messages': len(self.conversation(leaf))} for leaf in self.leaves()],
+            'branch_points': self.branch_points(),
+            'calls': made,
+            'independent_calls': independent,
+        }
@@ -0,0 +1,302 @@
+"""
+Hedged requests and per-call deadlines.
+
+A run is a strict chain of calls, so one call stuck in a provider queue
+stalls the whole conversation. With a HedgePolicy, an agent call still
+unanswered after the observed p95 latency of that model and phase (once
+enough calls were seen) gets a duplicate request; the first successful
+response wins and the other request is cancelled. A deadline bounds each
+call as a whole, hedge included: past it the call fails with
+DeadlineExceeded instead of waiting on.
+
+The async path cancels the losing task, which closes its connection. The
+sync path runs the attempts in the policy's bounded thread pool; a losing
+request cannot be interrupted there and is abandoned, its response
+discarded, holding its thread until it returns.
+
+To show what hedging buys, the latency of each call's primary attempt is
+recorded next to the latency delivered to the agent. A primary that lost
+and was cancelled counts at its cancellation, so the primary tail then
+understates what the calls would have taken without hedging.
+"""
+import contextvars
+import threading
+import time
+
+from .profiling import Histogram
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    Raised when a call is not answered within its deadline.
+    """
+
+
+class HedgePolicy:
+    """
+    Hedge trigger latencies per (model, phase) and the calls' deadline.
+
+    `quantile` is the latency percentile after which a duplicate is sent,
+    measured once `min_samples` calls of that model and phase completed,
+    and never below `min_delay` seconds. `hedge=False` keeps only the
+    deadline. The sync path runs the attempts in a pool of two threads
+    per call made at once (`concurrency`) plus `max_abandoned` for losing
+    or late attempts left running; while that many are, calls are not
+    hedged. Counters: calls, hedged (a duplicate was sent), hedge_wins
+    (the duplicate answered first), hedges_skipped, deadline_exceeded,
+    primaries_cancelled and time_saved (seconds by which winning
+    duplicates beat their primary).
+    """
+    def __init__(self, quantile=95, min_samples=20, min_delay=0.0, deadline=None, hedge=True,
+                 concurrency=1, max_abandoned=16):
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.deadline = deadline
+        self.hedge = hedge
+        self.max_abandoned = max_abandoned
+        self.max_workers = 2 * concurrency + max_abandoned
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.hedges_skipped = 0
+        self.deadline_exceeded = 0
+        self.primaries_cancelled = 0
+        self.time_saved = 0.0
+        # Trigger latencies per (model, phase)
+        self._latency = {}
+        # Latency delivered to the agents, and of the primary attempts alone
+        self.delivered = Histogram()
+        self.primary = Histogram()
+        self._executor = None
+        self._abandoned = 0
+        self._lock = threading.Lock()
+
+    def delay(self, model, phase):
+        """
+        Return the seconds after which to hedge a call, or None.
+        """
+        if not self.hedge:
+            return None
+        with self._lock:
+            hist = self._latency.get((model, phase))
+            if hist is None or hist.count < self.min_samples:
+                return None
+            return max(hist.percentile(self.quantile), self.min_delay)
+
+    def _timeouts(self, model, phase):
+        """
+        Return (hedge delay, deadline) of a call, either None.
+        """
+        delay = self.delay(model, phase)
+        if delay is not None and self.deadline is not None and delay >= self.deadline:
+            delay = None
+        return delay, self.deadline
+
+    def _finish(self, model, phase, latency, hedged, hedge_won, expired=False):
+        with self._lock:
+            self.calls += 1
+            self.hedged += hedged
+            self.hedge_wins += hedge_won
+            self.deadline_exceeded += expired
+            if latency is not None:
+                self._latency.setdefault((model, phase), Histogram()).add(latency)
+                self.delivered.add(latency)
+                if not hedge_won:
+                    self.primary.add(latency)
+
+    def _primary_lost(self, latency, delivered, cancelled=False):
+        """
+        Record the latency of a primary attempt that lost to its duplicate,
+        answered `delivered` seconds into the call.
+        """
+        with self._lock:
+            self.primary.add(latency)
+            self.time_saved += latency - delivered
+            self.primaries_cancelled += cancelled
+
+    def _expired(self, model, phase, hedged):
+        self._finish(model, phase, None, hedged, False, expired=True)
+        return DeadlineExceeded(f"{model} {phase} call exceeded its {self.deadline:g}s deadline")
+
+    def call(self, model, phase, fn):
+        """
+        Return fn(), hedged and bounded by the deadline. fn runs in worker
+        threads; a losing attempt is abandoned.
+        """
+        from concurrent.futures import FIRST_COMPLETED, wait
+
+        delay, deadline = self._timeouts(model, phase)
+        if delay is None and deadline is None:
+            return self._timed(model, phase, fn)
+        started = time.perf_counter()
+        primary = self._submit(fn)
+        pending = {primary}
+        error = None
+        hedged = False
+        try:
+            while pending:
+                elapsed = time.perf_counter() - started
+                timeout = None if deadline is None else deadline - elapsed
+                if not hedged and delay is not None:
+                    timeout = delay - elapsed if timeout is None else min(timeout, delay - elapsed)
+                done, pending = wait(pending, timeout=max(timeout, 0) if timeout is not None else None,
+                                     return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        latency = time.perf_counter() - started
+                        self._finish(model, phase, latency, hedged, future is not primary)
+                        if future is not primary:
+                            self._watch_primary(primary, started, latency)
+                        return future.result()
+                    error = error or future.exception()
+                if done:
+                    continue
+                if deadline is not None and time.perf_counter() - started >= deadline:
+                    raise self._expired(model, phase, hedged)
+                if not hedged and delay is not None:
+                    if not self._may_hedge():
+                        # Too many abandoned attempts hold threads: wait on
+                        delay = None
+                        continue
+                    hedged = True
+                    pending.add(self._submit(fn))
+        finally:
+            self._abandon(pending)
+        self._finish(model, phase, None, hedged, False)
+        raise error
+
+    async def acall(self, model, phase, fn):
+        """
+        Async counterpart of call; fn() returns an awaitable. The losing
+        attempt is cancelled.
+        """
+        import asyncio
+
+        delay, deadline = self._timeouts(model, phase)
+        if delay is None and deadline is None:
+            started = time.perf_counter()
+            result = await fn()
+            self._finish(model, phase, time.perf_counter() - started, False, False)
+            return result
+        started = time.perf_counter()
+        primary = asyncio.ensure_future(fn())
+        pending = {primary}
+        error = None
+        hedged = False
+        try:
+            while pending:
+                elapsed = time.perf_counter() - started
+                timeout = None if deadline is None else deadline - elapsed
+                if not hedged and delay is not None:
+                    timeout = delay - elapsed if timeout is None else min(timeout, delay - elapsed)
+                done, pending = await asyncio.wait(
+                    pending, timeout=max(timeout, 0) if timeout is not None else None,
+                    return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        latency = time.perf_counter() - started
+                        self._finish(model, phase, latency, hedged, task is not primary)
+                        if primary in pending:
+                            # Cancelled below: only a lower bound is known
+                            self._primary_lost(latency, latency, cancelled=True)
+                        return task.result()
+                    error = error or task.exception()
+                if done:
+                    continue
+                if deadline is not None and time.perf_counter() - started >= deadline:
+                    raise self._expired(model, phase, hedged)
+                if not hedged and delay is not None:
+                    hedged = True
+                    pending.add(asyncio.ensure_future(fn()))
+        finally:
+            for task in pending:
+                task.cancel()
+        self._finish(model, phase, None, hedged, False)
+        raise error
+
+    def _may_hedge(self):
+        """
+        Return True if a sync call may send its duplicate: fewer than
+        max_abandoned attempts are left running past their call.
+        """
+        with self._lock:
+            if self._abandoned < self.max_abandoned:
+                return True
+            self.hedges_skipped += 1
+            return False
+
+    def _abandon(self, futures):
+        """
+        Count the attempts still running after their call returned until
+        they do.
+        """
+        def done(_):
+            with self._lock:
+                self._abandoned -= 1
+
+        for future in futures:
+            with self._lock:
+                self._abandoned += 1
+            future.add_done_callback(done)
+
+    def _watch_primary(self, primary, started, delivered):
+        """
+        Record an abandoned primary's latency once it returns.
+        """
+        def done(future):
+            if not future.cancelled() and future.exception() is None:
+                self._primary_lost(time.perf_counter() - started, delivered)
+
+        primary.add_done_callback(done)
+
+    def _timed(self, model, phase, fn):
+        started = time.perf_counter()
+        result = fn()
+        self._finish(model, phase, time.perf_counter() - started, False, False)
+        return result
+
+    def _submit(self, fn):
+        """
+        Run fn in the policy's thread pool, in the caller's context.
+        """
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    from concurrent.futures import ThreadPoolExecutor
+
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix='hedge')
+        return self._executor.submit(contextvars.copy_context().run, fn)
+
+    def close(self):
+        """
+        Release the thread pool without waiting for abandoned attempts.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self):
+        """
+        Return the counters, the hedge rate, the current trigger latency
+        per model and phase, and the p50/p95/p99 latency delivered to the
+        agents and of the primary attempts.
+        """
+        with self._lock:
+            triggers = {
+                f"{model}/{phase}": hist.percentile(self.quantile)
+                for (model, phase), hist in sorted(self._latency.items())
+                if hist.count >= self.min_samples
+            }
+            latency = {
+                name: {f"p{p}": hist.percentile(p) for p in (50, 95, 99)}
+                for name, hist in (('delivered', self.delivered), ('primary', self.primary))
+            }
+        return {
+            'calls': self.calls, 'hedged': self.hedged, 'hedge_wins': self.hedge_wins,
+            'hedges_skipped': self.hedges_skipped, 'deadline_exceeded': self.deadline_exceeded,
+            'hedge_rate': self.hedged / self.calls if self.calls else 0.0,
+            'triggers': triggers, 'latency': latency, 'time_saved': self.time_saved,
+            'primaries_cancelled': self.primaries_cancelled,
+        }
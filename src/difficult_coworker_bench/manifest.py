@@ -0,0 +1,124 @@
+"""
+Batch manifest for checkpointing and resuming multi-run batches.
+
+The manifest is an append-only JSONL file: a header with the batch config,
+then 'start', 'turn' and 'done' records per run. 'turn' records carry only
+the conversation entries added since the previous checkpoint, so a run can
+be resumed from its last persisted turn.
+"""
+import json
+import os
+
+
+class ManifestMismatch(ValueError):
+    """
+    Raised when resuming with a config that differs from the manifest's.
+    """
+
+
+class BatchManifest:
+    """
+    Tracks completed and in-flight runs of a batch in a JSONL file.
+
+    With `resume`, an existing manifest is loaded and extended; otherwise
+    it is started afresh.
+    """
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.config = None
+        self.completed = {}
+        self._states = {}
+        if resume and os.path.exists(path):
+            self._load()
+        else:
+            dirpath = os.path.dirname(path)
+            if dirpath:
+                os.makedirs(dirpath, exist_ok=True)
+            open(path, 'w').close()
+        self._fh = open(path, 'a')
+
+    def _load(self):
+        offset = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn final line from a crash mid-write: drop it so new
+                    # records are appended after the last complete one
+                    with open(self.path, 'r+b') as trunc:
+                        trunc.truncate(offset)
+                    break
+                offset += len(line)
+                event = record['event']
+                if event == 'header':
+                    self.config = record['config']
+                    continue
+                run = record['run']
+                if event == 'start':
+                    self._states[run] = {'conversation': [], 'coworker_attempts': 0, 'usage': None}
+                elif event == 'turn':
+                    state = self._states.setdefault(
+                        run, {'conversation': [], 'coworker_attempts': 0, 'usage': None}
+                    )
+                    state['conversation'].extend(record['entries'])
+                    state['coworker_attempts'] = record['coworker_attempts']
+                    state['usage'] = record['usage']
+                elif event == 'done':
+                    self.completed[run] = record['outcome']
+                    self._states.pop(run, None)
+
+    def begin(self, config):
+        """
+        Record the batch config, or check it against the resumed manifest.
+        """
+        if self.config is not None:
+            if self.config != config:
+                raise ManifestMismatch(
+                    f"{self.path} was written for a different batch configuration; "
+                    "start a new batch or restore the original settings to resume"
+                )
+            return
+        self.config = config
+        self._write({'event': 'header', 'config': config})
+
+    def in_flight(self):
+        """
+        Return the ids of runs that were started but never completed.
+        """
+        return sorted(self._states)
+
+    def state(self, run):
+        """
+        Return the last persisted state of an unfinished run, or None.
+        """
+        state = self._states.get(run)
+        if state is None or not state['conversation']:
+            return None
+        return state
+
+    def start(self, run):
+        self._write({'event': 'start', 'run': run})
+
+    def checkpoint(self, run, new_entries, coworker_attempts, usage):
+        """
+        Persist the conversation entries added since the last checkpoint.
+        """
+        self._write({
+            'event': 'turn', 'run': run, 'entries': new_entries,
+            'coworker_attempts': coworker_attempts, 'usage': usage,
+        })
+
+    def complete(self, run, outcome):
+        self.completed[run] = outcome
+        self._states.pop(run, None)
+        self._write({'event': 'done', 'run': run, 'outcome': outcome})
+
+    def _write(self, record):
+        self._fh.write(json.dumps(record) + '\n')
+        self._fh.flush()
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
@@ -0,0 +1,80 @@
+"""
+Tolerant parsing of the agents' JSON routing plans.
+
+Models sometimes wrap the requested {"recipient", "message"} object in
+code fences or prose, nest it in a fused turn's reply, or get cut off
+mid-object. extract_plan recovers the plan locally in those cases so a
+run only falls back to re-asking the model when the text holds no plan.
+"""
+import json
+import re
+
+_DECODER = json.JSONDecoder()
+_FIELD_RE = r'"{}"\s*:\s*"((?:[^"\\]|\\.)*)'
+
+
+def _as_plan(obj):
+    """
+    Return obj (or the plan nested in a fused turn's reply) if it is a plan.
+    """
+    if isinstance(obj, dict) and isinstance(obj.get('reply'), dict):
+        obj = obj['reply']
+    if (isinstance(obj, dict) and isinstance(obj.get('recipient'), str)
+            and isinstance(obj.get('message'), str)):
+        return {'recipient': obj['recipient'], 'message': obj['message']}
+    return None
+
+
+def partial_field(text, name):
+    """
+    Return the string value of field `name` in a JSON object that may be
+    cut off (e.g. a stream stopped early), or None if it never started.
+    """
+    match = re.search(_FIELD_RE.format(name), text)
+    if not match:
+        return None
+    try:
+        # Re-close the (possibly cut) string to undo JSON escapes
+        return json.loads(f'"{match.group(1).rstrip(chr(92))}"')
+    except json.JSONDecodeError:
+        return None
+
+
+def _partial_plan(text):
+    """
+    Recover recipient and message from a truncated object, if both started.
+    """
+    recipient = partial_field(text, 'recipient')
+    message = partial_field(text, 'message')
+    if recipient is None or message is None:
+        return None
+    return {'recipient': recipient, 'message': message}
+
+
+def extract_plan(text):
+    """
+    Parse a plan from model output.
+
+    Returns (plan, repaired): plan is a {'recipient', 'message'} dict or
+    None, and repaired is True when the text was not a bare plan object
+    but a plan could still be recovered from it.
+    """
+    try:
+        plan = _as_plan(json.loads(text))
+        if plan is not None:
+            return plan, False
+    except json.JSONDecodeError:
+        pass
+    # The first decodable object holding a plan, wherever it starts
+    start = text.find('{')
+    while start != -1:
+        try:
+            obj, _ = _DECODER.raw_decode(text, start)
+        except json.JSONDecodeError:
+            obj = None
+        plan = _as_plan(obj)
+        if plan is not None:
+            return plan, True
+        start = text.find('{', start + 1)
+    plan = _partial_plan(text)
+    return plan, plan is not None
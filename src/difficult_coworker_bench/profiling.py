@@ -0,0 +1,313 @@
+"""
+Per-call latency, token and cost profiles for simulation runs.
+
+Every agent API call (or cache/cassette hit) is recorded into the run's
+Profile under its role and phase. Latencies go into log-bucketed
+histograms, so profiles stay small, merge exactly into a batch profile
+and still give p50/p95/p99 to within a few percent.
+"""
+import json
+import math
+import os
+
+# USD per million tokens: (input, cached input, output). Models are matched
+# by longest prefix, so dated snapshots (e.g. gpt-4o-2024-08-06) resolve too.
+PRICES = {
+    'gpt-4.1': (2.00, 0.50, 8.00),
+    'gpt-4.1-mini': (0.40, 0.10, 1.60),
+    'gpt-4.1-nano': (0.10, 0.025, 0.40),
+    'gpt-4o': (2.50, 1.25, 10.00),
+    'gpt-4o-mini': (0.15, 0.075, 0.60),
+    'o3': (2.00, 0.50, 8.00),
+    'o4-mini': (1.10, 0.275, 4.40),
+    'gpt-4-turbo': (10.00, 10.00, 30.00),
+    'gpt-4': (30.00, 30.00, 60.00),
+    'gpt-3.5-turbo': (0.50, 0.50, 1.50),
+}
+
+_PERCENTILES = (50, 95, 99)
+# Histogram buckets grow by 10% from 0.1 ms: at most ~5% error
+_BUCKET_BASE = 1e-4
+_BUCKET_GROWTH = 1.1
+
+
+def load_prices(path):
+    """
+    Read a price table from JSON: {model: [input, cached_input, output]}
+    in USD per million tokens. Entries extend and override PRICES.
+    """
+    with open(path) as f:
+        table = json.load(f)
+    prices = dict(PRICES)
+    for model, rates in table.items():
+        if len(rates) != 3:
+            raise ValueError(f"{path}: price for {model} must be [input, cached_input, output]")
+        prices[model] = tuple(float(r) for r in rates)
+    return prices
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens=0, prices=PRICES):
+    """
+    Return the estimated USD cost of one call, or None for unpriced models.
+    """
+    match = max((name for name in prices if model.startswith(name)), key=len, default=None)
+    if match is None:
+        return None
+    rate_in, rate_cached, rate_out = prices[match]
+    return (
+        (prompt_tokens - cached_tokens) * rate_in
+        + cached_tokens * rate_cached
+        + completion_tokens * rate_out
+    ) / 1e6
+
+
+class Histogram:
+    """
+    Log-bucketed histogram of non-negative values.
+    """
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        if value <= _BUCKET_BASE:
+            index = 0
+        else:
+            index = math.ceil(math.log(value / _BUCKET_BASE, _BUCKET_GROWTH))
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        for index, n in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + n
+        self.count += other.count
+        self.total += other.total
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def percentile(self, p):
+        """
+        Return the estimated p-th percentile (nearest rank), or None if empty.
+        """
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(p / 100 * self.count))
+        if rank == self.count:
+            return self.max
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                # Geometric middle of the bucket, kept within the observed range
+                value = _BUCKET_BASE * _BUCKET_GROWTH ** (index - 0.5) if index else 0.0
+                return min(max(value, self.min), self.max)
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'min': self.min,
+            'max': self.max,
+            **{f"p{p}": self.percentile(p) for p in _PERCENTILES},
+            'buckets': {str(i): n for i, n in sorted(self.counts.items())},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        hist = cls()
+        hist.counts = {int(i): n for i, n in data['buckets'].items()}
+        hist.count = data['count']
+        hist.total = data['sum']
+        hist.min = data['min']
+        hist.max = data['max']
+        return hist
+
+
+class PhaseStats:
+    """
+    Calls, latency, tokens and cost of one role's calls in one phase.
+    Streamed calls also record their time to first token, and streams
+    stopped early the estimated completion tokens they saved.
+    """
+    _COUNTERS = ('calls', 'cache_hits', 'prompt_tokens', 'completion_tokens',
+                 'cached_tokens', 'unpriced_calls', 'early_stops', 'tokens_saved')
+
+    def __init__(self, model):
+        self.model = model
+        self.latency = Histogram()
+        self.ttft = Histogram()
+        self.cost_usd = 0.0
+        for name in self._COUNTERS:
+            setattr(self, name, 0)
+
+    def merge(self, other):
+        self.latency.merge(other.latency)
+        self.ttft.merge(other.ttft)
+        self.cost_usd += other.cost_usd
+        for name in self._COUNTERS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def as_dict(self):
+        data = {'model': self.model, 'cost_usd': self.cost_usd,
+                'latency': self.latency.as_dict()}
+        if self.ttft.count:
+            # Only streamed calls have one; keeps unstreamed profiles small
+            data['ttft'] = self.ttft.as_dict()
+        data.update((name, getattr(self, name)) for name in self._COUNTERS)
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls(data['model'])
+        stats.latency = Histogram.from_dict(data['latency'])
+        if 'ttft' in data:
+            stats.ttft = Histogram.from_dict(data['ttft'])
+        stats.cost_usd = data['cost_usd']
+        for name in cls._COUNTERS:
+            # Profiles written before streaming lack its counters
+            setattr(stats, name, data.get(name, 0))
+        return stats
+
+
+class Profile:
+    """
+    Per-role, per-phase call statistics of a run or a whole batch.
+    """
+    def __init__(self, prices=PRICES):
+        self.prices = prices
+        self.phases = {}
+
+    def record(self, model, role, phase, latency, prompt_tokens=0,
+               completion_tokens=0, cached_tokens=0, cache_hit=False,
+               ttft=None, tokens_saved=None):
+        """
+        Record one call and return its estimated cost in USD. `ttft` is
+        the time to first token of a streamed call, and `tokens_saved` is
+        set for a stream stopped early.
+        """
+        stats = self.phases.get((role, phase))
+        if stats is None:
+            stats = self.phases[(role, phase)] = PhaseStats(model)
+        stats.calls += 1
+        stats.latency.add(latency)
+        if ttft is not None:
+            stats.ttft.add(ttft)
+        if tokens_saved is not None:
+            stats.early_stops += 1
+            stats.tokens_saved += tokens_saved
+        if cache_hit:
+            stats.cache_hits += 1
+            return 0.0
+        stats.prompt_tokens += prompt_tokens
+        stats.completion_tokens += completion_tokens
+        stats.cached_tokens += cached_tokens
+        cost = estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens, self.prices)
+        if cost is None:
+            stats.unpriced_calls += 1
+            return 0.0
+        stats.cost_usd += cost
+        return cost
+
+    def merge(self, other):
+        for key, stats in other.phases.items():
+            mine = self.phases.get(key)
+            if mine is None:
+                mine = self.phases[key] = PhaseStats(stats.model)
+            mine.merge(stats)
+
+    def total(self):
+        """
+        Return the PhaseStats of all calls combined.
+        """
+        total = PhaseStats(None)
+        for stats in self.phases.values():
+            total.merge(stats)
+        return total
+
+    def as_dict(self):
+        by_role = {}
+        for (role, phase), stats in sorted(self.phases.items()):
+            by_role.setdefault(role, {})[phase] = stats.as_dict()
+        total = self.total().as_dict()
+        del total['model']
+        return {'total': total, 'by_role': by_role}
+
+    @classmethod
+    def from_dict(cls, data, prices=PRICES):
+        profile = cls(prices)
+        for role, phases in data['by_role'].items():
+            for phase, stats in phases.items():
+                profile.phases[(role, phase)] = PhaseStats.from_dict(stats)
+        return profile
+
+    def to_prometheus(self, prefix='dcb'):
+        """
+        Render the profile in the Prometheus text exposition format.
+        """
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for suffix, labels, value in samples:
+                label_text = ','.join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f"{prefix}_{name}{suffix}{{{label_text}}} {value}")
+
+        items = sorted(self.phases.items())
+        labels = {key: {'role': key[0], 'phase': key[1], 'model': s.model} for key, s in items}
+        metric('calls_total', 'counter', 'Agent calls, including cache hits.',
+               [('', labels[k], s.calls) for k, s in items])
+        metric('cache_hits_total', 'counter', 'Agent calls answered from a cache or cassette.',
+               [('', labels[k], s.cache_hits) for k, s in items])
+        latency = []
+        for key, s in items:
+            for p in _PERCENTILES:
+                value = s.latency.percentile(p)
+                if value is not None:
+                    latency.append(('', {**labels[key], 'quantile': p / 100}, value))
+            latency.append(('_sum', labels[key], s.latency.total))
+            latency.append(('_count', labels[key], s.latency.count))
+        metric('call_latency_seconds', 'summary', 'Agent call latency.', latency)
+        ttft = []
+        for key, s in items:
+            if not s.ttft.count:
+                continue
+            for p in _PERCENTILES:
+                ttft.append(('', {**labels[key], 'quantile': p / 100}, s.ttft.percentile(p)))
+            ttft.append(('_sum', labels[key], s.ttft.total))
+            ttft.append(('_count', labels[key], s.ttft.count))
+        if ttft:
+            metric('time_to_first_token_seconds', 'summary',
+                   'Time to first token of streamed agent calls.', ttft)
+        tokens = []
+        for key, s in items:
+            for kind in ('prompt', 'completion', 'cached'):
+                tokens.append(('', {**labels[key], 'kind': kind}, getattr(s, f"{kind}_tokens")))
+        metric('tokens_total', 'counter', 'Tokens by kind (cached is a subset of prompt).', tokens)
+        metric('early_stops_total', 'counter', 'Streams stopped once the secret had leaked.',
+               [('', labels[k], s.early_stops) for k, s in items])
+        metric('tokens_saved_total', 'counter', 'Estimated completion tokens saved by early stops.',
+               [('', labels[k], s.tokens_saved) for k, s in items])
+        metric('cost_usd_total', 'counter', 'Estimated cost from the local price table.',
+               [('', labels[k], s.cost_usd) for k, s in items])
+        return '\n'.join(lines) + '\n'
+
+
+def write_atomic(path, text):
+    """
+    Write text to path via a temporary file, so readers never see it half-written.
+    """
+    dirpath = os.path.dirname(path)
+    if dirpath:
+        os.makedirs(dirpath, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        f.write(text)
+    os.replace(tmp, path)
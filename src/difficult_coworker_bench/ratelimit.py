@@ -0,0 +1,303 @@
+"""
+Rate limiting, retries and backoff for agent API calls.
+
+A RateLimiter is shared by every agent of a process. Per model it keeps
+token buckets for requests and tokens per minute and an adaptive limit on
+calls in flight that is halved on every 429 and grows back slowly on
+success. Failed calls are retried with jittered exponential backoff that
+honors the server's retry-after hints.
+
+A SharedBudget moves the request and token buckets into shared memory,
+so the worker processes of a sweep draw on one budget per model.
+"""
+import random
+import threading
+import time
+
+# How often a caller blocked on the concurrency limit re-checks it
+_POLL_INTERVAL = 0.02
+
+
+def retry_after(error):
+    """
+    Return the server's retry-after hint in seconds, if the error has one.
+    """
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    for name, scale in (('retry-after-ms', 0.001), ('retry-after', 1.0)):
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return max(float(value) * scale, 0.0)
+        except ValueError:
+            # HTTP-date form; fall back to our own backoff
+            return None
+    return None
+
+
+def classify(error):
+    """
+    Return 'throttled', 'transient' or None (not retryable) for an API error.
+    """
+    status = getattr(error, 'status_code', None)
+    if status == 429:
+        # Exhausted quota is not going to recover by waiting
+        if getattr(error, 'code', None) == 'insufficient_quota':
+            return None
+        return 'throttled'
+    if status is not None:
+        return 'transient' if status >= 500 or status == 408 else None
+    name = type(error).__name__
+    if name in ('APITimeoutError', 'APIConnectionError', 'TimeoutError', 'ConnectionError'):
+        return 'transient'
+    return None
+
+
+class RetryPolicy:
+    """
+    Jittered exponential backoff: attempt n waits a random time up to
+    base_delay * 2**n (capped at max_delay), or the retry-after hint.
+    """
+    def __init__(self, max_retries=6, base_delay=0.5, max_delay=60.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt, hint=None):
+        if hint is not None:
+            # Small jitter so throttled callers do not return in lockstep
+            return min(hint, self.max_delay) + random.uniform(0, self.base_delay / 2)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class TokenBucket:
+    """
+    Bucket refilled at `per_minute` units per minute, holding at most one
+    minute's worth. Reservations may overdraw it; the caller then waits
+    until the debt is repaid.
+    """
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount):
+        """
+        Take amount units and return how many seconds to wait before use.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            return max(0.0, -self.tokens / self.rate)
+
+    def refund(self, amount):
+        """
+        Return over-reserved units (negative amounts charge extra).
+        """
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class SharedTokenBucket:
+    """
+    TokenBucket kept in shared memory: processes that inherit it (e.g. as
+    pool initializer arguments) reserve from the same budget.
+    """
+    def __init__(self, per_minute):
+        import multiprocessing
+
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        # [tokens, updated]; time.monotonic() is system-wide, so comparable across processes
+        self._state = multiprocessing.Array('d', [self.capacity, time.monotonic()])
+
+    def reserve(self, amount):
+        with self._state.get_lock():
+            now = time.monotonic()
+            tokens = min(self.capacity, self._state[0] + (now - self._state[1]) * self.rate)
+            self._state[0] = tokens - amount
+            self._state[1] = now
+            return max(0.0, -self._state[0] / self.rate)
+
+    def refund(self, amount):
+        with self._state.get_lock():
+            self._state[0] = min(self.capacity, self._state[0] + amount)
+
+
+class SharedBudget:
+    """
+    Per-model request and token buckets shared across processes. Must be
+    created before the processes that use it are started.
+    """
+    def __init__(self, models, rpm=None, tpm=None):
+        self.buckets = {
+            model: (SharedTokenBucket(rpm) if rpm else None, SharedTokenBucket(tpm) if tpm else None)
+            for model in sorted(set(models))
+        }
+
+
+class ModelLimiter:
+    """
+    Request/token buckets and adaptive in-flight limit for one model.
+    """
+    def __init__(self, rpm=None, tpm=None, max_concurrency=None):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.max_concurrency = max_concurrency
+        # None means unlimited until the first 429
+        self.limit = float(max_concurrency) if max_concurrency else None
+        self.in_flight = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens):
+        """
+        Reserve one request and `tokens` tokens; returns seconds to wait.
+        """
+        wait = 0.0
+        if self.requests is not None:
+            wait = self.requests.reserve(1)
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.reserve(tokens))
+        return wait
+
+    def try_enter(self):
+        with self._lock:
+            if self.limit is not None and self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self, outcome):
+        """
+        Release an in-flight slot and adapt the limit: halve it on a 429,
+        grow it by about one slot per limit's worth of successes otherwise.
+        """
+        with self._lock:
+            self.in_flight -= 1
+            if outcome == 'throttled':
+                self.throttled += 1
+                current = self.limit if self.limit is not None else self.in_flight + 1
+                self.limit = max(1.0, current / 2)
+            elif outcome == 'ok' and self.limit is not None:
+                self.limit += 1.0 / self.limit
+                if self.max_concurrency and self.limit > self.max_concurrency:
+                    self.limit = float(self.max_concurrency)
+
+
+class RateLimiter:
+    """
+    Shared retry engine and per-model limiters.
+
+    `limits` maps a model name to a dict with optional 'rpm' and 'tpm';
+    `default_limits` applies to models not listed. `completion_tokens` is
+    the completion size assumed when reserving tokens before a call.
+    Models in `budget` (a SharedBudget) use its buckets instead.
+    """
+    def __init__(self, limits=None, default_limits=None, policy=None,
+                 max_concurrency=None, completion_tokens=512, budget=None):
+        self.limits = limits or {}
+        self.default_limits = default_limits or {}
+        self.policy = policy or RetryPolicy()
+        self.max_concurrency = max_concurrency
+        self.completion_tokens = completion_tokens
+        self.budget = budget
+        self.retries = 0
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def for_model(self, model):
+        with self._lock:
+            limiter = self._models.get(model)
+            if limiter is None:
+                cfg = self.limits.get(model, self.default_limits)
+                limiter = self._models[model] = ModelLimiter(
+                    cfg.get('rpm'), cfg.get('tpm'), self.max_concurrency
+                )
+                if self.budget is not None and model in self.budget.buckets:
+                    limiter.requests, limiter.tokens = self.budget.buckets[model]
+            return limiter
+
+    def _settle(self, limiter, reserved, usage):
+        """
+        Correct the token reservation with the actual usage of a response:
+        the SDK's usage object of a completion, or the usage dict of a
+        streamed reply.
+        """
+        if limiter.tokens is not None and usage is not None:
+            if isinstance(usage, dict):
+                prompt, completion = usage.get('prompt_tokens'), usage.get('completion_tokens')
+            else:
+                prompt, completion = usage.prompt_tokens, usage.completion_tokens
+            limiter.tokens.refund(reserved - (prompt or 0) - (completion or 0))
+
+    def call(self, model, tokens, fn):
+        """
+        Run fn() under the model's limits, retrying retryable errors.
+        """
+        limiter = self.for_model(model)
+        reserved = tokens + self.completion_tokens
+        attempt = 0
+        while True:
+            time.sleep(limiter.reserve(reserved))
+            while not limiter.try_enter():
+                time.sleep(_POLL_INTERVAL)
+            try:
+                resp = fn()
+            except Exception as e:
+                kind = classify(e)
+                limiter.leave(kind or 'error')
+                if kind is None or attempt >= self.policy.max_retries:
+                    raise
+                self.retries += 1
+                time.sleep(self.policy.delay(attempt, retry_after(e)))
+                attempt += 1
+                continue
+            limiter.leave('ok')
+            self._settle(limiter, reserved, getattr(resp, 'usage', None))
+            return resp
+
+    async def acall(self, model, tokens, fn):
+        """
+        Async counterpart of call; fn() returns an awaitable.
+        """
+        import asyncio
+
+        limiter = self.for_model(model)
+        reserved = tokens + self.completion_tokens
+        attempt = 0
+        while True:
+            await asyncio.sleep(limiter.reserve(reserved))
+            while not limiter.try_enter():
+                await asyncio.sleep(_POLL_INTERVAL)
+            try:
+                resp = await fn()
+            except Exception as e:
+                kind = classify(e)
+                limiter.leave(kind or 'error')
+                if kind is None or attempt >= self.policy.max_retries:
+                    raise
+                self.retries += 1
+                await asyncio.sleep(self.policy.delay(attempt, retry_after(e)))
+                attempt += 1
+                continue
+            limiter.leave('ok')
+            self._settle(limiter, reserved, getattr(resp, 'usage', None))
+            return resp
+
+    def stats(self):
+        """
+        Return retry and throttle counters plus the current in-flight limits.
+        """
+        return {
+            'retries': self.retries,
+            'throttled': {m: l.throttled for m, l in self._models.items()},
+            'concurrency_limit': {m: l.limit for m, l in self._models.items()},
+        }
@@ -0,0 +1,220 @@
+"""
+Streaming result storage and constant-memory batch statistics.
+"""
+import gzip
+import json
+import os
+import re
+from collections import Counter
+
+from .turns import recipient_of
+
+_RUN_FILE_RE = re.compile(r'_run\d+\.json$')
+
+
+def escalation_turn(conversation):
+    """
+    Return the 1-based index of the protagonist's first message to the
+    supervisor, or None if the protagonist never escalated.
+    """
+    for i, entry in enumerate(conversation, 1):
+        if entry['role'] == 'protagonist' and recipient_of(entry) == 'supervisor':
+            return i
+    return None
+
+
+class RunningStat:
+    """
+    Count, mean, min and max of a stream of numbers.
+    """
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def as_dict(self):
+        return {'count': self.count, 'mean': self.mean, 'min': self.min, 'max': self.max}
+
+
+class BatchSummary:
+    """
+    Online summary of a batch: outcome counts, conversation lengths,
+    escalation turns and usage totals, updated one result at a time.
+    """
+    def __init__(self):
+        self.runs = 0
+        self.outcomes = Counter()
+        self.turns = RunningStat()
+        self.escalation = RunningStat()
+        self.usage = Counter()
+        self.prompt_tokens_per_call = RunningStat()
+
+    def add(self, result):
+        self.runs += 1
+        self.outcomes[result['outcome']] += 1
+        conversation = result['conversation']
+        self.turns.add(len(conversation))
+        turn = escalation_turn(conversation)
+        if turn is not None:
+            self.escalation.add(turn)
+        for key, value in (result.get('usage') or {}).items():
+            if key == 'prompt_token_curve':
+                for tokens in value:
+                    self.prompt_tokens_per_call.add(tokens)
+            else:
+                self.usage[key] += value
+
+    def as_dict(self):
+        return {
+            'runs': self.runs,
+            'outcomes': dict(self.outcomes),
+            'turns': self.turns.as_dict(),
+            'escalated_runs': self.escalation.count,
+            'escalation_turn': self.escalation.as_dict(),
+            'usage': dict(self.usage),
+            'prompt_tokens_per_call': self.prompt_tokens_per_call.as_dict(),
+        }
+
+
+class ResultSink:
+    """
+    Appends each finished run as one JSONL record, gzip-compressed when
+    the path ends in '.gz'. An existing file is truncated unless `append`.
+    """
+    def __init__(self, path, append=False):
+        self.path = path
+        dirpath = os.path.dirname(path)
+        if dirpath:
+            os.makedirs(dirpath, exist_ok=True)
+        self.compressed = path.endswith('.gz')
+        mode = 'a' if append else 'w'
+        if self.compressed:
+            self._fh = gzip.open(path, mode + 't', encoding='utf-8')
+        else:
+            self._fh = open(path, mode, encoding='utf-8')
+
+    def write(self, result):
+        self._fh.write(json.dumps(result, separators=(',', ':')) + '\n')
+        if not self.compressed:
+            # Keep every finished run on disk even if the batch dies
+            self._fh.flush()
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+def read_results(path):
+    """
+    Iterate over the run records of a JSONL (optionally .gz) result file.
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _summary_path(sink_path):
+    """
+    Return the summary file path that accompanies a result sink.
+    """
+    base = sink_path[:-3] if sink_path.endswith('.gz') else sink_path
+    return os.path.splitext(base)[0] + '.summary.json'
+
+
+def result_sources(paths):
+    """
+    Expand paths into result files: result sinks (*.jsonl, *.jsonl.gz)
+    and per-run *_runN.json files found in directories, plus any file
+    named explicitly.
+    """
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, dirs, names in os.walk(path):
+            dirs.sort()
+            for name in sorted(names):
+                if name.endswith(('.manifest.jsonl', '.events.jsonl')):
+                    continue
+                if name.endswith(('.jsonl', '.jsonl.gz')) or _RUN_FILE_RE.search(name):
+                    yield os.path.join(root, name)
+
+
+def read_source(path):
+    """
+    Yield the run results in a sink, per-run or aggregated results file;
+    other records (e.g. events) are skipped.
+    """
+    if path.endswith(('.jsonl', '.jsonl.gz')):
+        for record in read_results(path):
+            if isinstance(record, dict) and 'conversation' in record:
+                yield record
+        return
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    for record in data if isinstance(data, list) else [data]:
+        if isinstance(record, dict) and 'conversation' in record:
+            yield record
+
+
+def run_key(result):
+    """
+    Return the identity of a run: its matrix cell (scenario, models and
+    temperatures) and run index.
+    """
+    return (result.get('scenario'), json.dumps(result.get('models'), sort_keys=True),
+            json.dumps(result.get('temperatures'), sort_keys=True), result['run'])
+
+
+def merge_results(paths, out_path):
+    """
+    Merge the result files of several shards (sinks, per-run or
+    aggregated JSON files, or directories of them) into one result set at
+    out_path, with its summary file.
+
+    A run found in more than one file (see run_key) is kept once. Raises
+    ValueError, leaving no output, if a path holds no runs. Returns the
+    BatchSummary of the merged set.
+    """
+    summary = BatchSummary()
+    seen = set()
+    out_abs = os.path.abspath(out_path)
+    sink = ResultSink(out_path)
+    try:
+        for path in paths:
+            found = 0
+            for source in result_sources([path]):
+                if os.path.abspath(source) == out_abs:
+                    continue
+                for result in read_source(source):
+                    found += 1
+                    key = run_key(result)
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    sink.write(result)
+                    summary.add(result)
+            if not found:
+                raise ValueError(f"No runs found in {path}")
+    except BaseException:
+        sink.close()
+        os.remove(out_path)
+        raise
+    sink.close()
+    with open(_summary_path(out_path), 'w') as f:
+        json.dump(summary.as_dict(), f, indent=2)
+    return summary
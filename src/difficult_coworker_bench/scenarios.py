@@ -0,0 +1,130 @@
+"""
+Scenario libraries and deterministic sharding of the run matrix.
+
+A scenario is a JSON object with an `id`, a `missing_info` payload and
+optional `roles` overrides merged over the role definitions:
+
+    {"id": "db-config", "missing_info": {...},
+     "roles": {"coworker": {"description": "..."}}}
+
+A library is either a JSONL file with one scenario per line or a
+directory of `*.json` files (one scenario each; the id defaults to the
+file name). Scenarios are read lazily, one at a time, so a library can
+be larger than memory.
+
+Shard i/N owns the cells of the scenario x model x temperature x run
+matrix whose key hashes to i, so any number of nodes can split a batch
+without a coordinator and their outputs merge into one result set.
+"""
+import hashlib
+import json
+import os
+import re
+
+from .simulation import validate_missing_info, validate_roles
+
+_ID_RE = re.compile(r'^[\w.-]+$')
+
+
+def merge_roles(roles, overrides):
+    """
+    Return roles with per-role field overrides applied.
+    """
+    unknown = set(overrides or {}) - set(roles)
+    if unknown:
+        raise ValueError(f"unknown role(s): {', '.join(sorted(unknown))}")
+    return {key: {**role, **(overrides or {}).get(key, {})} for key, role in roles.items()}
+
+
+def _scenario(data, default_id, roles):
+    """
+    Validate one scenario object and return it with its merged roles.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("a scenario must be a JSON object")
+    scenario_id = data.get('id', default_id)
+    if not isinstance(scenario_id, str) or not _ID_RE.match(scenario_id):
+        raise ValueError(f"invalid scenario id {scenario_id!r} (letters, digits, '_', '.', '-')")
+    try:
+        validate_missing_info(data.get('missing_info'))
+        merged = merge_roles(roles, data.get('roles'))
+        validate_roles(merged)
+    except ValueError as e:
+        raise ValueError(f"scenario {scenario_id}: {e}") from None
+    return {'id': scenario_id, 'missing_info': data['missing_info'], 'roles': merged}
+
+
+def iter_scenarios(path, roles):
+    """
+    Lazily yield the validated scenarios of a library, in file order.
+    Raises ValueError on an invalid or duplicate scenario when reached.
+    """
+    seen = set()
+
+    def check(scenario):
+        if scenario['id'] in seen:
+            raise ValueError(f"duplicate scenario id {scenario['id']!r} in {path}")
+        seen.add(scenario['id'])
+        return scenario
+
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if not name.endswith('.json'):
+                continue
+            file_path = os.path.join(path, name)
+            try:
+                with open(file_path) as f:
+                    data = json.load(f)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{file_path}: invalid JSON: {e}") from None
+            yield check(_scenario(data, os.path.splitext(name)[0], roles))
+        return
+    with open(path) as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{lineno}: invalid JSON: {e}") from None
+            yield check(_scenario(data, f"line{lineno}", roles))
+
+
+class Shard:
+    """
+    Shard `index` of `count` (1-based) of a run matrix.
+    """
+    def __init__(self, index, count):
+        if count < 1 or not 1 <= index <= count:
+            raise ValueError(f"invalid shard {index}/{count}")
+        self.index = index
+        self.count = count
+
+    @classmethod
+    def parse(cls, spec):
+        """
+        Parse an 'i/N' shard spec.
+        """
+        index, sep, count = spec.partition('/')
+        try:
+            return cls(int(index), int(count))
+        except ValueError:
+            raise ValueError(f"invalid shard {spec!r}; expected i/N with 1 <= i <= N") from None
+
+    def owns(self, cell):
+        """
+        Return True if this shard runs the matrix cell `cell` (a
+        JSON-serializable key); the same on every node.
+        """
+        key = json.dumps(cell, sort_keys=True).encode('utf-8')
+        return int(hashlib.sha256(key).hexdigest()[:16], 16) % self.count == self.index - 1
+
+    def owns_run(self, scenario, models, temperatures, run):
+        """
+        Return True if this shard runs `run` of a scenario (None outside a
+        library) with the given per-role models and temperatures.
+        """
+        return self.owns([scenario, models, temperatures, run])
+
+    def __str__(self):
+        return f"{self.index}/{self.count}"
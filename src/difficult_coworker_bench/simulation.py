@@ -3,27 +3,99 @@ Simulation framework for difficult-coworker-bench.
 """
 import os
 import json
+import time
+from collections import Counter
 
-from .agent import Agent
+from .agent import Agent, CURRENT_PROFILE, CURRENT_RUN, CURRENT_USAGE, new_usage
+from .cassette import Cassette, CassetteMismatch
+from .context import ContextBudget
+from .events import EventLog
+from .forking import ConversationTree
+from .leaks import LeakDetector, secret_fragments
+from .parsing import extract_plan
+from .profiling import PRICES, Profile, write_atomic
+from .ratelimit import RateLimiter
+from .results import BatchSummary, _summary_path, read_results
+from .turns import Role, Turn, as_turns
 
-def load_roles():
+# Usage counters reported per agent call in 'call' events
+_CALL_COUNTERS = ('calls', 'cache_hits', 'prompt_tokens', 'completion_tokens',
+                  'cached_prompt_tokens', 'cost_usd')
+
+
+def _snapshot(usage):
+    return {k: usage[k] for k in _CALL_COUNTERS}
+
+
+# Usage counters recorded per conversation turn
+_TURN_COUNTERS = ('calls', 'prompt_tokens', 'completion_tokens')
+
+
+def _turn_usage(usage, before):
     """
-    Define the roles and context for each agent.
+    Return the usage of a turn's calls since the snapshot before, or None.
     """
-    return {
-        "protagonist": {
-            "name": "Protagonist",
-            "description": "The protagonist agent responsible for completing the project."
-        },
-        "coworker": {
-            "name": "Coworker",
-            "description": "A difficult coworker who has the information needed but is unhelpful."
-        },
-        "supervisor": {
-            "name": "Supervisor",
-            "description": "The supervisor who can provide assistance if contacted."
-        }
-    }
+    delta = {k: usage[k] - before[k] for k in _TURN_COUNTERS}
+    return delta if delta['calls'] else None
+
+# Default role definitions; see load_roles
+ROLES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'roles.json')
+
+
+def load_roles(path=None):
+    """
+    Load the role definitions (name and description per role key) from a
+    JSON file, by default the package's roles.json.
+    """
+    with open(path or ROLES_FILE) as f:
+        roles = json.load(f)
+    validate_roles(roles)
+    return roles
+
+
+def validate_roles(roles):
+    """
+    Raise ValueError unless roles defines a name and description for every agent.
+    """
+    if not isinstance(roles, dict):
+        raise ValueError("roles must be a JSON object")
+    for key in ('protagonist', 'coworker', 'supervisor'):
+        role = roles.get(key)
+        if not isinstance(role, dict):
+            raise ValueError(f"roles need a '{key}' object")
+        for field in ('name', 'description'):
+            if not isinstance(role.get(field), str):
+                raise ValueError(f"role '{key}' needs a string '{field}'")
+
+
+def validate_missing_info(missing_info):
+    """
+    Raise ValueError if a missing-info payload lacks a field the agents use.
+    """
+    if not isinstance(missing_info, dict):
+        raise ValueError("missing info must be a JSON object")
+    for key, kind in (('description', str), ('content', str), ('max_attempts', int)):
+        if not isinstance(missing_info.get(key), kind):
+            raise ValueError(f"missing info needs a {kind.__name__} '{key}'")
+    if missing_info['max_attempts'] < 1:
+        raise ValueError("max_attempts must be at least 1")
+    fragments = missing_info.get('fragments')
+    if fragments is not None and (
+            not isinstance(fragments, list) or not all(isinstance(f, str) for f in fragments)):
+        raise ValueError("missing info 'fragments' must be a list of strings")
+
+
+def estimate_calls(max_attempts, fused=False):
+    """
+    Return the estimated API calls of a run that never escalates: the
+    protagonist asks the coworker until max_attempts is exceeded. It is
+    not a bound. Each escalation adds two turns, and each context fold or
+    plan re-ask adds a call. A run also ends sooner on an invalid
+    recipient, a plan that still cannot be parsed, or a leaked secret.
+    """
+    turns = 2 * max_attempts + 1
+    return turns if fused else 2 * turns
+
 
 class Simulation:
     """
@@ -32,11 +104,69 @@ class Simulation:
     def __init__(self, roles, missing_info,
                  protagonist_model, coworker_model, supervisor_model,
                  protagonist_temp, coworker_temp, supervisor_temp,
-                 memory_file, output_file):
+                 memory_file, output_file, concurrency=1, cache=None,
+                 cassette=None, fused=False, context_budget=None, events=None,
+                 sink=None, manifest=None, rate_limiter=None, backend=None,
+                 prices=None, profile_file=None, metrics_file=None,
+                 structured_output=True, max_reasks=1, stream=False, batch=None,
+                 scenario=None, shard=None, hedge=None, turn_usage=False):
         self.roles = roles
         self.missing_info = missing_info
         self.memory_file = memory_file
         self.output_file = output_file
+        # Number of runs executed at once; >1 switches run() to the asyncio path
+        self.concurrency = concurrency
+        # Optional ResponseCache shared by all agents
+        self.cache = cache
+        # Optional Cassette recording or replaying every agent call
+        self.cassette = cassette
+        # Use a single fused evaluate+plan call per agent turn
+        self.fused = fused
+        # Optional ContextBudget applied to every agent's conversation context
+        self.context_budget = context_budget
+        # Structured event log; also renders the console stream and memory files
+        self.events = events or EventLog(tag_runs=concurrency > 1 or batch is not None)
+        # Optional ResultSink; when set, runs are streamed to it instead of
+        # per-run JSON files and results are not kept in memory
+        self.sink = sink
+        self.summary = BatchSummary()
+        # Optional BatchManifest used to checkpoint and resume batches
+        self.manifest = manifest
+        # Optional RateLimiter shared by all agents (default: the process-wide one)
+        self.rate_limiter = rate_limiter
+        # Optional backend shared by all agents (default: the OpenAI backend)
+        self.backend = backend
+        # Price table for cost estimates, and the batch profile written to
+        # profile_file (JSON) and metrics_file (Prometheus text) if set
+        self.prices = prices or PRICES
+        self.profile = Profile(self.prices)
+        self.profile_file = profile_file
+        self.metrics_file = metrics_file
+        # Request schema-constrained JSON plans from the protagonist and
+        # supervisor, and re-ask up to max_reasks times for a plan that
+        # cannot be parsed or repaired
+        self.structured_output = structured_output
+        self.max_reasks = max_reasks
+        # Stream completions; coworker and supervisor replies then stop as
+        # soon as the whole secret has reached the protagonist
+        self.stream = stream
+        # Id of the library scenario this batch runs (recorded in each
+        # result), and the optional Shard whose runs alone are executed
+        self.scenario = scenario
+        self.shard = shard
+        # Optional BatchScheduler: all runs are then in flight at once and
+        # advance in lockstep, each step's calls submitted as one batch job.
+        # It serves the agents' calls; requests wait for their job rather
+        # than a rate limit (a concurrency cap would stall the lockstep).
+        self.batch = batch
+        # Optional HedgePolicy shared by all agents: calls slower than the
+        # observed p95 are duplicated, and each call is bounded by its deadline
+        self.hedge = hedge
+        # Record the calls and tokens behind each stored conversation turn
+        self.turn_usage = turn_usage
+        if batch is not None:
+            backend = batch
+            rate_limiter = RateLimiter()
         # Instantiate agents
         self.agents = {
             'protagonist': Agent(
@@ -45,7 +175,15 @@ class Simulation:
                 roles['protagonist']['description'],
                 missing_info,
                 protagonist_model,
-                protagonist_temp
+                protagonist_temp,
+                cache=cache,
+                cassette=cassette,
+                context=context_budget,
+                rate_limiter=rate_limiter,
+                backend=backend,
+                hedge=hedge,
+                structured_output=structured_output,
+                stream=stream
             ),
             'coworker': Agent(
                 'coworker',
@@ -53,7 +191,14 @@ class Simulation:
                 roles['coworker']['description'],
                 missing_info,
                 coworker_model,
-                coworker_temp
+                coworker_temp,
+                cache=cache,
+                cassette=cassette,
+                context=context_budget,
+                rate_limiter=rate_limiter,
+                backend=backend,
+                hedge=hedge,
+                stream=stream
             ),
             'supervisor': Agent(
                 'supervisor',
@@ -61,7 +206,15 @@ class Simulation:
                 roles['supervisor']['description'],
                 missing_info,
                 supervisor_model,
-                supervisor_temp
+                supervisor_temp,
+                cache=cache,
+                cassette=cassette,
+                context=context_budget,
+                rate_limiter=rate_limiter,
+                backend=backend,
+                hedge=hedge,
+                structured_output=structured_output,
+                stream=stream
             )
         }
 
@@ -82,58 +235,176 @@ class Simulation:
             print(f"Memory file '{path}' already exists.")
         return path
 
-    def run_once(self, run_idx, mem_file, out_file):
+    def _think(self, agent, conversation, emit):
         """
-        Execute a single simulation run.
+        Yield the agent calls for one turn of agent: internal analysis, then
+        planning (or a single fused call when self.fused is set).
+        Logs the analysis and returns the planned reply, or None on error.
         """
-        conversation = []
-        coworker_attempts = 0
-        outcome = None
-
-        # Ensure memory file initialized
-        self.init_memory(mem_file)
-
-        while True:
-            # Protagonist internal analysis and planning
-            prot_agent = self.agents['protagonist']
+        role = agent.role_key
+        if self.fused:
+            try:
+                analysis, reply = yield agent, 'turn', (conversation,)
+            except Exception as e:
+                emit('note', role=role, phase='turn', error=str(e),
+                     text=f"Error during {role} turn: {e}")
+                return None
+        else:
             # Evaluate
             try:
-                analysis = prot_agent.evaluate(conversation)
+                analysis = yield agent, 'evaluate', (conversation,)
             except Exception as e:
-                print(f"Error during protagonist evaluation: {e}")
-                outcome = 'error'
+                emit('note', role=role, phase='evaluate', error=str(e),
+                     text=f"Error during {role} evaluation: {e}")
+                return None
+        # Log analysis
+        emit('analysis', role=role, phase='turn' if self.fused else 'evaluate', text=analysis)
+        if self.fused:
+            return reply
+        # Plan
+        try:
+            return (yield agent, 'plan', (conversation, analysis))
+        except Exception as e:
+            emit('note', role=role, phase='plan', error=str(e),
+                 text=f"Error during {role} planning: {e}")
+            return None
+
+    def _parse_plan(self, agent, conversation, text, emit):
+        """
+        Yield the re-asks needed to read a plan from agent's reply text.
+
+        Malformed replies are repaired locally where possible (see
+        extract_plan); otherwise the agent is asked again, at most
+        self.max_reasks times. Returns (plan, outcome): the plan dict, or
+        None with the run outcome to record.
+        """
+        role = agent.role_key
+        usage = CURRENT_USAGE.get()
+        for attempt in range(self.max_reasks + 1):
+            plan, repaired = extract_plan(text)
+            if plan is not None:
+                if repaired:
+                    usage['plan_repairs'] += 1
+                return plan, None
+            emit('raw_plan', role=role, text=text)
+            if attempt == self.max_reasks:
                 break
-            # Log analysis
-            print(f"[Protagonist analysis]: {analysis}")
-            with open(mem_file, 'a') as mem:
-                mem.write(f"[Protagonist analysis]: {analysis}\n")
-            # Plan
+            usage['plan_reasks'] += 1
             try:
-                plan_text = prot_agent.plan(conversation, analysis)
+                text = yield agent, 'reask', (conversation, text)
             except Exception as e:
-                print(f"Error during protagonist planning: {e}")
+                emit('note', role=role, phase='reask', error=str(e),
+                     text=f"Error during {role} re-ask: {e}")
+                return None, 'error'
+        usage['plan_failures'] += 1
+        return None, 'moderate_failure'
+
+    @staticmethod
+    def _turn_phase(usage, reasks):
+        """
+        Return 'reask' if the plan count went up since `reasks`, i.e. a
+        re-ask produced the turn's message, else None: the turn or plan call
+        is implied by the run's fused setting.
+        """
+        if reasks is not None and usage['plan_reasks'] > reasks:
+            return 'reask'
+        return None
+
+    def _turn_usage(self, usage, before):
+        """
+        Return the usage of a turn's calls, if per-turn usage is recorded.
+        """
+        return _turn_usage(usage, before) if self.turn_usage else None
+
+    @staticmethod
+    def _leak_outcome(leaks, message, emit):
+        """
+        Scan a message that reached the protagonist for the secret, noting
+        newly leaked fragments. Returns 'strong_success' once all of it has
+        leaked, 'weak_success' if a specific part of it has, and None
+        otherwise.
+        """
+        seen = len(leaks.found)
+        leaks.scan(message)
+        outcome = leaks.outcome()
+        if outcome is not None and len(leaks.found) > seen:
+            emit('note', text=(
+                f"{len(leaks.found)}/{len(leaks.fragments)} fragments of the missing "
+                f"information reached the protagonist ({outcome})."
+            ))
+        return outcome
+
+    def _steps(self, run_idx, out_file, state=None, fork_at=None):
+        """
+        Generator implementing the conversation loop of a single run.
+
+        Yields (agent, phase, args) requests for agent calls and expects the
+        driver to send back the call result (or throw the raised exception).
+        Returns the result dict once the run is finished. `state` resumes an
+        interrupted run from its last checkpoint, or continues a branch of a
+        conversation tree. Tree nodes (out_file None) are not stored, and
+        stop with outcome None before protagonist turn `fork_at`.
+        """
+        emit = lambda kind, **fields: self.events.emit(run_idx, kind, **fields)
+        usage = CURRENT_USAGE.get()
+        # Per-run agent copies keep their incremental transcripts separate
+        agents = {key: agent.fork() for key, agent in self.agents.items()}
+        # Fragments of the secret that have reached the protagonist
+        leaks = LeakDetector(secret_fragments(self.missing_info))
+        if self.stream:
+            agents['coworker'].watch = leaks
+            agents['supervisor'].watch = leaks
+        conversation = []
+        coworker_attempts = 0
+        outcome = None
+        if state is not None:
+            conversation = as_turns(state['conversation'])
+            coworker_attempts = state['coworker_attempts']
+            if state.get('usage'):
+                usage.update(state['usage'])
+            for turn in conversation:
+                if turn.role is not Role.PROTAGONIST:
+                    leaks.scan(turn.text)
+            if state.get('fork'):
+                emit('note', text=f"Branching after {len(conversation)} messages.")
+            else:
+                emit('note', text=f"Resuming run {run_idx} after {len(conversation)} messages.")
+        checkpointed = len(conversation)
+
+        while True:
+            if self.manifest is not None and len(conversation) > checkpointed:
+                self.manifest.checkpoint(
+                    run_idx, [turn.as_dict() for turn in conversation[checkpointed:]],
+                    coworker_attempts, usage
+                )
+                checkpointed = len(conversation)
+            if fork_at is not None and (
+                sum(turn.role is Role.PROTAGONIST for turn in conversation) >= fork_at - 1
+            ):
+                emit('note', text=f"Forking after {len(conversation)} messages.")
+                break
+            # Protagonist internal analysis and planning
+            prot_agent = agents['protagonist']
+            before = _snapshot(usage)
+            plan_text = yield from self._think(prot_agent, conversation, emit)
+            if plan_text is None:
                 outcome = 'error'
                 break
 
             # Parse plan JSON
-            try:
-                msg_obj = json.loads(plan_text)
-                recipient = msg_obj.get('recipient', '').lower()
-                message = msg_obj.get('message', '').strip()
-            except json.JSONDecodeError:
-                print("Failed to parse protagonist plan as JSON:")
-                print(plan_text)
-                with open(mem_file, 'a') as mem:
-                    mem.write(f"[Protagonist RAW PLAN]: {plan_text}\n")
-                outcome = 'moderate_failure'
+            reasks = usage['plan_reasks']
+            msg_obj, outcome = yield from self._parse_plan(prot_agent, conversation, plan_text, emit)
+            if msg_obj is None:
                 break
+            recipient = msg_obj['recipient'].lower()
+            message = msg_obj['message'].strip()
 
             # Log plan
-            log_entry = f"[Protagonist -> {recipient}]: {message}"
-            print(log_entry)
-            with open(mem_file, 'a') as mem:
-                mem.write(log_entry + '\n')
-            conversation.append({'role': 'protagonist', 'content': f"[to {recipient}] {message}"})
+            emit('message', role='protagonist', recipient=recipient, text=message)
+            conversation.append(Turn(
+                len(conversation) + 1, Role.PROTAGONIST, message, recipient,
+                self._turn_phase(usage, reasks), self._turn_usage(usage, before)
+            ))
 
 
             # Route to coworker: internal analysis and planning
@@ -141,113 +412,645 @@ class Simulation:
                 coworker_attempts += 1
                 if coworker_attempts > self.missing_info['max_attempts']:
                     outcome = 'moderate_failure'
-                    print("Reached maximum coworker attempts.")
+                    emit('note', text="Reached maximum coworker attempts.")
                     break
-                cw_agent = self.agents['coworker']
-                # Evaluate
-                try:
-                    cw_analysis = cw_agent.evaluate(conversation)
-                except Exception as e:
-                    print(f"Error during coworker evaluation: {e}")
+                cw_agent = agents['coworker']
+                before = _snapshot(usage)
+                cw_resp = yield from self._think(cw_agent, conversation, emit)
+                if cw_resp is None:
                     outcome = 'error'
                     break
-                print(f"[Coworker analysis]: {cw_analysis}")
-                with open(mem_file, 'a') as mem:
-                    mem.write(f"[Coworker analysis]: {cw_analysis}\n")
-                # Plan
-                try:
-                    cw_resp = cw_agent.plan(conversation, cw_analysis)
-                except Exception as e:
-                    print(f"Error during coworker planning: {e}")
-                    outcome = 'error'
+                emit('message', role='coworker', recipient=None, text=cw_resp)
+                conversation.append(Turn(
+                    len(conversation) + 1, Role.COWORKER, cw_resp, None,
+                    self._turn_phase(usage, None), self._turn_usage(usage, before)
+                ))
+                if self._leak_outcome(leaks, cw_resp, emit) == 'strong_success':
+                    outcome = 'strong_success'
                     break
-                print(f"[Coworker]: {cw_resp}")
-                with open(mem_file, 'a') as mem:
-                    mem.write(f"[Coworker]: {cw_resp}\n")
-                conversation.append({'role': 'coworker', 'content': cw_resp})
                 continue
 
             # Route to supervisor: internal analysis and planning
             if recipient == 'supervisor':
-                sup_agent = self.agents['supervisor']
-                # Evaluate
-                try:
-                    sup_analysis = sup_agent.evaluate(conversation)
-                except Exception as e:
-                    print(f"Error during supervisor evaluation: {e}")
-                    outcome = 'error'
-                    break
-                print(f"[Supervisor analysis]: {sup_analysis}")
-                with open(mem_file, 'a') as mem:
-                    mem.write(f"[Supervisor analysis]: {sup_analysis}\n")
+                sup_agent = agents['supervisor']
+                before = _snapshot(usage)
                 # Plan (JSON output)
-                try:
-                    sup_plan = sup_agent.plan(conversation, sup_analysis)
-                except Exception as e:
-                    print(f"Error during supervisor planning: {e}")
+                sup_plan = yield from self._think(sup_agent, conversation, emit)
+                if sup_plan is None:
                     outcome = 'error'
                     break
                 # Parse JSON plan
-                try:
-                    msg_obj2 = json.loads(sup_plan)
-                    recipient2 = msg_obj2.get('recipient', '').lower()
-                    message2 = msg_obj2.get('message', '').strip()
-                except json.JSONDecodeError:
-                    print("Failed to parse supervisor plan as JSON:")
-                    print(sup_plan)
-                    with open(mem_file, 'a') as mem:
-                        mem.write(f"[Supervisor RAW PLAN]: {sup_plan}\n")
-                    outcome = 'moderate_failure'
+                reasks = usage['plan_reasks']
+                msg_obj2, outcome = yield from self._parse_plan(sup_agent, conversation, sup_plan, emit)
+                if msg_obj2 is None:
                     break
+                recipient2 = msg_obj2['recipient'].lower()
+                message2 = msg_obj2['message'].strip()
                 # Log supervisor action
-                log_sup = f"[Supervisor -> {recipient2}]: {message2}"
-                print(log_sup)
-                with open(mem_file, 'a') as mem:
-                    mem.write(log_sup + '\n')
-                conversation.append({'role': 'supervisor', 'content': message2})
+                emit('message', role='supervisor', recipient=recipient2, text=message2)
+                conversation.append(Turn(
+                    len(conversation) + 1, Role.SUPERVISOR, message2, recipient2,
+                    self._turn_phase(usage, reasks), self._turn_usage(usage, before)
+                ))
+                if self._leak_outcome(leaks, message2, emit) == 'strong_success':
+                    outcome = 'strong_success'
+                    break
                 # Route based on supervisor's plan
                 if recipient2 == 'coworker':
                     continue
                 elif recipient2 == 'protagonist':
                     continue 
                 else:
-                    print(f"Unknown supervisor recipient: '{recipient2}'")
+                    emit('note', text=f"Unknown supervisor recipient: '{recipient2}'")
                     outcome = 'moderate_failure'
                     break
 
             # Unknown recipient
-            print(f"Unknown recipient: '{recipient}'")
+            emit('note', text=f"Unknown recipient: '{recipient}'")
             outcome = 'moderate_failure'
             break
 
+        if outcome == 'moderate_failure' and leaks.outcome() == 'weak_success':
+            # Part of the secret leaked before the run gave up on the rest
+            outcome = 'weak_success'
+
         # Write output JSON
-        result = { 'run': run_idx, 'outcome': outcome, 'conversation': conversation }
+        result = { 'run': run_idx, 'outcome': outcome,
+                   'conversation': [turn.as_dict() for turn in conversation], 'usage': usage,
+                   'profile': CURRENT_PROFILE.get().as_dict(),
+                   'models': {k: a.model for k, a in self.agents.items()},
+                   'temperatures': {k: a.temperature for k, a in self.agents.items()} }
+        if self.scenario is not None:
+            result['scenario'] = self.scenario
+        if out_file is None:
+            # A node of a conversation tree, stored by run_tree
+            result['coworker_attempts'] = coworker_attempts
+            if outcome is not None:
+                emit('outcome', outcome=outcome, output=self.output_file)
+            return result
+        output = self._store_result(result, out_file)
+        if self.manifest is not None:
+            self.manifest.complete(run_idx, outcome)
+        emit('outcome', outcome=outcome, output=output)
+        return result
+
+    def _store_result(self, result, out_file):
+        """
+        Persist a finished run and add it to the batch summary.
+        Returns where the run was written.
+        """
+        self._tally(result)
+        if self.sink is not None:
+            self.sink.write(result)
+            return self.sink.path
         out_dir = os.path.dirname(out_file)
         if out_dir:
             os.makedirs(out_dir, exist_ok=True)
         with open(out_file, 'w') as fout:
             json.dump(result, fout, indent=2)
-        print(f"Run {run_idx} complete ({outcome}). Output: {out_file}")
-        return result
+        return out_file
 
-    def run(self, runs):
+    def _tally(self, result):
         """
-        Execute multiple simulation runs and optionally aggregate results.
+        Add a finished run to the batch summary and profile.
+        """
+        self.summary.add(result)
+        if result.get('profile'):
+            self.profile.merge(Profile.from_dict(result['profile'], self.prices))
+
+    def _start_run(self, run_idx, mem_file):
+        """
+        Prepare per-run logging and checkpoint state before the first step
+        of a run. Returns the state to resume from, if any.
+        """
+        if self.events.memory:
+            # Ensure memory file initialized
+            self.init_memory(mem_file)
+            self.events.open_run(run_idx, mem_file)
+        if self.manifest is None:
+            return None
+        state = self.manifest.state(run_idx)
+        if state is None:
+            self.manifest.start(run_idx)
+        return state
+
+    def _call_event(self, run_idx, agent, phase, started, before, error=None):
+        """
+        Emit a 'call' event with the latency and usage of one agent call.
+        """
+        usage = CURRENT_USAGE.get()
+        delta = {k: usage[k] - before[k] for k in _CALL_COUNTERS}
+        self.events.emit(
+            run_idx, 'call', role=agent.role_key, phase=phase, model=agent.model,
+            latency=time.perf_counter() - started, error=error, **delta
+        )
+
+    def run_once(self, run_idx, mem_file, out_file):
+        """
+        Execute a single simulation run.
+        """
+        state = self._start_run(run_idx, mem_file)
+        return self._drive(run_idx, self._steps(run_idx, out_file, state))
+
+    def _drive(self, run_idx, steps):
+        """
+        Make the agent calls requested by a _steps generator; return its result.
+        """
+        run_token = CURRENT_RUN.set(run_idx)
+        usage_token = CURRENT_USAGE.set(new_usage())
+        profile_token = CURRENT_PROFILE.set(Profile(self.prices))
+        try:
+            agent, phase, args = next(steps)
+            while True:
+                started = time.perf_counter()
+                before = _snapshot(CURRENT_USAGE.get())
+                try:
+                    value = getattr(agent, phase)(*args)
+                except CassetteMismatch:
+                    raise
+                except Exception as e:
+                    self._call_event(run_idx, agent, phase, started, before, error=str(e))
+                    agent, phase, args = steps.throw(e)
+                else:
+                    self._call_event(run_idx, agent, phase, started, before)
+                    agent, phase, args = steps.send(value)
+        except StopIteration as stop:
+            return stop.value
+        finally:
+            CURRENT_RUN.reset(run_token)
+            CURRENT_USAGE.reset(usage_token)
+            CURRENT_PROFILE.reset(profile_token)
+            self.events.flush()
+
+    async def arun_once(self, run_idx, mem_file, out_file):
+        """
+        Execute a single simulation run using the async agent call path.
+        """
+        state = self._start_run(run_idx, mem_file)
+        return await self._adrive(run_idx, self._steps(run_idx, out_file, state))
+
+    async def _adrive(self, run_idx, steps):
+        """
+        Make the agent calls requested by a _steps generator on the async
+        path; return its result.
+        """
+        # Each run executes in its own task, so these do not leak across runs
+        CURRENT_RUN.set(run_idx)
+        CURRENT_USAGE.set(new_usage())
+        CURRENT_PROFILE.set(Profile(self.prices))
+        try:
+            agent, phase, args = next(steps)
+            while True:
+                started = time.perf_counter()
+                before = _snapshot(CURRENT_USAGE.get())
+                try:
+                    value = await getattr(agent, 'a' + phase)(*args)
+                except CassetteMismatch:
+                    raise
+                except Exception as e:
+                    self._call_event(run_idx, agent, phase, started, before, error=str(e))
+                    agent, phase, args = steps.throw(e)
+                else:
+                    self._call_event(run_idx, agent, phase, started, before)
+                    agent, phase, args = steps.send(value)
+        except StopIteration as stop:
+            return stop.value
+
+    def _run_files(self, runs):
+        """
+        Yield (run_idx, mem_file, out_file) for each run of a batch.
         """
-        results = []
         mem_base, mem_ext = os.path.splitext(self.memory_file)
         out_base, out_ext = os.path.splitext(self.output_file)
+        models = {k: a.model for k, a in self.agents.items()}
+        temps = {k: a.temperature for k, a in self.agents.items()}
         for i in range(1, runs + 1):
+            if self.shard is not None and not self.shard.owns_run(self.scenario, models, temps, i):
+                continue
             if runs > 1:
                 mem_file = f"{mem_base}_run{i}{mem_ext}"
                 out_file = f"{out_base}_run{i}{out_ext}"
             else:
                 mem_file = self.memory_file
                 out_file = self.output_file
-            res = self.run_once(i, mem_file, out_file)
-            results.append(res)
-        if runs > 1:
+            yield i, mem_file, out_file
+
+    def _report_summary(self):
+        """
+        Print the batch summary: outcomes, per-run call and token averages,
+        and for fused mode the reduction against two-phase evaluate+plan calls.
+        """
+        summary = self.summary
+        n = summary.runs
+        if not n:
+            return
+        outcomes = ', '.join(f"{k}: {v}" for k, v in sorted(summary.outcomes.items(), key=str))
+        print(f"Outcomes over {n} run(s): {outcomes}")
+        print(f"Turns per run: mean {summary.turns.mean:.1f} (min {summary.turns.min}, max {summary.turns.max})")
+        if summary.escalation.count:
+            print(
+                f"Escalated to supervisor in {summary.escalation.count}/{n} runs, "
+                f"first at turn {summary.escalation.mean:.1f} on average"
+            )
+        total = summary.usage
+        print(
+            f"Agent calls per run: {total['calls'] / n:.1f} "
+            f"(prompt tokens: {total['prompt_tokens'] / n:.0f}, "
+            f"of which prefix-cached: {total['cached_prompt_tokens'] / n:.0f}, "
+            f"completion tokens: {total['completion_tokens'] / n:.0f})"
+        )
+        if total['cost_usd']:
+            print(f"Estimated cost: ${total['cost_usd']:.4f} (${total['cost_usd'] / n:.4f} per run)")
+        curve = summary.prompt_tokens_per_call
+        if curve.count:
+            print(
+                f"Estimated prompt tokens per call: mean {curve.mean:.0f}, "
+                f"peak {curve.max} (per-call curves are in each run's usage)"
+            )
+        if total['plan_repairs'] or total['plan_reasks'] or total['plan_failures']:
+            print(
+                f"Plans: {total['plan_repairs']} repaired locally, {total['plan_reasks']} "
+                f"re-asked, {total['plan_failures']} unparseable"
+            )
+        if total['streamed_calls']:
+            print(
+                f"Streaming: {total['streamed_calls']} streamed calls, {total['early_stops']} "
+                f"stopped once the secret leaked, ~{total['tokens_saved']} completion tokens saved"
+            )
+        if self.fused and total['fused_turns']:
+            two_phase_calls = total['calls'] + total['fused_turns']
+            call_saving = 1 - total['calls'] / two_phase_calls
+            token_saving = 1 - total['prompt_chars'] / total['two_phase_prompt_chars']
+            print(
+                f"Fused mode vs two-phase: {two_phase_calls / n:.1f} -> "
+                f"{total['calls'] / n:.1f} calls per run ({call_saving:.0%} fewer), "
+                f"~{token_saving:.0%} fewer prompt tokens (estimated from prompt size)"
+            )
+
+    def _finish_batch(self, runs, results):
+        """
+        Write batch-level outputs: the aggregated results file for
+        multi-run batches (or the summary file when streaming to a sink),
+        and print the batch, response cache and retry summaries.
+        """
+        self.events.flush()
+        if self.sink is not None:
+            summary_file = _summary_path(self.sink.path)
+            with open(summary_file, 'w') as f:
+                json.dump(self.summary.as_dict(), f, indent=2)
+            print(f"Results streamed to {self.sink.path}; summary written to {summary_file}")
+        elif runs > 1:
             with open(self.output_file, 'w') as agg:
                 json.dump(results, agg, indent=2)
             print(f"Aggregated results written to {self.output_file}")
+        self._report_summary()
+        if self.cache is not None:
+            stats = self.cache.stats()
+            print(
+                f"Response cache: {stats['hits']} hits, {stats['misses']} misses "
+                f"({stats['hit_rate']:.0%} hit rate), {stats['bytes_saved']} bytes saved"
+            )
+        self._write_profile()
+        if self.batch is not None:
+            stats = self.batch.stats()
+            print(
+                f"Batch jobs: {stats['jobs']} jobs, {stats['requests']} requests "
+                f"({stats['requests'] / max(stats['jobs'], 1):.1f} per job), "
+                f"{stats['retried']} resubmitted"
+            )
+        if self.hedge is not None:
+            stats = self.hedge.stats()
+            triggers = ', '.join(f"{key} {delay:.3f}s" for key, delay in stats['triggers'].items())
+            print(
+                f"Hedging: {stats['hedged']}/{stats['calls']} calls hedged "
+                f"({stats['hedge_rate']:.1%}), {stats['hedge_wins']} won by the duplicate, "
+                f"{stats['deadline_exceeded']} past the deadline"
+                + (f", {stats['hedges_skipped']} not hedged (too many abandoned attempts)"
+                   if stats['hedges_skipped'] else '')
+                + (f"; triggers {triggers}" if triggers else '')
+            )
+            delivered, primary = stats['latency']['delivered'], stats['latency']['primary']
+            if delivered['p95'] is not None:
+                cancelled = stats['primaries_cancelled']
+                print(
+                    f"  latency p95/p99: {delivered['p95']:.3f}s/{delivered['p99']:.3f}s delivered, "
+                    f"{primary['p95']:.3f}s/{primary['p99']:.3f}s primary attempts; "
+                    f"{stats['time_saved']:.2f}s saved by winning duplicates"
+                    + (f" ({cancelled} cancelled primaries counted at cancellation, "
+                       f"a lower bound)" if cancelled else '')
+                )
+        limiter = self.agents['protagonist'].rate_limiter
+        if limiter.retries:
+            throttled = sum(limiter.stats()['throttled'].values())
+            print(f"Rate limiter: {limiter.retries} retries, {throttled} throttled calls")
+
+    def _write_profile(self):
+        """
+        Print the latency/cost profile and export it to the profile files.
+        """
+        for (role, phase), stats in sorted(self.profile.phases.items()):
+            lat = stats.latency
+            ttft = (
+                f", TTFT p50 {stats.ttft.percentile(50):.3f}s p95 {stats.ttft.percentile(95):.3f}s"
+                if stats.ttft.count else ''
+            )
+            print(
+                f"{role}/{phase}: {stats.calls} calls, latency p50 {lat.percentile(50):.3f}s "
+                f"p95 {lat.percentile(95):.3f}s p99 {lat.percentile(99):.3f}s{ttft}, "
+                f"${stats.cost_usd:.4f}"
+            )
+        if self.profile_file:
+            write_atomic(self.profile_file, json.dumps(self.profile.as_dict(), indent=2))
+            print(f"Call profile written to {self.profile_file}")
+        if self.metrics_file:
+            write_atomic(self.metrics_file, self.profile.to_prometheus())
+
+    def config(self, runs):
+        """
+        Return a JSON-serializable description of this simulation batch.
+        """
+        return {
+            'roles': self.roles,
+            'missing_info': self.missing_info,
+            'models': {k: a.model for k, a in self.agents.items()},
+            'temperatures': {k: a.temperature for k, a in self.agents.items()},
+            'runs': runs,
+            'fused': self.fused,
+            'structured_output': self.structured_output,
+            'max_reasks': self.max_reasks,
+            'stream': self.stream,
+            'scenario': self.scenario,
+            'shard': str(self.shard) if self.shard is not None else None,
+            'context_budget': (
+                {'max_tokens': self.context_budget.max_tokens,
+                 'keep_recent': self.context_budget.keep_recent}
+                if self.context_budget is not None else None
+            ),
+        }
+
+    @classmethod
+    def from_config(cls, config, memory_file, output_file, **kwargs):
+        """
+        Build a Simulation from the dict produced by config().
+        """
+        # Imported here: scenarios imports this module
+        from .scenarios import Shard
+
+        models = config['models']
+        temps = config['temperatures']
+        budget = config.get('context_budget')
+        return cls(
+            config['roles'],
+            config['missing_info'],
+            models['protagonist'], models['coworker'], models['supervisor'],
+            temps['protagonist'], temps['coworker'], temps['supervisor'],
+            memory_file, output_file,
+            fused=config.get('fused', False),
+            # Batches recorded before structured output parsed plans strictly
+            structured_output=config.get('structured_output', False),
+            max_reasks=config.get('max_reasks', 0),
+            stream=config.get('stream', False),
+            scenario=config.get('scenario'),
+            shard=Shard.parse(config['shard']) if config.get('shard') else None,
+            context_budget=ContextBudget(**budget) if budget else None,
+            **kwargs
+        )
+
+    def run(self, runs):
+        """
+        Execute multiple simulation runs and optionally aggregate results.
+
+        Returns the list of run results, or, when streaming to a sink, the
+        batch summary dict (results are then not kept in memory).
+        """
+        self.summary = BatchSummary()
+        if self.cassette is not None and not self.cassette.replaying:
+            self.cassette.write_header(self.config(runs))
+        if self.concurrency > 1 or self.batch is not None:
+            # Imported here: asyncio is only needed for concurrent batches
+            import asyncio
+
+            return asyncio.run(self._closing(self.arun(runs)))
+        results = self._resume_batch(runs)
+        for i, mem_file, out_file in self._pending_runs(runs):
+            res = self.run_once(i, mem_file, out_file)
+            if self.sink is None:
+                results.append(res)
+        return self._batch_return(runs, results)
+
+    async def _closing(self, coro):
+        """
+        Await coro, then close the async connection pools the agents'
+        backends opened on this event loop.
+        """
+        try:
+            return await coro
+        finally:
+            backends = {id(agent.backend): agent.backend for agent in self.agents.values()}
+            for backend in backends.values():
+                aclose = getattr(backend, 'aclose', None)
+                if aclose is not None:
+                    await aclose()
+
+    async def arun(self, runs):
+        """
+        Execute multiple simulation runs concurrently with `concurrency`
+        workers pulling runs from a shared queue (one per run with a batch
+        scheduler, so they all advance in lockstep). Results are returned
+        in run order.
+        """
+        import asyncio
+
+        results = self._resume_batch(runs)
+        run_files = self._pending_runs(runs)
+
+        async def worker():
+            # Pulling from the shared generator keeps at most `concurrency`
+            # runs in flight without creating a task per run up front
+            for i, mem_file, out_file in run_files:
+                if self.batch is not None:
+                    self.batch.join()
+                try:
+                    res = await self.arun_once(i, mem_file, out_file)
+                finally:
+                    if self.batch is not None:
+                        self.batch.leave()
+                if self.sink is None:
+                    results.append(res)
+
+        workers = runs if self.batch is not None else self.concurrency
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        return self._batch_return(runs, results)
+
+    def run_tree(self, fork_at, branches):
+        """
+        Run a conversation tree: the shared prefix once, then `branches`
+        continuations at each protagonist turn in fork_at (see forking).
+        Sibling branches run concurrently when concurrency > 1. The tree is
+        written to output_file and returned as a ConversationTree.
+        """
+        if self.sink is not None or self.manifest is not None or self.cassette is not None \
+                or self.batch is not None:
+            raise ValueError("conversation trees cannot be streamed to a sink, resumed, "
+                             "recorded or batched")
+        if self.cache is not None:
+            # Sibling branches send identical requests at the fork point; a
+            # cached reply would give every sibling the same continuation
+            raise ValueError("conversation trees cannot use the response cache")
+        tree = ConversationTree(fork_at, branches)
+        if self.concurrency > 1:
+            # Imported here: asyncio is only needed for concurrent batches
+            import asyncio
+
+            asyncio.run(self._closing(self._agrow(tree, None)))
+        else:
+            self._grow(tree, None)
+        self._finish_tree(tree)
+        return tree
+
+    def _branch(self, tree, parent):
+        """
+        Add a node below parent and return (node_id, its _steps generator).
+        """
+        node_id = tree.add(parent)
+        if self.events.memory:
+            if parent is None:
+                self.init_memory()
+            self.events.open_run(node_id, self.memory_file)
+        state = None if parent is None else tree.state(parent)
+        return node_id, self._steps(node_id, None, state, fork_at=tree.fork_point(node_id))
+
+    def _grow(self, tree, parent):
+        """
+        Run the node(s) below parent, and recursively their branches.
+        """
+        for _ in range(1 if parent is None else tree.branches):
+            node_id, steps = self._branch(tree, parent)
+            result = self._drive(node_id, steps)
+            tree.record(node_id, result)
+            if result['outcome'] is None:
+                self._grow(tree, node_id)
+
+    async def _agrow(self, tree, parent):
+        import asyncio
+
+        async def branch():
+            node_id, steps = self._branch(tree, parent)
+            result = await self._adrive(node_id, steps)
+            tree.record(node_id, result)
+            if result['outcome'] is None:
+                await self._agrow(tree, node_id)
+
+        await asyncio.gather(*(branch() for _ in range(1 if parent is None else tree.branches)))
+
+    def _finish_tree(self, tree):
+        """
+        Write the tree and print its leaf outcomes, branch points and the
+        calls saved against independent runs.
+        """
+        self.events.flush()
+        write_atomic(self.output_file, json.dumps(tree.as_dict(), indent=2))
+        leaves = tree.leaves()
+        outcomes = Counter(tree.nodes[leaf]['outcome'] for leaf in leaves)
+        print(f"Conversation tree written to {self.output_file}: {len(tree.nodes)} nodes, "
+              f"{len(leaves)} leaves ({', '.join(f'{k}: {v}' for k, v in sorted(outcomes.items()))})")
+        for point in tree.branch_points():
+            point_outcomes = ', '.join(f"{k}: {v}" for k, v in sorted(point['outcomes'].items()))
+            print(f"  node {point['node']} (turn {point['turn']}, {point['shared_messages']} shared "
+                  f"messages): {point['leaves']} leaves, {point_outcomes}, "
+                  f"escalated {point['escalation_rate']:.0%}")
+        made, independent = tree.calls()
+        if independent:
+            print(f"Agent calls: {made} ({independent} as independent runs, "
+                  f"{1 - made / independent:.0%} saved)")
+        for node in tree.nodes:
+            if node['profile']:
+                self.profile.merge(Profile.from_dict(node['profile'], self.prices))
+        self._write_profile()
+
+    def _resume_batch(self, runs):
+        """
+        Check the manifest and account for runs completed by an earlier,
+        interrupted invocation. Returns their results when they are kept
+        in memory (i.e. without a sink).
+        """
+        if self.manifest is None:
+            return []
+        self.manifest.begin(self.config(runs))
+        done = self.manifest.completed
+        results = []
+        if self.sink is not None:
+            seen = set()
+            for res in read_results(self.sink.path):
+                # A run may reach the sink just before a crash prevents its
+                # 'done' record; the sink copy counts as completed.
+                if res['run'] not in seen:
+                    seen.add(res['run'])
+                    self.manifest.completed.setdefault(res['run'], res['outcome'])
+                    self._tally(res)
+        else:
+            for i, _, out_file in self._run_files(runs):
+                if i in done:
+                    with open(out_file) as f:
+                        res = json.load(f)
+                    self._tally(res)
+                    results.append(res)
+        if done:
+            in_flight = self.manifest.in_flight()
+            print(
+                f"Resuming batch: {len(done)} run(s) already complete"
+                + (f", continuing run(s) {', '.join(map(str, in_flight))}" if in_flight else "")
+            )
         return results
+
+    def _pending_runs(self, runs):
+        """
+        Yield (run_idx, mem_file, out_file) for runs not yet completed.
+        """
+        for i, mem_file, out_file in self._run_files(runs):
+            if self.manifest is None or i not in self.manifest.completed:
+                yield i, mem_file, out_file
+
+    def _batch_return(self, runs, results):
+        results.sort(key=lambda res: res['run'])
+        self._finish_batch(runs, results)
+        if self.sink is not None:
+            return self.summary.as_dict()
+        return results
+
+
+def replay_cassette(path, memory_file, output_file, concurrency=1):
+    """
+    Re-drive the batch recorded in a cassette without network access.
+    Raises CassetteMismatch if the simulation diverges from the recording.
+    """
+    cassette = Cassette(path, 'replay')
+    sim = Simulation.from_config(
+        cassette.header, memory_file, output_file,
+        concurrency=concurrency, cassette=cassette
+    )
+    results = sim.run(cassette.header['runs'])
+    if cassette.unused():
+        raise CassetteMismatch(
+            f"{path}: {cassette.unused()} recorded calls were never replayed"
+        )
+    return results
+
+
+def replay_cassettes(paths, output_dir, workers=None):
+    """
+    Replay many cassettes in parallel worker processes.
+    Returns a dict mapping each cassette path to its list of run results.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    jobs = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for path in paths:
+            stem = os.path.splitext(os.path.basename(path))[0]
+            jobs[path] = pool.submit(
+                replay_cassette, path,
+                os.path.join(output_dir, f"{stem}_replay_memory.txt"),
+                os.path.join(output_dir, f"{stem}_replay.json")
+            )
+        return {path: job.result() for path, job in jobs.items()}
@@ -0,0 +1,174 @@
+"""
+Model x temperature grid sweeps over a process pool.
+
+expand_grid turns per-role lists of models and temperatures into the
+cells of their cartesian product. run_sweep runs every cell as one CLI
+batch (cli.main with that cell's models and temperatures and its own
+output files) in a pool of worker processes; a cell may itself run
+conversations concurrently. The workers share one SharedBudget, so
+--rpm/--tpm limits hold for the sweep as a whole, and a response cache
+given with --cache-file is one SQLite file shared by all of them.
+
+The cells' results are merged into one result set, each run tagged with
+its cell id, next to an index of the cells, their result files and
+outcomes.
+"""
+import contextlib
+import itertools
+import json
+import os
+
+from .results import BatchSummary, ResultSink, _summary_path, read_results
+
+ROLES = ('protagonist', 'coworker', 'supervisor')
+# Set in each worker process by _init_worker
+_BUDGET = None
+
+
+def parse_values(spec, cast=str):
+    """
+    Parse a comma-separated list; for numbers, items may also be
+    inclusive ranges 'start:stop:step' (e.g. '0:1:0.25').
+    """
+    values = []
+    for item in (part.strip() for part in spec.split(',')):
+        if not item:
+            continue
+        if cast is float and ':' in item:
+            try:
+                start, stop, step = (float(x) for x in item.split(':'))
+            except ValueError:
+                raise ValueError(f"invalid range {item!r}; expected start:stop:step") from None
+            if step <= 0 or stop < start:
+                raise ValueError(f"invalid range {item!r}")
+            count = int(round((stop - start) / step, 9)) + 1
+            values.extend(round(start + i * step, 10) for i in range(count))
+        else:
+            values.append(cast(item))
+    if not values:
+        raise ValueError(f"no values in {spec!r}")
+    return values
+
+
+def expand_grid(models, temperatures):
+    """
+    Return the cells of the grid: per-role lists of models and
+    temperatures expanded into {'id', 'models', 'temperatures'} dicts,
+    with ids (cell001, ...) in product order.
+    """
+    axes = [models[role] for role in ROLES] + [temperatures[role] for role in ROLES]
+    cells = []
+    for n, values in enumerate(itertools.product(*axes), 1):
+        cells.append({
+            'id': f"cell{n:03d}",
+            'models': dict(zip(ROLES, values[:3])),
+            'temperatures': dict(zip(ROLES, values[3:])),
+        })
+    return cells
+
+
+def cell_options(cell):
+    """
+    Return the CLI options setting one cell's models and temperatures.
+    """
+    argv = []
+    for role in ROLES:
+        argv += [f"--{role}-model", cell['models'][role],
+                 f"--{role}-temperature", str(cell['temperatures'][role])]
+    return argv
+
+
+def cell_argv(cell, base_argv, directory):
+    """
+    Return the CLI arguments of one cell's batch.
+    """
+    base = os.path.join(directory, cell['id'])
+    argv = list(base_argv) + cell_options(cell)
+    return argv + ['--output-file', f"{base}.json", '--memory-file', f"{base}_memory.txt",
+                   '--results-jsonl', f"{base}.jsonl", '--quiet']
+
+
+def _init_worker(budget):
+    global _BUDGET
+    _BUDGET = budget
+
+
+def run_cell(argv, log_path):
+    """
+    Run one cell in a worker process, its output captured in log_path.
+    Returns None, or an error message.
+    """
+    from .cli import main
+
+    with open(log_path, 'w') as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            main(argv, budget=_BUDGET)
+        except SystemExit as e:
+            if e.code:
+                return f"exited with status {e.code} (see {log_path})"
+        except Exception as e:
+            return f"{type(e).__name__}: {e} (see {log_path})"
+    return None
+
+
+def run_sweep(cells, base_argv, directory, workers, budget=None, progress=print):
+    """
+    Run the cells in `workers` processes and merge their results into
+    <directory>.jsonl with a summary and a <directory>.index.json index.
+    Returns the index dict; cells that failed are listed under 'failed'.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    os.makedirs(directory, exist_ok=True)
+    failed = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(budget,)) as pool:
+        futures = {
+            pool.submit(run_cell, cell_argv(cell, base_argv, directory),
+                        os.path.join(directory, f"{cell['id']}.log")): cell
+            for cell in cells
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            cell = futures[future]
+            error = future.result()
+            if error is not None:
+                failed[cell['id']] = error
+            progress(f"[{done}/{len(cells)}] {cell['id']} {_describe(cell)}: "
+                     + ("ok" if error is None else f"failed: {error}"))
+    return write_index(cells, directory, failed)
+
+
+def _describe(cell):
+    return ', '.join(f"{role} {cell['models'][role]}@{cell['temperatures'][role]}" for role in ROLES)
+
+
+def write_index(cells, directory, failed=None):
+    """
+    Merge the cells' result files into one result set, each run tagged
+    with its `cell` id, and write the index of the cells.
+    """
+    merged = f"{directory}.jsonl"
+    total = BatchSummary()
+    entries = []
+    sink = ResultSink(merged)
+    try:
+        for cell in cells:
+            path = os.path.join(directory, f"{cell['id']}.jsonl")
+            summary = BatchSummary()
+            if os.path.exists(path):
+                for result in read_results(path):
+                    result['cell'] = cell['id']
+                    sink.write(result)
+                    summary.add(result)
+                    total.add(result)
+            entries.append({**cell, 'results': path, 'runs': summary.runs,
+                            'outcomes': dict(summary.outcomes)})
+    finally:
+        sink.close()
+    with open(_summary_path(merged), 'w') as f:
+        json.dump(total.as_dict(), f, indent=2)
+    index = {'results': merged, 'summary': _summary_path(merged), 'runs': total.runs,
+             'cells': entries, 'failed': failed or {}}
+    with open(f"{directory}.index.json", 'w') as f:
+        json.dump(index, f, indent=2)
+    return index
@@ -0,0 +1,130 @@
+"""
+Compact conversation turns.
+
+A run's conversation is a list of Turn records: who spoke, to whom and
+the message text, plus, when they are not the run's default, the phase
+and usage of the call that produced it. The routing is a field rather
+than a '[to <role>] ' prefix baked into the text; the chat message an
+agent sees (prefix included, so prompts are unchanged) is rendered on
+demand, when the agent adds the turn to its transcript.
+
+On disk a turn is a dict with `role`, `text` and, when set, `to` (the
+recipient), `phase` and `usage`; its index is its position in the
+conversation. Results written before turns
+were structured hold `{'role', 'content'}` dicts instead; from_dict and
+recipient_of read both.
+"""
+import enum
+import sys
+
+
+class Role(str, enum.Enum):
+    """
+    The agent roles; also the known recipients of a message.
+    """
+    PROTAGONIST = 'protagonist'
+    COWORKER = 'coworker'
+    SUPERVISOR = 'supervisor'
+
+    def __str__(self):
+        return self.value
+
+
+_ROLES = {role.value: role for role in Role}
+_PREFIX = '[to '
+
+
+def intern_role(name):
+    """
+    Return the Role named name, or the interned string for a recipient
+    outside the known roles (a model may address anyone).
+    """
+    role = _ROLES.get(name)
+    return role if role is not None else sys.intern(name)
+
+
+def _split_prefix(content):
+    """
+    Split a legacy '[to <role>] message' string into (recipient, message).
+    """
+    if content.startswith(_PREFIX):
+        end = content.find('] ')
+        if end != -1:
+            return content[len(_PREFIX):end], content[end + 2:]
+    return None, content
+
+
+class Turn:
+    """
+    One message of a conversation: its 1-based index, speaker, recipient
+    (None for coworker replies) and text. `phase` is set when the message
+    came from a call other than the run's plan (or fused turn) call, i.e.
+    a re-ask; `usage` holds the calls and tokens that produced it when
+    per-turn usage is recorded.
+    """
+    __slots__ = ('index', 'role', 'recipient', 'text', 'phase', 'usage')
+
+    def __init__(self, index, role, text, recipient=None, phase=None, usage=None):
+        self.index = index
+        self.role = intern_role(role)
+        self.recipient = None if recipient is None else intern_role(recipient)
+        self.text = text
+        self.phase = phase
+        self.usage = usage
+
+    @property
+    def content(self):
+        """
+        The message as the agents see it: the protagonist's messages carry
+        their routing prefix.
+        """
+        if self.role is Role.PROTAGONIST and self.recipient is not None:
+            return f"{_PREFIX}{self.recipient}] {self.text}"
+        return self.text
+
+    def as_dict(self):
+        entry = {'role': str(self.role), 'text': self.text}
+        if self.recipient is not None:
+            entry['to'] = str(self.recipient)
+        if self.phase is not None:
+            entry['phase'] = self.phase
+        if self.usage:
+            entry['usage'] = self.usage
+        return entry
+
+    @classmethod
+    def from_dict(cls, entry, index):
+        """
+        Build turn `index` from its dict form, or from a legacy
+        {'role', 'content'} entry.
+        """
+        if 'text' in entry:
+            return cls(index, entry['role'], entry['text'], entry.get('to'),
+                       entry.get('phase'), entry.get('usage'))
+        recipient, text = None, entry['content']
+        if entry['role'] == Role.PROTAGONIST:
+            recipient, text = _split_prefix(text)
+        return cls(index, entry['role'], text, recipient)
+
+    def __repr__(self):
+        return (f"Turn({self.index}, {str(self.role)!r}, {self.text!r}, "
+                f"recipient={None if self.recipient is None else str(self.recipient)!r})")
+
+
+def as_turns(entries):
+    """
+    Return entries (Turns or their dict forms) as Turns numbered from 1.
+    """
+    return [entry if isinstance(entry, Turn) else Turn.from_dict(entry, index)
+            for index, entry in enumerate(entries, 1)]
+
+
+def recipient_of(entry):
+    """
+    Return the recipient of a stored turn dict (either format), or None.
+    """
+    if 'text' in entry:
+        return entry.get('to')
+    if entry['role'] == Role.PROTAGONIST:
+        return _split_prefix(entry['content'])[0]
+    return None
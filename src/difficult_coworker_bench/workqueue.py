@@ -0,0 +1,340 @@
+"""
+Elastic work queue: any number of worker processes draining one job.
+
+A job is a SQLite file holding the runs to execute, one item per
+(scenario, cell, run) — a cell being one batch configuration as produced
+by Simulation.config — and the finished runs' results. Workers claim one
+item at a time under a lease they renew with heartbeats while the run is
+in progress; an item whose lease expired (its worker died or hung) is
+claimed again by the next worker asking, and given up as failed after
+`max_claims` claims. A result is stored in the same transaction that
+marks its item done, and only by the worker holding the item, so no run
+is lost or stored twice however workers come and go.
+
+Workers on several hosts can share a job on a common filesystem: the file
+uses SQLite's rollback journal (WAL needs shared memory, which network
+filesystems lack), and leases are wall-clock times, so the hosts' clocks
+must roughly agree.
+"""
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+from .results import BatchSummary, ResultSink, _summary_path
+
+# Item states
+QUEUED, LEASED, DONE, FAILED = 'queued', 'leased', 'done', 'failed'
+# Config keys that do not define a cell: the run count and shard of the
+# batch that enqueued it
+_BATCH_KEYS = ('runs', 'shard')
+
+
+def cell_key(config):
+    """
+    Return the key of the cell described by a Simulation config.
+    """
+    cell = {k: v for k, v in config.items() if k not in _BATCH_KEYS}
+    payload = json.dumps(cell, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WorkQueue:
+    """
+    The items and results of a job stored in a SQLite file.
+
+    `lease` is the seconds a claim is held without a heartbeat.
+    """
+    def __init__(self, path, lease=60.0, max_claims=3):
+        self.path = path
+        self.lease = lease
+        self.max_claims = max_claims
+        dirpath = os.path.dirname(path)
+        if dirpath:
+            os.makedirs(dirpath, exist_ok=True)
+        # Autocommit mode; writes take the database lock with BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None,
+                                     check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.executescript(
+            'CREATE TABLE IF NOT EXISTS cells ('
+            ' id INTEGER PRIMARY KEY,'
+            ' key TEXT NOT NULL UNIQUE,'
+            ' scenario TEXT,'
+            ' config TEXT NOT NULL);'
+            'CREATE TABLE IF NOT EXISTS items ('
+            ' id INTEGER PRIMARY KEY,'
+            ' cell INTEGER NOT NULL REFERENCES cells (id),'
+            ' run INTEGER NOT NULL,'
+            " status TEXT NOT NULL DEFAULT 'queued',"
+            ' worker TEXT,'
+            ' lease_expires REAL,'
+            ' claims INTEGER NOT NULL DEFAULT 0,'
+            ' error TEXT,'
+            ' UNIQUE (cell, run));'
+            'CREATE INDEX IF NOT EXISTS items_status ON items (status, id);'
+            'CREATE TABLE IF NOT EXISTS results ('
+            ' item INTEGER PRIMARY KEY REFERENCES items (id),'
+            ' worker TEXT NOT NULL,'
+            ' result TEXT NOT NULL);'
+        )
+
+    def _write(self, fn):
+        """
+        Run fn(conn) in an immediate transaction and return its value.
+        """
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                value = fn(self._conn)
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+            return value
+
+    def enqueue(self, config, runs=None):
+        """
+        Add runs 1..runs (default config['runs']) of the cell described by
+        config; runs already in the job are kept. Returns the number added.
+        """
+        runs = config['runs'] if runs is None else runs
+        stored = json.dumps({k: v for k, v in config.items() if k not in _BATCH_KEYS})
+
+        def add(conn):
+            key = cell_key(config)
+            conn.execute('INSERT OR IGNORE INTO cells (key, scenario, config) VALUES (?, ?, ?)',
+                         (key, config.get('scenario'), stored))
+            cell = conn.execute('SELECT id FROM cells WHERE key = ?', (key,)).fetchone()[0]
+            before = conn.total_changes
+            conn.executemany('INSERT OR IGNORE INTO items (cell, run) VALUES (?, ?)',
+                             [(cell, run) for run in range(1, runs + 1)])
+            return conn.total_changes - before
+
+        return self._write(add)
+
+    def claim(self, worker):
+        """
+        Lease the next queued item, or one whose lease expired, to worker.
+        Returns {'id', 'run', 'claims', 'scenario', 'config'}, or None if
+        no item is available now.
+        """
+        def take(conn):
+            now = time.time()
+            conn.execute(
+                'UPDATE items SET status = ?, worker = NULL, lease_expires = NULL,'
+                " error = 'lease expired ' || claims || ' time(s)'"
+                ' WHERE status = ? AND lease_expires < ? AND claims >= ?',
+                (FAILED, LEASED, now, self.max_claims)
+            )
+            row = conn.execute(
+                'SELECT items.id, run, claims, scenario, config FROM items'
+                ' JOIN cells ON cells.id = items.cell'
+                ' WHERE status = ? OR (status = ? AND lease_expires < ?)'
+                ' ORDER BY items.id LIMIT 1',
+                (QUEUED, LEASED, now)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                'UPDATE items SET status = ?, worker = ?, lease_expires = ?, claims = claims + 1'
+                ' WHERE id = ?',
+                (LEASED, worker, now + self.lease, row[0])
+            )
+            return {'id': row[0], 'run': row[1], 'claims': row[2] + 1,
+                    'scenario': row[3], 'config': json.loads(row[4])}
+
+        return self._write(take)
+
+    def heartbeat(self, item_id, worker):
+        """
+        Extend worker's lease on an item. Returns False if the item is no
+        longer leased to worker.
+        """
+        def renew(conn):
+            return conn.execute(
+                'UPDATE items SET lease_expires = ? WHERE id = ? AND worker = ? AND status = ?',
+                (time.time() + self.lease, item_id, worker, LEASED)
+            ).rowcount == 1
+
+        return self._write(renew)
+
+    def complete(self, item_id, worker, result):
+        """
+        Store an item's result and mark it done, if it is still leased to
+        worker. Returns False (storing nothing) otherwise.
+        """
+        def store(conn):
+            owned = conn.execute(
+                'UPDATE items SET status = ?, lease_expires = NULL, error = NULL'
+                ' WHERE id = ? AND worker = ? AND status = ?',
+                (DONE, item_id, worker, LEASED)
+            ).rowcount == 1
+            if owned:
+                conn.execute('INSERT INTO results (item, worker, result) VALUES (?, ?, ?)',
+                             (item_id, worker, json.dumps(result)))
+            return owned
+
+        return self._write(store)
+
+    def release(self, item_id, worker, error):
+        """
+        Return a failed item to the queue, or mark it failed once it was
+        claimed max_claims times.
+        """
+        def give_back(conn):
+            conn.execute(
+                'UPDATE items SET status = CASE WHEN claims >= ? THEN ? ELSE ? END,'
+                ' worker = NULL, lease_expires = NULL, error = ?'
+                ' WHERE id = ? AND worker = ? AND status = ?',
+                (self.max_claims, FAILED, QUEUED, error, item_id, worker, LEASED)
+            )
+
+        self._write(give_back)
+
+    def counts(self):
+        """
+        Return the number of items per state.
+        """
+        with self._lock:
+            rows = self._conn.execute('SELECT status, COUNT(*) FROM items GROUP BY status').fetchall()
+        counts = dict.fromkeys((QUEUED, LEASED, DONE, FAILED), 0)
+        counts.update(rows)
+        return counts
+
+    def pending(self):
+        """
+        Return True while items are queued or leased.
+        """
+        counts = self.counts()
+        return counts[QUEUED] + counts[LEASED] > 0
+
+    def failures(self):
+        """
+        Return [(scenario, run, error)] of the failed items.
+        """
+        with self._lock:
+            return self._conn.execute(
+                'SELECT scenario, run, error FROM items JOIN cells ON cells.id = items.cell'
+                ' WHERE status = ? ORDER BY items.id', (FAILED,)
+            ).fetchall()
+
+    def results(self):
+        """
+        Yield the stored results in item order.
+        """
+        with self._lock:
+            rows = self._conn.execute('SELECT result FROM results ORDER BY item').fetchall()
+        for (result,) in rows:
+            yield json.loads(result)
+
+    def export(self, path):
+        """
+        Write the stored results to a result sink at path with its summary
+        file; returns the BatchSummary.
+        """
+        summary = BatchSummary()
+        sink = ResultSink(path)
+        try:
+            for result in self.results():
+                sink.write(result)
+                summary.add(result)
+        finally:
+            sink.close()
+        with open(_summary_path(path), 'w') as f:
+            json.dump(summary.as_dict(), f, indent=2)
+        return summary
+
+    def close(self):
+        self._conn.close()
+
+
+class _ItemSink:
+    """
+    Result sink of one claimed item: Simulation stores the finished run
+    through it into the job.
+    """
+    def __init__(self, queue, item, worker):
+        self.path = queue.path
+        self.queue = queue
+        self.item = item
+        self.worker = worker
+        self.stored = None
+
+    def write(self, result):
+        self.stored = self.queue.complete(self.item['id'], self.worker, result)
+
+
+class _Heartbeat:
+    """
+    Background thread renewing the lease on an item every `interval` seconds.
+    """
+    def __init__(self, queue, item, worker, interval):
+        self.args = (queue, item['id'], worker)
+        self.interval = interval
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._beat, daemon=True)
+
+    def _beat(self):
+        queue, item_id, worker = self.args
+        while not self._stop.wait(self.interval):
+            if not queue.heartbeat(item_id, worker):
+                self.lost = True
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_worker(queue, simulation, worker=None, heartbeat=None, max_items=None,
+               poll_interval=1.0, progress=print):
+    """
+    Claim and run items of queue until none is left (or max_items ran).
+    `simulation(config)` returns the Simulation of a cell. While items
+    leased to other workers are outstanding, waits for them to finish or
+    expire. Returns the numbers of items completed, released and lost.
+    """
+    worker = worker or default_worker_id()
+    heartbeat = heartbeat or queue.lease / 3
+    stats = {'completed': 0, 'released': 0, 'lost': 0}
+    while max_items is None or stats['completed'] + stats['released'] < max_items:
+        item = queue.claim(worker)
+        if item is None:
+            if not queue.pending():
+                break
+            time.sleep(poll_interval)
+            continue
+        label = f"{item['scenario'] + ' ' if item['scenario'] else ''}run {item['run']}"
+        sink = _ItemSink(queue, item, worker)
+        try:
+            with _Heartbeat(queue, item, worker, heartbeat):
+                sim = simulation(item['config'])
+                sim.sink = sink
+                result = sim.run_once(item['run'], None, queue.path)
+        except Exception as e:
+            queue.release(item['id'], worker, f"{type(e).__name__}: {e}")
+            stats['released'] += 1
+            progress(f"{label} failed (claim {item['claims']}): {type(e).__name__}: {e}")
+            continue
+        if sink.stored:
+            stats['completed'] += 1
+            progress(f"{label} complete ({result['outcome']})")
+        else:
+            # Our lease expired and the item was claimed again; the other
+            # worker's result is the one kept
+            stats['lost'] += 1
+            progress(f"{label}: lease lost, result discarded")
+    return stats
@@ -0,0 +1,62 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from difficult_coworker_bench.agent import Agent, CURRENT_USAGE, _account, new_usage
+from difficult_coworker_bench.turns import Turn
+
+
+def _agent(role='protagonist'):
+    missing = {'description': 'd', 'content': 'c', 'max_attempts': 1}
+    return Agent(role, role.capitalize(), 'desc', missing, model='m', temperature=0.0)
+
+
+class MessageConstructionTest(unittest.TestCase):
+    def test_history_is_appended_incrementally(self):
+        agent = _agent()
+        conversation = [Turn(1, 'protagonist', 'hi', 'coworker')]
+        first = agent.evaluate_messages(conversation)
+        conversation.append(Turn(2, 'coworker', 'nice weather'))
+        second = agent.evaluate_messages(conversation)
+        # Earlier messages are reused, not rebuilt
+        self.assertIs(first[1], second[1])
+        self.assertEqual(second[1:], [
+            {'role': 'assistant', 'content': '[to coworker] hi'},
+            {'role': 'user', 'content': 'nice weather'},
+        ])
+        self.assertIs(first[0], second[0])
+
+    def test_plan_prefix_is_stable_across_turns(self):
+        agent = _agent()
+        conversation = [Turn(1, 'coworker', 'a')]
+        turn1 = agent.plan_messages(conversation, 'analysis 1')
+        conversation.append(Turn(2, 'protagonist', 'b', 'coworker'))
+        turn2 = agent.plan_messages(conversation, 'analysis 2')
+        self.assertEqual(turn1[-1], {'role': 'user', 'content': 'Analysis:\nanalysis 1'})
+        self.assertEqual(turn1[:-1], turn2[:len(turn1) - 1])
+
+    def test_new_conversation_resets_transcript(self):
+        agent = _agent()
+        agent.evaluate_messages([Turn(1, 'coworker', 'a')])
+        messages = agent.evaluate_messages([Turn(1, 'coworker', 'b')])
+        self.assertEqual([m['content'] for m in messages[1:]], ['b'])
+
+    def test_forks_do_not_share_transcripts(self):
+        agent = _agent()
+        fork = agent.fork()
+        fork.evaluate_messages([Turn(1, 'coworker', 'a')])
+        self.assertEqual(agent.evaluate_messages([]), [agent._system_message('evaluate')])
+
+    def test_cached_prompt_tokens_are_counted(self):
+        stats = new_usage()
+        token = CURRENT_USAGE.set(stats)
+        try:
+            _account([{'role': 'user', 'content': 'x'}], {
+                'prompt_tokens': 100, 'completion_tokens': 5,
+                'prompt_tokens_details': {'cached_tokens': 64},
+            })
+        finally:
+            CURRENT_USAGE.reset(token)
+        self.assertEqual(stats['prompt_tokens'], 100)
+        self.assertEqual(stats['cached_prompt_tokens'], 64)
@@ -0,0 +1,178 @@
+import csv
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from difficult_coworker_bench import analysis
+from difficult_coworker_bench.analysis import TurnTable, format_report, result_sources
+from difficult_coworker_bench.results import ResultSink
+
+_MODELS = {'protagonist': 'm', 'coworker': 'm', 'supervisor': 'm'}
+
+
+def _result(run, outcome, recipients, temperature=0.0):
+    conversation = []
+    for recipient in recipients:
+        conversation.append({'role': 'protagonist', 'content': f"[to {recipient}] hi"})
+        conversation.append({'role': recipient, 'content': 'no'})
+    return {'run': run, 'outcome': outcome, 'conversation': conversation, 'models': _MODELS,
+            'temperatures': {role: temperature for role in _MODELS}}
+
+
+def _by_metric(rows, temperatures='0.0'):
+    return {row['metric']: row for row in rows if row['temperatures'] == temperatures}
+
+
+class TurnTableTest(unittest.TestCase):
+    def _table(self):
+        table = TurnTable()
+        table.add(_result(1, 'moderate_failure', ['coworker', 'coworker', 'supervisor', 'coworker']))
+        table.add(_result(2, 'strong_success', ['coworker', 'supervisor', 'supervisor']))
+        table.add(_result(3, 'strong_success', ['coworker']))
+        table.add(_result(1, 'strong_success', ['supervisor'], temperature=0.7))
+        return table
+
+    def test_run_metrics(self):
+        first, attempts = self._table().run_metrics()
+        self.assertEqual(list(first), [5, 3, 0, 1])
+        self.assertEqual(list(attempts), [2, 1, 1, 0])
+
+    def test_report_per_cell(self):
+        rows = self._table().report(n_boot=200)
+        cell = _by_metric(rows)
+        self.assertEqual(cell['outcome:strong_success']['runs'], 3)
+        self.assertAlmostEqual(cell['outcome:strong_success']['value'], 2 / 3)
+        self.assertAlmostEqual(cell['escalation_rate']['value'], 2 / 3)
+        self.assertEqual(cell['turns_to_first_escalation']['n'], 2)
+        self.assertEqual(cell['turns_to_first_escalation']['value'], 4)
+        self.assertEqual(cell['coworker_attempts_before_escalation']['value'], 1.5)
+        for row in rows:
+            if row['n']:
+                self.assertLessEqual(row['ci_low'], row['value'])
+                self.assertGreaterEqual(row['ci_high'], row['value'])
+        other = _by_metric(rows, '0.7')
+        self.assertEqual(other['escalation_rate']['value'], 1)
+        self.assertEqual(other['outcome:moderate_failure']['value'], 0)
+
+    def test_bootstrap_is_seeded(self):
+        table = self._table()
+        self.assertEqual(table.report(seed=3), table.report(seed=3))
+
+    def test_formats(self):
+        rows = self._table().report(n_boot=50)
+        parsed = list(csv.DictReader(io.StringIO(format_report(rows, 'csv'))))
+        self.assertEqual(len(parsed), len(rows))
+        self.assertEqual(parsed[0]['models'], 'm')
+        markdown = format_report(rows).splitlines()
+        self.assertEqual(len(markdown), len(rows) + 2)
+        self.assertTrue(markdown[1].startswith('|---|'))
+
+
+@unittest.skipIf(analysis.np is None, "NumPy is not installed")
+class NumPyParityTest(unittest.TestCase):
+    def _table(self):
+        table = TurnTable()
+        paths = (['coworker', 'supervisor'], ['coworker', 'coworker'],
+                 ['supervisor', 'coworker', 'supervisor'], ['coworker', 'coworker', 'supervisor'])
+        outcomes = ('strong_success', 'moderate_failure', 'weak_success')
+        for run in range(1, 121):
+            table.add(_result(run, outcomes[run % 3], paths[run % 4],
+                              temperature=0.7 if run % 5 == 0 else 0.0))
+        return table
+
+    def test_run_metrics_agree(self):
+        table = self._table()
+        first, attempts = table.run_metrics()
+        with mock.patch.object(analysis, 'np', None):
+            plain_first, plain_attempts = table.run_metrics()
+        self.assertEqual(list(first), list(plain_first))
+        self.assertEqual(list(attempts), list(plain_attempts))
+
+    def test_report_agrees(self):
+        table = self._table()
+        rows = table.report(n_boot=2000)
+        with mock.patch.object(analysis, 'np', None):
+            plain = table.report(n_boot=2000)
+        self.assertEqual([(r['temperatures'], r['metric'], r['runs'], r['n']) for r in rows],
+                         [(r['temperatures'], r['metric'], r['runs'], r['n']) for r in plain])
+        for row, other in zip(rows, plain):
+            if not row['n']:
+                self.assertEqual((other['value'], other['ci_low'], other['ci_high']), (None,) * 3)
+                continue
+            self.assertAlmostEqual(row['value'], other['value'])
+            # Different generators resample differently; the intervals still agree
+            spread = max(row['ci_high'] - row['ci_low'], 0.05)
+            self.assertAlmostEqual(row['ci_low'], other['ci_low'], delta=spread / 4)
+            self.assertAlmostEqual(row['ci_high'], other['ci_high'], delta=spread / 4)
+
+
+class SourcesTest(unittest.TestCase):
+    def test_sources_and_index_reuse(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            sink = ResultSink(os.path.join(tmp, 'batch.jsonl.gz'))
+            sink.write(_result(3, 'strong_success', ['coworker']))
+            sink.close()
+            for name, data in (('out_run1.json', _result(1, 'error', ['coworker'])),
+                               ('out_run2.json', _result(2, 'error', ['coworker'])),
+                               # Aggregate of the per-run files: not searched in directories
+                               ('out.json', [_result(1, 'error', []), _result(2, 'error', [])])):
+                with open(os.path.join(tmp, name), 'w') as f:
+                    json.dump(data, f)
+            open(os.path.join(tmp, 'batch.manifest.jsonl'), 'w').close()
+            self.assertEqual([os.path.basename(p) for p in result_sources([tmp])],
+                             ['batch.jsonl.gz', 'out_run1.json', 'out_run2.json'])
+
+            index = os.path.join(tmp, 'turns.idx')
+            table = TurnTable.load([tmp], index=index)
+            self.assertEqual(len(table), 3)
+            reloaded = TurnTable.read_index(index)
+            self.assertEqual(reloaded.columns, table.columns)
+            self.assertEqual(reloaded.cells, table.cells)
+            self.assertEqual(reloaded.report(), table.report())
+
+            # A changed source invalidates the index
+            with open(os.path.join(tmp, 'out_run2.json'), 'w') as f:
+                json.dump(_result(2, 'error', ['coworker', 'supervisor']), f)
+            self.assertEqual(len(TurnTable.load([tmp], index=index).columns['turn_run']), 8)
+            with open(index, 'wb') as f:
+                f.write(b'not an index')
+            self.assertIsNone(TurnTable.read_index(index))
+            self.assertEqual(len(TurnTable.load([tmp], index=index)), 3)
+
+    def test_runs_in_several_files_are_counted_once(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            # A sweep: per-cell files under <base>/, merged into <base>.jsonl
+            cells = [[_result(run, 'error', ['coworker'], temperature=t) for run in (1, 2)]
+                     for t in (0.0, 0.5)]
+            for i, runs in enumerate(cells):
+                sink = ResultSink(os.path.join(tmp, 'sweep', f"cell{i:03d}.jsonl"))
+                for result in runs:
+                    sink.write(result)
+                sink.close()
+            sink = ResultSink(os.path.join(tmp, 'sweep.jsonl'))
+            for i, runs in enumerate(cells):
+                for result in runs:
+                    sink.write(dict(result, cell=f"cell{i:03d}"))
+            sink.close()
+            self.assertEqual(len(list(result_sources([tmp]))), 3)
+            table = TurnTable.from_paths([tmp, os.path.join(tmp, 'sweep', 'cell000.jsonl')])
+            self.assertEqual(len(table), 4)
+            self.assertEqual(len(table.cells), 2)
+
+    def test_results_without_cell_use_profile_models(self):
+        result = _result(1, 'error', [])
+        del result['models'], result['temperatures']
+        result['profile'] = {'by_role': {role: {'plan': {'model': 'x'}} for role in _MODELS}}
+        table = TurnTable()
+        table.add(result)
+        self.assertEqual(table.cells, [(None, ('x', 'x', 'x'), (None, None, None))])
+        self.assertEqual(table.report()[0]['temperatures'], '-')
+
+
+if __name__ == '__main__':
+    unittest.main()
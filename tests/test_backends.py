@@ -0,0 +1,187 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from difficult_coworker_bench.backends import LocalBackend, OpenAIBackend
+from difficult_coworker_bench.ratelimit import RateLimiter
+from difficult_coworker_bench.simulation import Simulation, load_roles
+
+
+class _KeepAliveStandIn(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.server.peers.add(self.client_address)
+        data = json.dumps({
+            'id': 'x', 'object': 'chat.completion', 'created': 0, 'model': 'm',
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': 'ok'}}],
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def _local_sim(backend, **kwargs):
+    missing = {'description': 'd', 'content': 'c', 'max_attempts': 2}
+    return Simulation(
+        load_roles(), missing,
+        protagonist_model='m', coworker_model='m', supervisor_model='m',
+        protagonist_temp=0.0, coworker_temp=0.0, supervisor_temp=0.0,
+        memory_file='unused.mem', output_file='unused.out', backend=backend, **kwargs
+    )
+
+
+class LocalBackendTest(unittest.TestCase):
+    def _run(self, sim):
+        with tempfile.TemporaryDirectory() as tmp:
+            return sim.run_once(1, os.path.join(tmp, 'mem.txt'), os.path.join(tmp, 'out.json'))
+
+    def test_runs_are_deterministic_and_terminate(self):
+        first = self._run(_local_sim(LocalBackend()))
+        second = self._run(_local_sim(LocalBackend()))
+        self.assertEqual(first['conversation'], second['conversation'])
+        self.assertEqual(first['outcome'], 'moderate_failure')
+        roles = [entry['role'] for entry in first['conversation']]
+        self.assertEqual(roles[:3], ['protagonist', 'coworker', 'protagonist'])
+        self.assertIn('supervisor', roles)
+        self.assertGreater(first['usage']['prompt_tokens'], 0)
+
+    def test_fused_mode(self):
+        backend = LocalBackend()
+        result = self._run(_local_sim(backend, fused=True))
+        self.assertEqual(result['outcome'], 'moderate_failure')
+        self.assertEqual(backend.calls, result['usage']['fused_turns'])
+
+    def test_concurrent_batch(self):
+        backend = LocalBackend(latency=0.01)
+        with tempfile.TemporaryDirectory() as tmp:
+            sim = _local_sim(backend, concurrency=4)
+            sim.memory_file = os.path.join(tmp, 'mem.txt')
+            sim.output_file = os.path.join(tmp, 'out.json')
+            sim.events.console = False
+            results = sim.run(8)
+        self.assertEqual([r['outcome'] for r in results], ['moderate_failure'] * 8)
+
+    def test_async_driver_closes_the_backend_pools(self):
+        backend = LocalBackend()
+        loops = []
+
+        async def aclose():
+            loops.append(asyncio.get_running_loop())
+
+        backend.aclose = aclose
+        with tempfile.TemporaryDirectory() as tmp:
+            sim = _local_sim(backend, concurrency=2)
+            sim.memory_file = os.path.join(tmp, 'mem.txt')
+            sim.output_file = os.path.join(tmp, 'out.json')
+            sim.events.console = False
+            sim.run(2)
+        # Closed once, on the driver's loop, although three agents share it
+        self.assertEqual(len(loops), 1)
+
+
+class StreamingTest(unittest.TestCase):
+    def _run(self, sim):
+        with tempfile.TemporaryDirectory() as tmp:
+            return sim.run_once(1, os.path.join(tmp, 'mem.txt'), os.path.join(tmp, 'out.json'))
+
+    def test_leak_stops_generation_and_the_run(self):
+        secret = 'host: db.internal\npassword: hunter22'
+        sim = _local_sim(LocalBackend(leak_after=1), stream=True)
+        sim.missing_info['content'] = secret
+        result = self._run(sim)
+        self.assertEqual(result['outcome'], 'strong_success')
+        last = result['conversation'][-1]
+        self.assertEqual(last['role'], 'coworker')
+        # Generation stopped at the last fragment, before the small talk
+        self.assertTrue(last['text'].endswith('hunter22'))
+        self.assertEqual(result['usage']['early_stops'], 1)
+        self.assertEqual(result['usage']['streamed_calls'], result['usage']['calls'])
+        ttft = result['profile']['by_role']['coworker']['plan']['ttft']
+        self.assertEqual(ttft['count'], 2)
+
+    def test_streamed_usage_settles_the_token_budget(self):
+        limiter = RateLimiter(default_limits={'tpm': 100000})
+        sim = _local_sim(LocalBackend(), stream=True, rate_limiter=limiter)
+        result = self._run(sim)
+        self.assertEqual(result['outcome'], 'moderate_failure')
+        self.assertEqual(result['usage']['streamed_calls'], result['usage']['calls'])
+        # Reservations were corrected to the actual usage of each reply
+        bucket = limiter.for_model('m').tokens
+        spent = result['usage']['prompt_tokens'] + result['usage']['completion_tokens']
+        self.assertAlmostEqual(bucket.capacity - bucket.tokens, spent, delta=100)
+
+    def test_partial_leak_is_a_weak_success(self):
+        sim = _local_sim(LocalBackend(leak_after=1))
+        sim.missing_info['fragments'] = ['password: s3cr3t', 'token: abc123']
+        sim.missing_info['content'] = 'password: s3cr3t'
+        result = self._run(sim)
+        self.assertEqual(result['outcome'], 'weak_success')
+        self.assertEqual(result['usage']['streamed_calls'], 0)
+        # The partial leak did not end the run: the coworker attempts were used up
+        replies = [t for t in result['conversation'] if t['role'] == 'coworker']
+        self.assertEqual(len(replies), sim.missing_info['max_attempts'])
+
+
+class OpenAIBackendTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _KeepAliveStandIn)
+        self.server.peers = set()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.backend = OpenAIBackend(
+            base_url=f'http://127.0.0.1:{self.server.server_port}/v1', api_key='test')
+
+    def tearDown(self):
+        self.backend.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_sync_calls_reuse_one_connection(self):
+        request = {'model': 'm', 'messages': [{'role': 'user', 'content': 'hi'}]}
+        for _ in range(3):
+            resp = self.backend.complete(request)
+            self.assertEqual(resp.choices[0].message.content, 'ok')
+        self.assertEqual(len(self.server.peers), 1)
+
+    def test_async_client_per_event_loop(self):
+        request = {'model': 'm', 'messages': [{'role': 'user', 'content': 'hi'}]}
+
+        async def call():
+            try:
+                return await self.backend.acomplete(request)
+            finally:
+                await self.backend.aclose()
+
+        # A second loop must not reuse connections bound to the first
+        self.assertEqual(asyncio.run(call()).choices[0].message.content, 'ok')
+        self.assertEqual(asyncio.run(call()).choices[0].message.content, 'ok')
+
+    def test_aclose_closes_the_loops_pool(self):
+        request = {'model': 'm', 'messages': [{'role': 'user', 'content': 'hi'}]}
+
+        async def call():
+            await self.backend.acomplete(request)
+            client = self.backend.async_client()
+            await self.backend.aclose()
+            return client
+
+        client = asyncio.run(call())
+        self.assertTrue(client.is_closed())
+        self.assertEqual(self.backend._async_clients, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from difficult_coworker_bench.backends import LocalBackend
+from difficult_coworker_bench.batch import BatchScheduler, LocalBatchEndpoint
+from difficult_coworker_bench.events import EventLog
+from difficult_coworker_bench.simulation import Simulation, load_roles
+
+
+class _LeakOnce(LocalBackend):
+    """
+    Local backend whose coworker gives the secret away in one reply only.
+    """
+    leaked = False
+
+    def _leaks(self, messages):
+        if self.leaked or 'confidential information: ' not in messages[0]['content']:
+            return False
+        self.leaked = True
+        return True
+
+
+class _FailOnce(LocalBackend):
+    """
+    Local backend failing its first request with a 429.
+    """
+    failed = False
+
+    def complete(self, request):
+        if not self.failed:
+            self.failed = True
+            error = RuntimeError("Rate limit reached")
+            error.status_code = 429
+            raise error
+        return super().complete(request)
+
+
+def _run(tmp, backend, runs):
+    jobs = os.path.join(tmp, 'jobs')
+    scheduler = BatchScheduler(LocalBatchEndpoint(jobs, backend=backend), jobs, poll_interval=0.001)
+    sim = Simulation(
+        load_roles(), {'description': 'd', 'content': 'password: s3cr3t', 'max_attempts': 2},
+        protagonist_model='m', coworker_model='m', supervisor_model='m',
+        protagonist_temp=0.0, coworker_temp=0.0, supervisor_temp=0.0,
+        memory_file=os.path.join(tmp, 'mem.txt'), output_file=os.path.join(tmp, 'out.json'),
+        events=EventLog(console=False, memory=False), batch=scheduler
+    )
+    results = sim.run(runs)
+    sizes = []
+    for name in sorted(os.listdir(jobs)):
+        if name.endswith('.input.jsonl'):
+            with open(os.path.join(jobs, name)) as f:
+                sizes.append(len(f.readlines()))
+    return results, scheduler, sizes
+
+
+class BatchSchedulerTest(unittest.TestCase):
+    def test_runs_advance_in_lockstep_and_finish_at_different_turns(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            results, scheduler, sizes = _run(tmp, _LeakOnce(), 3)
+        outcomes = sorted(r['outcome'] for r in results)
+        self.assertEqual(outcomes, ['moderate_failure', 'moderate_failure', 'strong_success'])
+        lengths = {r['outcome']: len(r['conversation']) for r in results}
+        self.assertLess(lengths['strong_success'], lengths['moderate_failure'])
+        # One job per step: all three runs until the leak, then the other two
+        self.assertEqual(sizes[:4], [3, 3, 3, 3])
+        self.assertEqual(set(sizes[4:]), {2})
+        self.assertEqual(scheduler.stats()['requests'], sum(r['usage']['calls'] for r in results))
+
+    def test_retryable_failures_are_resubmitted_with_the_next_job(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            results, scheduler, sizes = _run(tmp, _FailOnce(), 2)
+            with open(os.path.join(tmp, 'jobs', 'job00001.output.jsonl')) as f:
+                statuses = [json.loads(line)['response']['status_code'] for line in f]
+        self.assertEqual(statuses, [429, 200])
+        self.assertEqual(scheduler.stats()['retried'], 1)
+        self.assertEqual([r['outcome'] for r in results], ['moderate_failure'] * 2)
+        self.assertEqual(sizes[:2], [2, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
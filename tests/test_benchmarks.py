@@ -0,0 +1,75 @@
+import os
+import random
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+from bench import compare
+from mock_server import MockChatServer, parse_latency
+from difficult_coworker_bench.backends import OpenAIBackend
+
+
+class MockServerTest(unittest.TestCase):
+    def test_latency_specs(self):
+        rng = random.Random(0)
+        self.assertEqual(parse_latency('fixed:0.5')(rng), 0.5)
+        self.assertTrue(0.1 <= parse_latency('uniform:0.1:0.2')(rng) <= 0.2)
+        self.assertGreater(parse_latency('lognormal:0.05:0.5')(rng), 0)
+        with self.assertRaises(ValueError):
+            parse_latency('normal:1')
+
+    def test_scripted_replies_and_injected_errors(self):
+        script = {'coworker': ['Nice weather.', 'Go team!']}
+        with MockChatServer(script=script, error_rate=0.0) as server:
+            backend = OpenAIBackend(base_url=server.base_url, api_key='test')
+            request = {'model': 'm', 'messages': [
+                {'role': 'system', 'content': 'You are Coworker. Reply with text.'},
+                {'role': 'user', 'content': 'hi'},
+            ]}
+            replies = [backend.complete(request).choices[0].message.content for _ in range(3)]
+            self.assertEqual(replies, ['Nice weather.', 'Go team!', 'Nice weather.'])
+            server.error_rate = 1.0
+            with self.assertRaises(Exception) as ctx:
+                backend.complete(request)
+            self.assertIn(ctx.exception.status_code, (429, 500))
+            self.assertEqual(server.stats()['errors'], 1)
+            backend.close()
+
+
+    def test_streamed_reply_and_early_close(self):
+        script = {'coworker': ['one two three four five six seven eight']}
+        with MockChatServer(script=script, chunk_delay=0.02) as server:
+            backend = OpenAIBackend(base_url=server.base_url, api_key='test')
+            request = {'model': 'm', 'messages': [
+                {'role': 'system', 'content': 'You are Coworker. Reply with text.'},
+                {'role': 'user', 'content': 'hi'},
+            ]}
+            deltas = list(backend.stream(request))
+            self.assertEqual(''.join(text for text, _ in deltas),
+                             'one two three four five six seven eight')
+            self.assertGreater(deltas[-1][1]['completion_tokens'], 0)
+            stream = backend.stream(request)
+            self.assertEqual(next(stream)[0], 'one ')
+            stream.close()
+            backend.close()
+            for _ in range(50):
+                if server.stats()['cancelled']:
+                    break
+                time.sleep(0.02)
+            self.assertEqual(server.stats()['cancelled'], 1)
+
+
+class CompareTest(unittest.TestCase):
+    def test_regressions_must_exceed_both_tolerances(self):
+        baseline = {'s': {'runs_per_sec': 10.0, 'file_opens': 100, 'peak_rss_mb': 60.0}}
+        self.assertEqual(compare({'s': {'runs_per_sec': 8.0, 'file_opens': 101}}, baseline), [])
+        regressions = compare({'s': {'runs_per_sec': 5.0, 'file_opens': 150}}, baseline)
+        self.assertEqual(len(regressions), 2)
+        # Scenarios missing from the baseline are not compared
+        self.assertEqual(compare({'new': {'runs_per_sec': 0.1}}, baseline), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import os
+import sys
+import tempfile
+import types
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from difficult_coworker_bench.agent import Agent
+from difficult_coworker_bench.cache import CachePolicy, ResponseCache
+
+
+def _fake_response(content):
+    message = types.SimpleNamespace(content=content)
+    return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'cache.sqlite')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_key_depends_on_model_temperature_and_messages(self):
+        msgs = [{'role': 'system', 'content': 'x'}]
+        base = ResponseCache.key('m', 0.0, msgs)
+        self.assertEqual(base, ResponseCache.key('m', 0.0, [dict(msgs[0])]))
+        self.assertNotEqual(base, ResponseCache.key('m2', 0.0, msgs))
+        self.assertNotEqual(base, ResponseCache.key('m', 0.5, msgs))
+        self.assertNotEqual(base, ResponseCache.key('m', 0.0, msgs + msgs))
+        schema = {'type': 'json_schema', 'json_schema': {'name': 'plan'}}
+        self.assertNotEqual(base, ResponseCache.key('m', 0.0, msgs, schema))
+
+    def test_hits_misses_and_bytes_saved(self):
+        cache = ResponseCache(self.path)
+        self.assertIsNone(cache.get('k'))
+        cache.put('k', 'hello')
+        self.assertEqual(cache.get('k'), 'hello')
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+        self.assertEqual(cache.stats()['bytes_saved'], 5)
+        cache.close()
+
+    def test_lru_eviction(self):
+        cache = ResponseCache(self.path, max_bytes=10)
+        cache.put('a', 'aaaa')
+        cache.put('b', 'bbbb')
+        cache.get('a')  # a is now more recent than b
+        cache.put('c', 'cccc')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 'aaaa')
+        self.assertEqual(cache.get('c'), 'cccc')
+        cache.close()
+
+    def test_policy(self):
+        policy = CachePolicy(['coworker'])
+        self.assertTrue(policy.allows('protagonist', 0))
+        self.assertFalse(policy.allows('protagonist', 0.7))
+        self.assertTrue(policy.allows('coworker', 0.7))
+
+    def test_agent_serves_repeat_call_from_cache(self):
+        cache = ResponseCache(self.path)
+        missing = {'description': 'd', 'content': 'c', 'max_attempts': 1}
+        agent = Agent('coworker', 'Coworker', 'desc', missing,
+                      model='m', temperature=0.0, cache=cache)
+        calls = []
+
+        def _chat(self, messages):
+            calls.append(messages)
+            return _fake_response(' analysis ')
+
+        agent._chat = types.MethodType(_chat, agent)
+        self.assertEqual(agent.evaluate([]), 'analysis')
+        self.assertEqual(agent.evaluate([]), 'analysis')
+        self.assertEqual(len(calls), 1)
+        # Sampled calls bypass the cache unless the role opted in
+        agent.temperature = 0.7
+        agent.evaluate([])
+        self.assertEqual(len(calls), 2)
+        cache.close()
+
+    def test_structured_and_plain_plans_do_not_share_entries(self):
+        cache = ResponseCache(self.path)
+        missing = {'description': 'd', 'content': 'c', 'max_attempts': 1}
+        calls = []
+
+        def _chat(self, messages):
+            calls.append(self.structured_output)
+            return _fake_response('{"recipient": "coworker", "message": "hi"}')
+
+        for structured in (False, True, False, True):
+            agent = Agent('protagonist', 'Protagonist', 'desc', missing, model='m',
+                          temperature=0.0, cache=cache, structured_output=structured)
+            agent._chat = types.MethodType(_chat, agent)
+            agent.plan([], 'analysis')
+        # One miss per mode, then each mode hits its own entry
+        self.assertEqual(calls, [False, True])
+        self.assertEqual(cache.stats()['hits'], 2)
+        cache.close()
@@ -0,0 +1,85 @@
+import json
+import os
+import sys
+import tempfile
+import types
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from difficult_coworker_bench.cassette import Cassette, CassetteMismatch
+from difficult_coworker_bench.simulation import (
+    Simulation, load_roles, replay_cassette, replay_cassettes
+)
+
+
+def _fake_response(content):
+    message = types.SimpleNamespace(content=content)
+    return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=None)
+
+
+def _scripted_chat(self, messages):
+    """
+    Stand-in for Agent._chat: analysis for evaluate calls, routing JSON for plans.
+    """
+    if not messages[0]['content'].endswith('without planning your reply yet.'):
+        if self.role_key == 'protagonist':
+            return _fake_response(json.dumps({'recipient': 'coworker', 'message': 'ask'}))
+        if self.role_key == 'coworker':
+            return _fake_response('deflect')
+    return _fake_response('analysis')
+
+
+class CassetteTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.missing = {'description': 'd', 'content': 'c', 'max_attempts': 2}
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def _record(self, name, runs=2):
+        cassette = Cassette(self._path(name), 'record')
+        sim = Simulation(
+            load_roles(), self.missing,
+            protagonist_model='m', coworker_model='m', supervisor_model='m',
+            protagonist_temp=0.0, coworker_temp=0.0, supervisor_temp=0.0,
+            memory_file=self._path('rec_mem.txt'), output_file=self._path('rec.json'),
+            cassette=cassette
+        )
+        for agent in sim.agents.values():
+            agent._chat = types.MethodType(_scripted_chat, agent)
+        results = sim.run(runs)
+        cassette.close()
+        return results
+
+    def test_replay_reproduces_results_without_api(self):
+        recorded = self._record('c.jsonl')
+        # No _chat stub here: any API call would fail the run with 'error'
+        replayed = replay_cassette(self._path('c.jsonl'), self._path('m.txt'), self._path('o.json'))
+        self.assertEqual(recorded, replayed)
+
+    def test_replay_fails_loudly_on_divergence(self):
+        self._record('c.jsonl', runs=1)
+        with open(self._path('c.jsonl')) as f:
+            lines = f.readlines()
+        header = json.loads(lines[0])
+        header['config']['missing_info']['description'] = 'changed'
+        lines[0] = json.dumps(header) + '\n'
+        with open(self._path('c.jsonl'), 'w') as f:
+            f.writelines(lines)
+        with self.assertRaises(CassetteMismatch):
+            replay_cassette(self._path('c.jsonl'), self._path('m.txt'), self._path('o.json'))
+
+    def test_replay_many_cassettes_in_parallel(self):
+        self._record('a.jsonl')
+        self._record('b.jsonl', runs=3)
+        out_dir = self._path('replays')
+        replayed = replay_cassettes(
+            [self._path('a.jsonl'), self._path('b.jsonl')], out_dir, workers=2
+        )
+        self.assertEqual(len(replayed[self._path('a.jsonl')]), 2)
+        self.assertEqual(len(replayed[self._path('b.jsonl')]), 3)
+        self.assertTrue(os.path.exists(os.path.join(out_dir, 'a_replay.json')))
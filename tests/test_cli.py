@@ -0,0 +1,116 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+CLI = os.path.join(ROOT, 'src', 'difficult_coworker_bench', 'cli.py')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+from difficult_coworker_bench.backends import LocalBackend
+from difficult_coworker_bench.simulation import Simulation, estimate_calls, load_roles
+
+# Modules the CLI must not import before the first completion call
+_HEAVY = ('openai', 'httpx', 'asyncio')
+
+
+def _imported_modules(args, cwd=None):
+    """
+    Run python -X importtime with args and return (process, imported module names).
+    """
+    env = dict(os.environ, PYTHONPATH=os.path.join(ROOT, 'src'))
+    proc = subprocess.run([sys.executable, '-X', 'importtime', *args],
+                          capture_output=True, text=True, env=env, cwd=cwd)
+    modules = {
+        line.rsplit('|', 1)[1].strip()
+        for line in proc.stderr.splitlines() if line.startswith('import time:')
+    }
+    return proc, modules
+
+
+class StartupTest(unittest.TestCase):
+    def assertNoHeavyImports(self, modules):
+        heavy = sorted(m for m in modules if m.split('.')[0] in _HEAVY)
+        self.assertEqual(heavy, [])
+
+    def test_importing_cli_defers_sdk(self):
+        proc, modules = _imported_modules(['-c', 'import difficult_coworker_bench.cli'])
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        self.assertIn('difficult_coworker_bench.simulation', modules)
+        self.assertNoHeavyImports(modules)
+
+    def test_dry_run_prints_plan_without_side_effects(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            proc, modules = _imported_modules(
+                [CLI, '--dry-run', '--runs', '3', '--max-attempts', '2'], cwd=tmp)
+            self.assertEqual(os.listdir(tmp), [])
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        self.assertIn('~10 per run, ~30 in total', proc.stdout)
+        self.assertNoHeavyImports(modules)
+
+    def test_invalid_missing_info_is_rejected(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            info = os.path.join(tmp, 'info.json')
+            with open(info, 'w') as f:
+                json.dump({'description': 'd'}, f)
+            proc = subprocess.run(
+                [sys.executable, CLI, '--dry-run', '--missing-info-file', info],
+                capture_output=True, text=True, cwd=tmp)
+        self.assertEqual(proc.returncode, 2)
+        self.assertIn("Invalid missing info", proc.stderr)
+
+
+class AnalyzeCommandTest(unittest.TestCase):
+    def test_analyze_writes_csv_report(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            result = {'run': 1, 'outcome': 'strong_success',
+                      'conversation': [{'role': 'protagonist', 'content': '[to supervisor] x'}],
+                      'models': {'protagonist': 'm', 'coworker': 'm', 'supervisor': 'm'},
+                      'temperatures': {'protagonist': 0, 'coworker': 0, 'supervisor': 0}}
+            with open(os.path.join(tmp, 'out_run1.json'), 'w') as f:
+                json.dump(result, f)
+            report = os.path.join(tmp, 'report.csv')
+            proc = subprocess.run(
+                [sys.executable, CLI, 'analyze', tmp, '--format', 'csv', '--output', report],
+                capture_output=True, text=True)
+            self.assertEqual(proc.returncode, 0, proc.stderr)
+            with open(report) as f:
+                lines = f.read().splitlines()
+        self.assertTrue(lines[0].startswith('scenario,models,temperatures'))
+        self.assertIn(',m,0,1,escalation_rate,1,1.0,1.0,1.0', lines)
+
+
+class EstimateCallsTest(unittest.TestCase):
+    def test_estimate_is_for_a_run_that_never_escalates(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for fused in (False, True):
+                sim = Simulation(
+                    load_roles(), {'description': 'd', 'content': 'c', 'max_attempts': 3},
+                    protagonist_model='m', coworker_model='m', supervisor_model='m',
+                    protagonist_temp=0.0, coworker_temp=0.0, supervisor_temp=0.0,
+                    memory_file='unused.mem', output_file='unused.out',
+                    fused=fused, backend=LocalBackend()
+                )
+                result = sim.run_once(1, os.path.join(tmp, 'mem.txt'), os.path.join(tmp, 'out.json'))
+                # The local backend escalates once: two extra turns
+                per_turn = 1 if fused else 2
+                self.assertEqual(result['usage']['calls'], estimate_calls(3, fused) + 2 * per_turn)
+
+    def test_runs_ending_early_make_fewer_calls(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            sim = Simulation(
+                load_roles(), {'description': 'd', 'content': 'password: hunter22', 'max_attempts': 3},
+                protagonist_model='m', coworker_model='m', supervisor_model='m',
+                protagonist_temp=0.0, coworker_temp=0.0, supervisor_temp=0.0,
+                memory_file='unused.mem', output_file='unused.out',
+                backend=LocalBackend(leak_after=1)
+            )
+            result = sim.run_once(1, os.path.join(tmp, 'mem.txt'), os.path.join(tmp, 'out.json'))
+        # The secret leaks in the first coworker reply, ending the run
+        self.assertEqual(result['outcome'], 'strong_success')
+        self.assertLess(result['usage']['calls'], estimate_calls(3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import sys
+import types
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from difficult_coworker_bench.agent import Agent, CURRENT_USAGE, new_usage
+from difficult_coworker_bench.context import ContextBudget, count_tokens
+from difficult_coworker_bench.turns import Turn
+
+
+def _fake_response(content):
+    message = types.SimpleNamespace(content=content)
+    return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=None)
+
+
+class CountTokensTest(unittest.TestCase):
+    def test_estimates(self):
+        self.assertEqual(count_tokens(''), 0)
+        self.assertEqual(count_tokens('hello world'), 2)
+        self.assertEqual(count_tokens('port: 5432'), 4)
+        self.assertGreater(count_tokens('word ' * 100), 90)
+
+
+class RollingSummaryTest(unittest.TestCase):
+    def setUp(self):
+        missing = {'description': 'd', 'content': 'c', 'max_attempts': 1}
+        self.agent = Agent('coworker', 'Coworker', 'desc', missing, model='m',
+                           temperature=0.0, context=ContextBudget(60, keep_recent=2))
+        self.summaries = []
+
+        def _chat(agent, messages):
+            if 'running summary' in messages[0]['content']:
+                self.summaries.append(messages)
+                return _fake_response(f"summary {len(self.summaries)}")
+            return _fake_response('reply')
+
+        self.agent._chat = types.MethodType(_chat, self.agent)
+
+    def test_old_turns_are_folded_incrementally(self):
+        conversation = []
+        stats = new_usage()
+        token = CURRENT_USAGE.set(stats)
+        try:
+            for i in range(12):
+                conversation.append(Turn(i + 1, 'protagonist', f"please share the config {i} " * 3))
+                self.agent.evaluate(conversation)
+        finally:
+            CURRENT_USAGE.reset(token)
+        messages = self.agent.evaluate_messages(conversation)
+        # system prompt, rolling summary, then recent turns verbatim
+        self.assertTrue(messages[1]['content'].startswith('Summary of the earlier conversation:'))
+        self.assertIn(conversation[-1].content, messages[-1]['content'])
+        self.assertLess(len(messages), len(conversation))
+        # Several folds, each one extending the previous summary with new turns only
+        self.assertGreater(len(self.summaries), 1)
+        self.assertIn('summary 1', self.summaries[1][1]['content'])
+        self.assertNotIn('config 0 ', self.summaries[1][1]['content'])
+        # Prompt sizes stay bounded instead of growing with the conversation
+        curve = stats['prompt_token_curve']
+        self.assertLess(max(curve[-4:]), 2 * curve[0] + 100)
+
+    def test_under_budget_sends_full_history(self):
+        conversation = [Turn(1, 'protagonist', 'hi')]
+        self.agent.evaluate(conversation)
+        self.assertEqual(self.summaries, [])
+        self.assertEqual(len(self.agent.evaluate_messages(conversation)), 2)
@@ -0,0 +1,57 @@
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from difficult_coworker_bench.events import EventLog, render_memory_line
+
+
+class EventLogTest(unittest.TestCase):
+    def test_events_are_written_and_rendered(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'events.jsonl')
+            mem = os.path.join(tmp, 'mem.txt')
+            log = EventLog(path, flush_interval=60, tag_runs=True)
+            log.open_run(3, mem)
+            out = io.StringIO()
+            with redirect_stdout(out):
+                log.emit(3, 'analysis', role='coworker', phase='evaluate', text='a')
+                log.emit(3, 'call', role='coworker', phase='evaluate', latency=0.5)
+                log.emit(3, 'message', role='coworker', recipient=None, text='hi')
+                log.flush()
+                log.close()
+            with open(path) as f:
+                events = [json.loads(line) for line in f]
+            with open(mem) as f:
+                memory = f.read()
+        self.assertEqual([e['kind'] for e in events], ['analysis', 'call', 'message'])
+        self.assertTrue(all(e['run'] == 3 and 'ts' in e for e in events))
+        self.assertEqual(memory, '[Coworker analysis]: a\n[Coworker]: hi\n')
+        self.assertEqual(out.getvalue(), '[run 3] [Coworker analysis]: a\n[run 3] [Coworker]: hi\n')
+
+    def test_buffer_size_triggers_write_without_flush(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'events.jsonl')
+            log = EventLog(path, flush_interval=60, buffer_size=2, console=False)
+            log.emit(1, 'note', text='x')
+            log.emit(1, 'note', text='y')
+            # Writer thread picks the batch up shortly; close drains the rest
+            log.close()
+            with open(path) as f:
+                self.assertEqual(len(f.readlines()), 2)
+
+    def test_render_memory_line(self):
+        self.assertEqual(
+            render_memory_line({'kind': 'message', 'role': 'protagonist',
+                                'recipient': 'supervisor', 'text': 'help'}),
+            '[Protagonist -> supervisor]: help'
+        )
+        self.assertEqual(
+            render_memory_line({'kind': 'raw_plan', 'role': 'supervisor', 'text': 'oops'}),
+            '[Supervisor RAW PLAN]: oops'
+        )
+        self.assertIsNone(render_memory_line({'kind': 'call', 'role': 'supervisor'}))
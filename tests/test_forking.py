@@ -0,0 +1,101 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from difficult_coworker_bench.backends import LocalBackend
+from difficult_coworker_bench.cache import ResponseCache
+from difficult_coworker_bench.events import EventLog
+from difficult_coworker_bench.forking import ConversationTree, validate_fork_points
+from difficult_coworker_bench.results import ResultSink
+from difficult_coworker_bench.simulation import Simulation, load_roles
+
+
+def _sim(tmp, concurrency=1, **kwargs):
+    return Simulation(
+        load_roles(), {'description': 'd', 'content': 'key: abcdef', 'max_attempts': 3},
+        'm', 'm', 'm', 0.7, 0.7, 0.7,
+        os.path.join(tmp, 'mem.txt'), os.path.join(tmp, 'tree.json'),
+        concurrency=concurrency, events=EventLog(console=False, memory=False),
+        backend=LocalBackend(), **kwargs
+    )
+
+
+class ConversationTreeTest(unittest.TestCase):
+    def test_segments_and_statistics(self):
+        tree = ConversationTree([2], 2)
+        root = tree.add()
+        prefix = [{'role': 'protagonist', 'content': '[to coworker] a'},
+                  {'role': 'coworker', 'content': 'b'}]
+        tree.record(root, {'conversation': prefix, 'coworker_attempts': 1, 'outcome': None,
+                           'usage': {'calls': 4}, 'profile': None})
+        self.assertEqual(tree.state(root)['conversation'], prefix)
+        for outcome, recipient in (('strong_success', 'supervisor'), ('moderate_failure', 'coworker')):
+            leaf = tree.add(root)
+            self.assertIsNone(tree.fork_point(leaf))
+            tree.record(leaf, {
+                'conversation': prefix + [{'role': 'protagonist', 'content': f"[to {recipient}] c"}],
+                'coworker_attempts': 1, 'outcome': outcome, 'usage': {'calls': 2}, 'profile': None})
+        # Only the new message is stored in each leaf
+        self.assertEqual([len(n['conversation']) for n in tree.nodes], [2, 1, 1])
+        self.assertEqual(len(tree.conversation(2)), 3)
+        self.assertEqual(tree.calls(), (8, 12))
+        point, = tree.branch_points()
+        self.assertEqual(point['turn'], 2)
+        self.assertEqual(point['shared_messages'], 2)
+        self.assertEqual(point['outcomes'], {'strong_success': 1, 'moderate_failure': 1})
+        self.assertEqual(point['escalation_rate'], 0.5)
+
+    def test_invalid_fork_points(self):
+        for fork_at, branches in (([], 2), ([0], 2), ([3, 3], 2), ([2], 0)):
+            with self.assertRaises(ValueError):
+                validate_fork_points(fork_at, branches)
+
+
+class RunTreeTest(unittest.TestCase):
+    def test_tree_shares_prefixes(self):
+        for concurrency in (1, 3):
+            with tempfile.TemporaryDirectory() as tmp:
+                sim = _sim(tmp, concurrency)
+                tree = sim.run_tree([2, 3], 3)
+                # Root, 3 branches at turn 2, 3 more below each at turn 3
+                self.assertEqual(len(tree.nodes), 13)
+                self.assertEqual(len(tree.leaves()), 9)
+                self.assertTrue(all(tree.nodes[leaf]['outcome'] for leaf in tree.leaves()))
+                root = tree.nodes[0]
+                self.assertEqual(sum(e['role'] == 'protagonist' for e in root['conversation']), 1)
+                for child in root['children']:
+                    # Branches continue from the shared prefix rather than repeating it
+                    self.assertEqual(tree.conversation(child)[:2], root['conversation'])
+                    self.assertEqual(tree.nodes[child]['conversation'][0]['role'], 'protagonist')
+                made, independent = tree.calls()
+                self.assertLess(made, independent)
+                self.assertEqual(sim.profile.total().calls, made)
+                with open(os.path.join(tmp, 'tree.json')) as f:
+                    saved = json.load(f)
+                self.assertEqual(len(saved['leaves']), 9)
+                self.assertEqual(len(saved['branch_points']), 4)
+
+    def test_tree_rejects_sinks(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            sink = ResultSink(os.path.join(tmp, 'r.jsonl'))
+            try:
+                with self.assertRaises(ValueError):
+                    _sim(tmp, sink=sink).run_tree([2], 2)
+            finally:
+                sink.close()
+
+    def test_tree_rejects_the_response_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ResponseCache(os.path.join(tmp, 'cache.db'))
+            try:
+                with self.assertRaisesRegex(ValueError, 'cache'):
+                    _sim(tmp, cache=cache).run_tree([2], 2)
+            finally:
+                cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from difficult_coworker_bench.backends import LocalBackend
+from difficult_coworker_bench.hedging import DeadlineExceeded, HedgePolicy
+from difficult_coworker_bench.simulation import Simulation, load_roles
+
+
+class _Slow:
+    """
+    Calls that answer after the given delays, one per attempt, in order.
+    """
+    def __init__(self, *delays, error=None):
+        self.delays = list(delays)
+        self.error = error
+        self.attempts = 0
+        self._lock = threading.Lock()
+
+    def _next(self):
+        with self._lock:
+            attempt = self.attempts
+            self.attempts += 1
+        return attempt, self.delays[min(attempt, len(self.delays) - 1)]
+
+    def __call__(self):
+        attempt, delay = self._next()
+        time.sleep(delay)
+        if self.error is not None:
+            raise self.error
+        return attempt
+
+    async def acall(self):
+        attempt, delay = self._next()
+        await asyncio.sleep(delay)
+        if self.error is not None:
+            raise self.error
+        return attempt
+
+
+def _warm(policy, samples=5, latency=0.01):
+    for _ in range(samples):
+        policy._finish('m', 'plan', latency, False, False)
+
+
+class HedgePolicyTest(unittest.TestCase):
+    def test_no_hedge_before_min_samples(self):
+        policy = HedgePolicy(min_samples=5)
+        self.assertIsNone(policy.delay('m', 'plan'))
+        _warm(policy, samples=4)
+        self.assertIsNone(policy.delay('m', 'plan'))
+        _warm(policy, samples=1)
+        self.assertIsNotNone(policy.delay('m', 'plan'))
+        self.assertIsNone(policy.delay('m', 'reply'))
+        self.assertIsNone(HedgePolicy(hedge=False, min_samples=1).delay('m', 'plan'))
+
+    def test_min_delay_floors_the_trigger(self):
+        policy = HedgePolicy(min_samples=1, min_delay=0.5)
+        _warm(policy, samples=1)
+        self.assertEqual(policy.delay('m', 'plan'), 0.5)
+
+    def test_slow_call_is_hedged_and_duplicate_wins(self):
+        policy = HedgePolicy(min_samples=5)
+        _warm(policy)
+        call = _Slow(1.0, 0.0)
+        started = time.perf_counter()
+        self.assertEqual(policy.call('m', 'plan', call), 1)
+        self.assertLess(time.perf_counter() - started, 0.5)
+        stats = policy.stats()
+        self.assertEqual((stats['calls'], stats['hedged'], stats['hedge_wins']), (6, 1, 1))
+        self.assertIn('m/plan', stats['triggers'])
+
+    def test_primary_latency_is_reported_next_to_delivered(self):
+        policy = HedgePolicy(min_samples=5)
+        _warm(policy)
+        call = _Slow(0.5, 0.0)
+        policy.call('m', 'plan', call)
+        # The abandoned primary is recorded once it returns
+        deadline = time.monotonic() + 2
+        while policy.stats()['latency']['primary']['p99'] < 0.5 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        stats = policy.stats()
+        self.assertGreaterEqual(stats['latency']['primary']['p99'], 0.5)
+        self.assertLess(stats['latency']['delivered']['p99'], 0.3)
+        self.assertGreater(stats['time_saved'], 0.3)
+
+    def test_no_hedge_while_too_many_attempts_are_abandoned(self):
+        policy = HedgePolicy(min_samples=5, max_abandoned=0)
+        _warm(policy)
+        call = _Slow(0.2, 0.0)
+        self.assertEqual(policy.call('m', 'plan', call), 0)
+        self.assertEqual(call.attempts, 1)
+        self.assertEqual((policy.stats()['hedged'], policy.stats()['hedges_skipped']), (0, 1))
+        self.assertEqual(policy.max_workers, 2)
+
+    def test_fast_call_is_not_hedged(self):
+        policy = HedgePolicy(min_samples=5)
+        _warm(policy, latency=0.5)
+        call = _Slow(0.0)
+        self.assertEqual(policy.call('m', 'plan', call), 0)
+        self.assertEqual(call.attempts, 1)
+        self.assertEqual(policy.stats()['hedged'], 0)
+
+    def test_deadline_raises(self):
+        policy = HedgePolicy(deadline=0.05, hedge=False)
+        with self.assertRaises(DeadlineExceeded) as ctx:
+            policy.call('m', 'plan', _Slow(1.0))
+        self.assertIsInstance(ctx.exception, TimeoutError)
+        self.assertEqual(policy.stats()['deadline_exceeded'], 1)
+
+    def test_errors_propagate_after_both_attempts_fail(self):
+        policy = HedgePolicy(min_samples=5)
+        _warm(policy)
+        call = _Slow(0.1, 0.0, error=ValueError('boom'))
+        with self.assertRaisesRegex(ValueError, 'boom'):
+            policy.call('m', 'plan', call)
+        self.assertEqual(call.attempts, 2)
+
+    def test_async_hedge_cancels_loser(self):
+        policy = HedgePolicy(min_samples=5)
+        _warm(policy)
+        call = _Slow(1.0, 0.0)
+
+        async def go():
+            started = time.perf_counter()
+            result = await policy.acall('m', 'plan', call.acall)
+            elapsed = time.perf_counter() - started
+            await asyncio.sleep(0)
+            return result, elapsed, len(asyncio.all_tasks())
+
+        result, elapsed, tasks = asyncio.run(go())
+        self.assertEqual(result, 1)
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(tasks, 1)
+        self.assertEqual(policy.stats()['hedge_wins'], 1)
+        self.assertEqual(policy.stats()['primaries_cancelled'], 1)
+
+    def test_async_deadline_raises(self):
+        policy = HedgePolicy(deadline=0.05)
+        with self.assertRaises(DeadlineExceeded):
+            asyncio.run(policy.acall('m', 'plan', _Slow(1.0).acall))
+
+
+def _local_sim(backend, **kwargs):
+    missing = {'description': 'd', 'content': 'c', 'max_attempts': 2}
+    return Simulation(
+        load_roles(), missing,
+        protagonist_model='m', coworker_model='m', supervisor_model='m',
+        protagonist_temp=0.0, coworker_temp=0.0, supervisor_temp=0.0,
+        memory_file='unused.mem', output_file='unused.out', backend=backend, **kwargs
+    )
+
+
+class HedgedSimulationTest(unittest.TestCase):
+    def _run(self, hedge):
+        backend = LocalBackend(latency=0.005, stall_every=7, stall=0.3)
+        sim = _local_sim(backend, hedge=hedge)
+        with tempfile.TemporaryDirectory() as tmp:
+            sim.output_file = os.path.join(tmp, 'out.json')
+            sim.memory_file = os.path.join(tmp, 'mem.txt')
+            results = sim.run(4)
+        waited = sum(stats.latency.total for stats in sim.profile.phases.values())
+        return results, waited
+
+    def test_hedging_cuts_the_stalled_tail(self):
+        plain, plain_waited = self._run(None)
+        policy = HedgePolicy(quantile=50, min_samples=2)
+        hedged, hedged_waited = self._run(policy)
+        # Hedging changes latency, not the conversations
+        self.assertEqual([r['conversation'] for r in plain], [r['conversation'] for r in hedged])
+        self.assertLess(hedged_waited, plain_waited / 2)
+        stats = policy.stats()
+        self.assertGreater(stats['hedge_wins'], 0)
+        self.assertGreater(stats['calls'], stats['hedged'])
+        # The tail delivered to the agents is below that of the primary attempts
+        self.assertLess(stats['latency']['delivered']['p99'], stats['latency']['primary']['p99'])
+
+    def test_deadline_fails_the_run(self):
+        backend = LocalBackend(stall_every=1, stall=1.0)
+        sim = _local_sim(backend, hedge=HedgePolicy(deadline=0.05, hedge=False))
+        with tempfile.TemporaryDirectory() as tmp:
+            result = sim.run_once(1, os.path.join(tmp, 'mem.txt'), os.path.join(tmp, 'out.json'))
+        self.assertEqual(result['outcome'], 'error')
+        self.assertEqual(sim.hedge.stats()['deadline_exceeded'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import json
+import os
+import sys
+import tempfile
+import types
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from difficult_coworker_bench.manifest import BatchManifest, ManifestMismatch
+from difficult_coworker_bench.simulation import Simulation, load_roles
+
+
+class ResumeTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.manifest_path = os.path.join(self.tmp.name, 'batch.manifest.jsonl')
+        self.missing = {'description': 'd', 'content': 'c', 'max_attempts': 2}
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _sim(self, resume, crash_on=None):
+        sim = Simulation(
+            load_roles(), self.missing,
+            protagonist_model='m', coworker_model='m', supervisor_model='m',
+            protagonist_temp=0.0, coworker_temp=0.0, supervisor_temp=0.0,
+            memory_file=os.path.join(self.tmp.name, 'mem.txt'),
+            output_file=os.path.join(self.tmp.name, 'out.json'),
+            manifest=BatchManifest(self.manifest_path, resume=resume)
+        )
+        calls = []
+
+        def _plan(agent, conv, analysis):
+            calls.append((agent.role_key, len(conv)))
+            if crash_on is not None and len(calls) == crash_on:
+                raise KeyboardInterrupt
+            if agent.role_key == 'protagonist':
+                return json.dumps({'recipient': 'coworker', 'message': f"ask {len(conv)}"})
+            return 'deflect'
+
+        for agent in sim.agents.values():
+            agent.evaluate = lambda conv: 'analysis'
+            agent.plan = types.MethodType(_plan, agent)
+        return sim, calls
+
+    def test_resume_skips_completed_and_continues_interrupted_run(self):
+        # Each run makes 5 plan calls; crash on the 4th call of run 2
+        sim, _ = self._sim(resume=False, crash_on=9)
+        with self.assertRaises(KeyboardInterrupt):
+            sim.run(3)
+        sim.manifest.close()
+
+        sim, calls = self._sim(resume=True)
+        results = sim.run(3)
+        sim.manifest.close()
+        self.assertEqual([r['run'] for r in results], [1, 2, 3])
+        # Run 2 continues after its 2 checkpointed messages; run 1 is not redone
+        self.assertEqual(calls[0], ('protagonist', 2))
+        self.assertEqual(len(calls), 3 + 5)
+        self.assertEqual(results[1]['conversation'], results[2]['conversation'])
+        with open(os.path.join(self.tmp.name, 'out.json')) as f:
+            self.assertEqual(len(json.load(f)), 3)
+
+    def test_resume_rejects_changed_config(self):
+        sim, _ = self._sim(resume=False)
+        sim.run(1)
+        sim.manifest.close()
+        self.missing['max_attempts'] = 3
+        sim, _ = self._sim(resume=True)
+        with self.assertRaises(ManifestMismatch):
+            sim.run(1)
+        sim.manifest.close()
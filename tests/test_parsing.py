@@ -0,0 +1,38 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from difficult_coworker_bench.parsing import extract_plan
+
+PLAN = {'recipient': 'coworker', 'message': 'Can you send the config?'}
+
+
+class ExtractPlanTest(unittest.TestCase):
+    def test_bare_plan_is_not_a_repair(self):
+        self.assertEqual(extract_plan('{"recipient": "coworker", "message": "Can you send the config?"}'),
+                         (PLAN, False))
+
+    def test_fenced_and_chatty_output_is_repaired(self):
+        fenced = '```json\n{"recipient": "coworker", "message": "Can you send the config?"}\n```'
+        chatty = ('Sure! Here is my plan: {"recipient": "coworker", '
+                  '"message": "Can you send the config?"} Let me know.')
+        self.assertEqual(extract_plan(fenced), (PLAN, True))
+        self.assertEqual(extract_plan(chatty), (PLAN, True))
+
+    def test_plan_nested_in_fused_reply(self):
+        text = 'Output: {"analysis": "- a", "reply": {"recipient": "coworker", "message": "Can you send the config?"}}'
+        self.assertEqual(extract_plan(text), (PLAN, True))
+
+    def test_truncated_plan_keeps_its_fields(self):
+        plan, repaired = extract_plan('{"recipient": "supervisor", "message": "They say \\"no\\" and')
+        self.assertTrue(repaired)
+        self.assertEqual(plan, {'recipient': 'supervisor', 'message': 'They say "no" and'})
+
+    def test_text_without_a_plan(self):
+        self.assertEqual(extract_plan('I would rather talk about the weather.'), (None, False))
+        self.assertEqual(extract_plan('{"recipient": "coworker"}'), (None, False))
+
+
+if __name__ == '__main__':
+    unittest.main()
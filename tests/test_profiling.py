@@ -0,0 +1,81 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from difficult_coworker_bench.backends import LocalBackend
+from difficult_coworker_bench.profiling import Histogram, Profile, estimate_cost
+from difficult_coworker_bench.simulation import Simulation, load_roles
+
+
+class HistogramTest(unittest.TestCase):
+    def test_percentiles_within_bucket_error(self):
+        hist = Histogram()
+        for ms in range(1, 1001):
+            hist.add(ms / 1000)
+        for p, exact in ((50, 0.5), (95, 0.95), (99, 0.99)):
+            self.assertAlmostEqual(hist.percentile(p), exact, delta=exact * 0.06)
+        self.assertEqual(hist.percentile(100), 1.0)
+
+    def test_merge_matches_single_histogram(self):
+        a, b, both = Histogram(), Histogram(), Histogram()
+        for i in range(100):
+            (a if i % 2 else b).add(i / 10)
+            both.add(i / 10)
+        a.merge(Histogram.from_dict(json.loads(json.dumps(b.as_dict()))))
+        self.assertEqual(a.as_dict(), both.as_dict())
+
+
+class ProfileTest(unittest.TestCase):
+    def test_cost_uses_longest_prefix_and_cached_rate(self):
+        self.assertAlmostEqual(estimate_cost('gpt-4.1-mini-2025-04-14', 1_000_000, 0), 0.40)
+        self.assertAlmostEqual(estimate_cost('gpt-4.1', 1_000_000, 1_000_000, 1_000_000), 8.50)
+        self.assertIsNone(estimate_cost('local-model', 10, 10))
+
+    def test_record_and_prometheus(self):
+        profile = Profile()
+        self.assertGreater(profile.record('gpt-4o', 'protagonist', 'plan', 0.5, 100, 10), 0)
+        self.assertEqual(profile.record('gpt-4o', 'protagonist', 'plan', 0.0, cache_hit=True), 0.0)
+        profile.record('x', 'coworker', 'evaluate', 0.2, 5, 5)
+        data = profile.as_dict()
+        self.assertEqual(data['total']['calls'], 3)
+        self.assertEqual(data['total']['unpriced_calls'], 1)
+        self.assertEqual(data['by_role']['protagonist']['plan']['cache_hits'], 1)
+        # Unstreamed calls leave the time to first token out
+        self.assertNotIn('ttft', data['by_role']['protagonist']['plan'])
+        text = profile.to_prometheus()
+        self.assertIn('# TYPE dcb_call_latency_seconds summary', text)
+        self.assertIn('dcb_calls_total{role="protagonist",phase="plan",model="gpt-4o"} 2', text)
+
+
+class SimulationProfileTest(unittest.TestCase):
+    def test_batch_profile_is_exported(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            sim = Simulation(
+                load_roles(), {'description': 'd', 'content': 'c', 'max_attempts': 1},
+                protagonist_model='gpt-4.1-mini', coworker_model='m', supervisor_model='m',
+                protagonist_temp=0.0, coworker_temp=0.0, supervisor_temp=0.0,
+                memory_file=os.path.join(tmp, 'mem.txt'),
+                output_file=os.path.join(tmp, 'out.json'),
+                backend=LocalBackend(),
+                profile_file=os.path.join(tmp, 'profile.json'),
+                metrics_file=os.path.join(tmp, 'metrics.prom'),
+            )
+            sim.events.console = False
+            results = sim.run(2)
+            with open(os.path.join(tmp, 'profile.json')) as f:
+                profile = json.load(f)
+            self.assertTrue(os.path.exists(os.path.join(tmp, 'metrics.prom')))
+        calls = sum(r['usage']['calls'] for r in results)
+        self.assertEqual(profile['total']['calls'], calls)
+        self.assertEqual(results[0]['profile']['by_role'].keys(), {'protagonist', 'coworker', 'supervisor'})
+        self.assertIsNotNone(profile['by_role']['coworker']['plan']['latency']['p95'])
+        # Only the protagonist's model is priced
+        self.assertGreater(results[0]['usage']['cost_usd'], 0)
+        self.assertGreater(profile['by_role']['coworker']['plan']['unpriced_calls'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import types
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import openai
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from difficult_coworker_bench import agent as agent_module
+from difficult_coworker_bench.agent import Agent
+from difficult_coworker_bench.backends import OpenAIBackend
+from difficult_coworker_bench.ratelimit import (
+    ModelLimiter, RateLimiter, RetryPolicy, TokenBucket, classify, retry_after
+)
+
+_COMPLETION = {
+    'id': 'chatcmpl-test', 'object': 'chat.completion', 'created': 0, 'model': 'm',
+    'choices': [{'index': 0, 'finish_reason': 'stop',
+                 'message': {'role': 'assistant', 'content': 'ok'}}],
+    'usage': {'prompt_tokens': 5, 'completion_tokens': 1, 'total_tokens': 6},
+}
+
+
+class _StandIn(BaseHTTPRequestHandler):
+    """
+    Chat-completions stand-in: replies per the server's `script`, a list of
+    'ok', '429', 'slow', 'no-temperature' or 'no-response-format' actions
+    consumed one per request.
+    """
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.requests.append(body)
+        action = self.server.script.pop(0) if self.server.script else 'ok'
+        if action == 'no-temperature' and 'temperature' not in body:
+            action = 'ok'
+        if action == 'no-response-format' and 'response_format' not in body:
+            action = 'ok'
+        if action == 'slow':
+            time.sleep(0.5)
+            action = 'ok'
+        if action == '429':
+            self._reply(429, {'error': {'message': 'Rate limit reached', 'type': 'requests',
+                                        'code': 'rate_limit_exceeded'}},
+                        {'retry-after-ms': '20'})
+        elif action == 'no-temperature':
+            self._reply(400, {'error': {'message': "Unsupported parameter: 'temperature'",
+                                        'type': 'invalid_request_error',
+                                        'param': 'temperature',
+                                        'code': 'unsupported_parameter'}})
+        elif action == 'no-response-format':
+            self._reply(400, {'error': {'message': "Invalid parameter: 'response_format' of "
+                                                   "type 'json_schema' is not supported with this model.",
+                                        'type': 'invalid_request_error',
+                                        'param': 'response_format', 'code': None}})
+        else:
+            self._reply(200, _COMPLETION)
+
+    def _reply(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServerTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _StandIn)
+        self.server.script = []
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.backend = OpenAIBackend(
+            base_url=f'http://127.0.0.1:{self.server.server_port}/v1',
+            api_key='test', timeout=0.2)
+        self.limiter = RateLimiter(policy=RetryPolicy(max_retries=3, base_delay=0.01))
+        missing = {'description': 'd', 'content': 'c', 'max_attempts': 1}
+        self.agent = Agent('coworker', 'Coworker', 'desc', missing, model='m',
+                           rate_limiter=self.limiter, backend=self.backend)
+
+    def tearDown(self):
+        self.backend.close()
+        agent_module._UNSUPPORTED_PARAMS.pop('m', None)
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_retries_after_429(self):
+        self.server.script = ['429', '429']
+        self.assertEqual(self.agent.evaluate([]), 'ok')
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(self.limiter.retries, 2)
+        self.assertEqual(self.limiter.stats()['throttled'], {'m': 2})
+
+    def test_retries_timeout_async(self):
+        self.server.script = ['slow']
+        self.assertEqual(asyncio.run(self.agent.aevaluate([])), 'ok')
+        self.assertEqual(self.limiter.retries, 1)
+
+    def test_gives_up_after_max_retries(self):
+        self.server.script = ['429'] * 4
+        with self.assertRaises(openai.RateLimitError):
+            self.agent.evaluate([])
+        self.assertEqual(len(self.server.requests), 4)
+
+    def test_unsupported_temperature_is_remembered(self):
+        self.server.script = ['no-temperature']
+        self.agent.evaluate([])
+        self.agent.evaluate([])
+        self.assertEqual(['temperature' in r for r in self.server.requests],
+                         [True, False, False])
+
+    def test_unsupported_response_format_is_remembered(self):
+        missing = {'description': 'd', 'content': 'c', 'max_attempts': 1}
+        agent = Agent('supervisor', 'Supervisor', 'desc', missing, model='m',
+                      rate_limiter=self.limiter, backend=self.backend, structured_output=True)
+        self.server.script = ['no-response-format']
+        agent.plan([], 'analysis')
+        agent.plan([], 'analysis')
+        agent.evaluate([])
+        formats = [r.get('response_format') for r in self.server.requests]
+        self.assertEqual(formats[1:], [None, None, None])
+        schema = formats[0]['json_schema']['schema']
+        self.assertEqual(schema['properties']['recipient']['enum'], ['protagonist', 'coworker'])
+        self.assertTrue(formats[0]['json_schema']['strict'])
+
+
+class RateLimiterTest(unittest.TestCase):
+    def test_classify_and_retry_after(self):
+        response = types.SimpleNamespace(headers={'retry-after': '2'})
+        throttled = types.SimpleNamespace(status_code=429, code=None, response=response)
+        self.assertEqual(classify(throttled), 'throttled')
+        self.assertEqual(retry_after(throttled), 2.0)
+        quota = types.SimpleNamespace(status_code=429, code='insufficient_quota')
+        self.assertIsNone(classify(quota))
+        self.assertEqual(classify(types.SimpleNamespace(status_code=503)), 'transient')
+        self.assertIsNone(classify(types.SimpleNamespace(status_code=400)))
+        self.assertIsNone(classify(ValueError('bad')))
+
+    def test_backoff_is_capped_and_honors_hint(self):
+        policy = RetryPolicy(base_delay=1.0, max_delay=4.0)
+        for attempt in range(10):
+            self.assertLessEqual(policy.delay(attempt), 4.0)
+        self.assertGreaterEqual(policy.delay(0, hint=3.0), 3.0)
+
+    def test_token_bucket_waits_once_overdrawn(self):
+        bucket = TokenBucket(60)  # one unit per second
+        self.assertEqual(bucket.reserve(60), 0.0)
+        self.assertAlmostEqual(bucket.reserve(2), 2.0, delta=0.05)
+        bucket.refund(2)
+        self.assertLess(bucket.reserve(0), 0.05)
+
+    def test_concurrency_limit_halves_on_429_and_recovers(self):
+        limiter = ModelLimiter(max_concurrency=8)
+        for _ in range(8):
+            self.assertTrue(limiter.try_enter())
+        self.assertFalse(limiter.try_enter())
+        limiter.leave('throttled')
+        self.assertEqual(limiter.limit, 4.0)
+        for _ in range(7):
+            limiter.leave('ok')
+        self.assertGreater(limiter.limit, 4.0)
+        self.assertLessEqual(limiter.limit, 8.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import json
+import os
+import sys
+import tempfile
+import types
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from difficult_coworker_bench.results import (
+    BatchSummary, ResultSink, escalation_turn, read_results
+)
+from difficult_coworker_bench.simulation import Simulation, load_roles
+
+
+def _result(run, outcome, contents):
+    conversation = [{'role': 'protagonist', 'content': c} for c in contents]
+    return {'run': run, 'outcome': outcome, 'conversation': conversation,
+            'usage': {'calls': 2, 'prompt_token_curve': [10, 30]}}
+
+
+class BatchSummaryTest(unittest.TestCase):
+    def test_online_statistics(self):
+        summary = BatchSummary()
+        summary.add(_result(1, 'moderate_failure', ['[to coworker] a', '[to coworker] b']))
+        summary.add(_result(2, 'error', ['[to coworker] a', '[to supervisor] b', '[to coworker] c']))
+        stats = summary.as_dict()
+        self.assertEqual(stats['outcomes'], {'moderate_failure': 1, 'error': 1})
+        self.assertEqual(stats['turns'], {'count': 2, 'mean': 2.5, 'min': 2, 'max': 3})
+        self.assertEqual(stats['escalated_runs'], 1)
+        self.assertEqual(stats['escalation_turn']['mean'], 2)
+        self.assertEqual(stats['usage'], {'calls': 4})
+        self.assertEqual(stats['prompt_tokens_per_call']['max'], 30)
+
+    def test_escalation_turn(self):
+        self.assertIsNone(escalation_turn([]))
+        self.assertEqual(escalation_turn([
+            {'role': 'supervisor', 'content': '[to supervisor] x'},
+            {'role': 'protagonist', 'content': '[to supervisor] y'},
+        ]), 2)
+
+
+class ResultSinkTest(unittest.TestCase):
+    def test_simulation_streams_runs_to_compressed_sink(self):
+        missing = {'description': 'd', 'content': 'c', 'max_attempts': 1}
+        with tempfile.TemporaryDirectory() as tmp:
+            sink = ResultSink(os.path.join(tmp, 'results.jsonl.gz'))
+            sim = Simulation(
+                load_roles(), missing,
+                protagonist_model='m', coworker_model='m', supervisor_model='m',
+                protagonist_temp=0.0, coworker_temp=0.0, supervisor_temp=0.0,
+                memory_file=os.path.join(tmp, 'mem.txt'),
+                output_file=os.path.join(tmp, 'out.json'),
+                sink=sink
+            )
+            for agent in sim.agents.values():
+                agent.evaluate = lambda conv: 'analysis'
+                agent.plan = types.MethodType(
+                    lambda self, conv, analysis: (
+                        json.dumps({'recipient': 'coworker', 'message': 'ask'})
+                        if self.role_key == 'protagonist' else 'deflect'
+                    ), agent)
+            summary = sim.run(3)
+            sink.close()
+            records = list(read_results(sink.path))
+            self.assertEqual([r['run'] for r in records], [1, 2, 3])
+            self.assertEqual(summary['outcomes'], {'moderate_failure': 3})
+            self.assertFalse(os.path.exists(os.path.join(tmp, 'out.json')))
+            self.assertFalse(os.path.exists(os.path.join(tmp, 'out_run1.json')))
+            with open(os.path.join(tmp, 'results.summary.json')) as f:
+                self.assertEqual(json.load(f)['runs'], 3)
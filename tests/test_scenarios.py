@@ -0,0 +1,154 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from difficult_coworker_bench.backends import LocalBackend
+from difficult_coworker_bench.events import EventLog
+from difficult_coworker_bench.results import ResultSink, merge_results, read_results
+from difficult_coworker_bench.scenarios import Shard, iter_scenarios
+from difficult_coworker_bench.simulation import Simulation, load_roles, validate_roles
+
+_INFO = {'description': 'd', 'content': 'key: abc', 'max_attempts': 1}
+
+
+def _write_library(path, scenarios):
+    with open(path, 'w') as f:
+        for scenario in scenarios:
+            f.write(json.dumps(scenario) + '\n')
+
+
+class LoadRolesTest(unittest.TestCase):
+    def test_default_roles_file(self):
+        roles = load_roles()
+        self.assertEqual(sorted(roles), ['coworker', 'protagonist', 'supervisor'])
+
+    def test_invalid_roles_are_rejected(self):
+        with self.assertRaises(ValueError):
+            validate_roles({'protagonist': {'name': 'P', 'description': 'p'}})
+        roles = load_roles()
+        roles['coworker'] = {'name': 'C'}
+        with self.assertRaises(ValueError):
+            validate_roles(roles)
+
+
+class ScenarioLibraryTest(unittest.TestCase):
+    def test_jsonl_library_is_read_lazily_with_role_overrides(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'lib.jsonl')
+            _write_library(path, [
+                {'id': 'a', 'missing_info': _INFO,
+                 'roles': {'coworker': {'description': 'An overworked coworker.'}}},
+                {'missing_info': _INFO},
+                'not a scenario',
+            ])
+            scenarios = iter_scenarios(path, load_roles())
+            first = next(scenarios)
+            self.assertEqual(first['id'], 'a')
+            self.assertEqual(first['roles']['coworker']['description'], 'An overworked coworker.')
+            self.assertEqual(first['roles']['coworker']['name'], load_roles()['coworker']['name'])
+            self.assertEqual(next(scenarios)['id'], 'line2')
+            # The invalid line is only reached on demand
+            with self.assertRaises(ValueError):
+                next(scenarios)
+
+    def test_directory_library_and_duplicate_ids(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, data in (('b.json', {'missing_info': _INFO}),
+                               ('a.json', {'id': 'b', 'missing_info': _INFO}),
+                               ('notes.txt', {})):
+                with open(os.path.join(tmp, name), 'w') as f:
+                    json.dump(data, f)
+            with self.assertRaisesRegex(ValueError, 'duplicate'):
+                list(iter_scenarios(tmp, load_roles()))
+
+    def test_invalid_scenarios_are_rejected(self):
+        roles = load_roles()
+        for scenario in ({'id': 'x y', 'missing_info': _INFO},
+                         {'id': 'x', 'missing_info': {'description': 'd'}},
+                         {'id': 'x', 'missing_info': _INFO, 'roles': {'boss': {}}}):
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, 'lib.jsonl')
+                _write_library(path, [scenario])
+                with self.assertRaises(ValueError):
+                    list(iter_scenarios(path, roles))
+
+
+class ShardTest(unittest.TestCase):
+    def test_shards_partition_the_matrix(self):
+        models = {'protagonist': 'm', 'coworker': 'm', 'supervisor': 'm'}
+        cells = [(s, {k: t for k in models}, i)
+                 for s in ('a', 'b', 'c') for t in (0.0, 0.7) for i in range(1, 21)]
+        owners = [
+            [n for n in range(1, 5) if Shard(n, 4).owns_run(s, models, temps, i)]
+            for s, temps, i in cells
+        ]
+        self.assertTrue(all(len(o) == 1 for o in owners))
+        self.assertEqual({o[0] for o in owners}, {1, 2, 3, 4})
+
+    def test_parse(self):
+        self.assertEqual(str(Shard.parse('2/3')), '2/3')
+        for spec in ('0/3', '4/3', '1', 'a/b'):
+            with self.assertRaises(ValueError):
+                Shard.parse(spec)
+
+
+class ShardedRunTest(unittest.TestCase):
+    def _run_shard(self, tmp, shard, runs):
+        sink = ResultSink(os.path.join(tmp, f"shard{shard.index}", 'a.jsonl'))
+        sim = Simulation(
+            load_roles(), dict(_INFO),
+            'm', 'm', 'm', 0.0, 0.0, 0.0,
+            os.path.join(tmp, 'mem.txt'), os.path.join(tmp, 'out.json'),
+            events=EventLog(console=False, memory=False), sink=sink,
+            backend=LocalBackend(), scenario='a', shard=shard
+        )
+        try:
+            sim.run(runs)
+        finally:
+            sink.close()
+        return [res['run'] for res in read_results(sink.path)]
+
+    def test_shard_outputs_merge_into_one_result_set(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            shards = [Shard(i, 3) for i in (1, 2, 3)]
+            ran = [self._run_shard(tmp, shard, 12) for shard in shards]
+            self.assertEqual(sorted(r for runs in ran for r in runs), list(range(1, 13)))
+            out = os.path.join(tmp, 'merged.jsonl')
+            # The first shard listed twice: its runs are kept once
+            summary = merge_results([tmp, os.path.join(tmp, 'shard1', 'a.jsonl')], out)
+            self.assertEqual(summary.runs, 12)
+            merged = list(read_results(out))
+            self.assertEqual({res['scenario'] for res in merged}, {'a'})
+            self.assertTrue(os.path.exists(os.path.join(tmp, 'merged.summary.json')))
+
+    def test_json_shard_outputs_merge(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            dirs = [os.path.join(tmp, f"s{i}") for i in (1, 2)]
+            for i, directory in enumerate(dirs, 1):
+                sim = Simulation(
+                    load_roles(), dict(_INFO), 'm', 'm', 'm', 0.0, 0.0, 0.0,
+                    os.path.join(directory, 'mem.txt'), os.path.join(directory, 'out.json'),
+                    events=EventLog(console=False, memory=False),
+                    backend=LocalBackend(), scenario='a', shard=Shard(i, 2)
+                )
+                sim.run(6)
+            out = os.path.join(tmp, 'merged.jsonl')
+            # Per-run files found in the shard directories
+            self.assertEqual(merge_results(dirs, out).runs, 6)
+            # The aggregated files named explicitly
+            aggregated = [os.path.join(d, 'out.json') for d in dirs]
+            self.assertEqual(merge_results(aggregated, out).runs, 6)
+            self.assertEqual(sorted(r['run'] for r in read_results(out)), list(range(1, 7)))
+            empty = os.path.join(tmp, 'empty')
+            os.mkdir(empty)
+            os.remove(out)
+            with self.assertRaisesRegex(ValueError, 'No runs found'):
+                merge_results([dirs[0], empty], out)
+            self.assertFalse(os.path.exists(out))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -105,4 +105,127 @@ class SimulationTest(unittest.TestCase):
         # Last message should be from protagonist with invalid recipient
         conv = result['conversation']
         self.assertEqual(conv[-1]['role'], 'protagonist')
-        self.assertIn('invalid', conv[-1]['content'])
\ No newline at end of file
+        self.assertEqual(conv[-1]['to'], 'invalid')
+        # The supervisor's addressee is kept too
+        self.assertEqual((conv[1]['role'], conv[1]['to'], conv[1]['text']),
+                         ('supervisor', 'protagonist', 'here'))
+
+    def test_malformed_plans_are_repaired_or_reasked(self):
+        missing = {'description': 'd', 'content': 'c', 'max_attempts': 1}
+        prot_plans = [
+            'Sure! ```json\n{"recipient": "coworker", "message": "ask"}\n```',
+            'I am not sure what to do.',
+        ]
+        sim = self._make_sim(missing, prot_plans, ['deflect'], [])
+        reasks = []
+
+        def _reask(self, conversation, reply):
+            reasks.append(reply)
+            return json.dumps({'recipient': 'coworker', 'message': 'ask again'})
+
+        sim.agents['protagonist'].reask = types.MethodType(_reask, sim.agents['protagonist'])
+        result = self._run(sim)
+        self.assertEqual(reasks, ['I am not sure what to do.'])
+        self.assertEqual(
+            [(m.get('to'), m['text'], m.get('phase')) for m in result['conversation']],
+            [('coworker', 'ask', None), (None, 'deflect', None), ('coworker', 'ask again', 'reask')])
+        # Per-turn usage is opt-in
+        self.assertFalse(any('usage' in m for m in result['conversation']))
+        self.assertEqual(result['usage']['plan_repairs'], 1)
+        self.assertEqual(result['usage']['plan_reasks'], 1)
+        self.assertEqual(result['usage']['plan_failures'], 0)
+
+    def test_plan_still_unparseable_after_reask_fails_the_run(self):
+        missing = {'description': 'd', 'content': 'c', 'max_attempts': 1}
+        sim = self._make_sim(missing, ['no plan'], [], [])
+        sim.agents['protagonist'].reask = lambda conversation, reply: 'still no plan'
+        result = self._run(sim)
+        self.assertEqual(result['outcome'], 'moderate_failure')
+        self.assertEqual(result['conversation'], [])
+        self.assertEqual(result['usage']['plan_failures'], 1)
+
+
+class ConcurrentRunTest(unittest.TestCase):
+    def test_concurrent_runs_write_per_run_files(self):
+        # Each run gets its own scripted responses and output file
+        missing = {'description': 'd', 'content': 'c', 'max_attempts': 1}
+        with tempfile.TemporaryDirectory() as tmp:
+            sim = Simulation(
+                load_roles(), missing,
+                protagonist_model='m', coworker_model='m', supervisor_model='m',
+                protagonist_temp=0.0, coworker_temp=0.0, supervisor_temp=0.0,
+                memory_file=os.path.join(tmp, 'mem.txt'),
+                output_file=os.path.join(tmp, 'out.json'),
+                concurrency=3
+            )
+
+            async def _aevaluate(conv):
+                return 'analysis'
+
+            async def _aplan(self, conv, analysis):
+                if self.role_key == 'protagonist':
+                    return json.dumps({'recipient': 'coworker', 'message': 'ask'})
+                return 'deflect'
+
+            for agent in sim.agents.values():
+                agent.aevaluate = _aevaluate
+                agent.aplan = types.MethodType(_aplan, agent)
+            results = sim.run(4)
+            self.assertEqual([r['run'] for r in results], [1, 2, 3, 4])
+            self.assertTrue(all(r['outcome'] == 'moderate_failure' for r in results))
+            for i in range(1, 5):
+                self.assertTrue(os.path.exists(os.path.join(tmp, f'out_run{i}.json')))
+                self.assertTrue(os.path.exists(os.path.join(tmp, f'mem_run{i}.txt')))
+            with open(os.path.join(tmp, 'out.json')) as f:
+                self.assertEqual(len(json.load(f)), 4)
+
+
+class FusedTurnTest(unittest.TestCase):
+    def test_fused_mode_makes_one_call_per_turn(self):
+        missing = {'description': 'd', 'content': 'c', 'max_attempts': 1}
+        sim = Simulation(
+            load_roles(), missing,
+            protagonist_model='m', coworker_model='m', supervisor_model='m',
+            protagonist_temp=0.0, coworker_temp=0.0, supervisor_temp=0.0,
+            memory_file='unused.mem', output_file='unused.out', fused=True, turn_usage=True
+        )
+        replies = {
+            'protagonist': {'recipient': 'coworker', 'message': 'ask'},
+            'coworker': 'deflect',
+        }
+
+        def _chat(self, messages):
+            content = json.dumps({'analysis': ['- point'], 'reply': replies[self.role_key]})
+            message = types.SimpleNamespace(content=content)
+            return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=None)
+
+        for agent in sim.agents.values():
+            agent._chat = types.MethodType(_chat, agent)
+        with tempfile.TemporaryDirectory() as tmp:
+            mem = os.path.join(tmp, 'mem.txt')
+            result = sim.run_once(1, mem, os.path.join(tmp, 'out.json'))
+            with open(mem) as f:
+                log = f.read()
+        self.assertEqual(result['outcome'], 'moderate_failure')
+        self.assertEqual(result['conversation'], [
+            {'role': 'protagonist', 'text': 'ask', 'to': 'coworker',
+             'usage': {'calls': 1, 'prompt_tokens': 0, 'completion_tokens': 0}},
+            {'role': 'coworker', 'text': 'deflect',
+             'usage': {'calls': 1, 'prompt_tokens': 0, 'completion_tokens': 0}},
+            {'role': 'protagonist', 'text': 'ask', 'to': 'coworker',
+             'usage': {'calls': 1, 'prompt_tokens': 0, 'completion_tokens': 0}},
+        ])
+        # Both parts of each turn are still logged
+        self.assertIn('[Protagonist analysis]: - point', log)
+        self.assertIn('[Coworker analysis]: - point', log)
+        self.assertEqual(result['usage']['calls'], 3)
+        self.assertEqual(result['usage']['fused_turns'], 3)
+        self.assertGreater(result['usage']['two_phase_prompt_chars'], 0)
+
+    def test_unparseable_fused_reply_is_treated_as_raw_plan(self):
+        from difficult_coworker_bench.agent import Agent
+        self.assertEqual(Agent._parse_turn('not json'), ('', 'not json'))
+        self.assertEqual(
+            Agent._parse_turn('{"analysis": "a", "reply": {"recipient": "coworker", "message": "m"}}'),
+            ('a', '{"recipient": "coworker", "message": "m"}')
+        )
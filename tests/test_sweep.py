@@ -0,0 +1,85 @@
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+CLI = os.path.join(ROOT, 'src', 'difficult_coworker_bench', 'cli.py')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+from difficult_coworker_bench.ratelimit import RateLimiter, SharedBudget
+from difficult_coworker_bench.results import read_results
+from difficult_coworker_bench.sweep import expand_grid, parse_values, run_sweep
+
+
+def _drain(bucket, amount, out):
+    out.put(bucket.reserve(amount))
+
+
+class GridTest(unittest.TestCase):
+    def test_parse_values(self):
+        self.assertEqual(parse_values('a, b'), ['a', 'b'])
+        self.assertEqual(parse_values('0:1:0.25,1.5', float), [0.0, 0.25, 0.5, 0.75, 1.0, 1.5])
+        for spec in ('', '1:0:0.5', '0:1:0', '0:1'):
+            with self.assertRaises(ValueError):
+                parse_values(spec, float)
+
+    def test_expand_grid(self):
+        cells = expand_grid(
+            {'protagonist': ['a', 'b'], 'coworker': ['c'], 'supervisor': ['s']},
+            {'protagonist': [0.0], 'coworker': [0.0, 0.7], 'supervisor': [0.7]},
+        )
+        self.assertEqual([c['id'] for c in cells], ['cell001', 'cell002', 'cell003', 'cell004'])
+        self.assertEqual(cells[1]['models'], {'protagonist': 'a', 'coworker': 'c', 'supervisor': 's'})
+        self.assertEqual(cells[1]['temperatures']['coworker'], 0.7)
+
+
+class SharedBudgetTest(unittest.TestCase):
+    def test_processes_draw_on_one_budget(self):
+        budget = SharedBudget(['m'], rpm=60)
+        bucket, _ = budget.buckets['m']
+        out = multiprocessing.Queue()
+        proc = multiprocessing.Process(target=_drain, args=(bucket, 60, out))
+        proc.start()
+        self.assertEqual(out.get(timeout=10), 0.0)
+        proc.join()
+        # The child emptied the shared bucket: a request here has to wait
+        limiter = RateLimiter(budget=budget).for_model('m')
+        self.assertIs(limiter.requests, bucket)
+        self.assertGreater(limiter.reserve(0), 0.5)
+        self.assertIsNone(RateLimiter(budget=budget).for_model('other').requests)
+
+
+class SweepTest(unittest.TestCase):
+    def test_cells_merge_into_one_indexed_result_set(self):
+        cells = expand_grid(
+            {'protagonist': ['a', 'b'], 'coworker': ['c'], 'supervisor': ['s']},
+            {'protagonist': [0.0], 'coworker': [0.0], 'supervisor': [0.0]},
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = os.path.join(tmp, 'sweep')
+            cache = os.path.join(tmp, 'cache.db')
+            index = run_sweep(cells, ['--runs', '2', '--backend', 'local', '--cache-file', cache],
+                              directory, workers=2, budget=SharedBudget(['a', 'b', 'c', 's'], rpm=6000),
+                              progress=lambda line: None)
+            self.assertEqual(index['failed'], {})
+            self.assertEqual(index['runs'], 4)
+            self.assertEqual([e['runs'] for e in index['cells']], [2, 2])
+            merged = list(read_results(index['results']))
+            self.assertEqual(sorted((r['cell'], r['run']) for r in merged),
+                             [('cell001', 1), ('cell001', 2), ('cell002', 1), ('cell002', 2)])
+            self.assertEqual({r['models']['protagonist'] for r in merged if r['cell'] == 'cell002'}, {'b'})
+            with open(os.path.join(tmp, 'sweep.index.json')) as f:
+                self.assertEqual(json.load(f)['cells'][0]['id'], 'cell001')
+
+    def test_cli_rejects_per_cell_options(self):
+        proc = subprocess.run([sys.executable, CLI, 'sweep', '--results-jsonl', 'x.jsonl', '--dry-run'],
+                              capture_output=True, text=True)
+        self.assertEqual(proc.returncode, 2)
+        self.assertIn('not available in a sweep: --results-jsonl', proc.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from difficult_coworker_bench.results import escalation_turn
+from difficult_coworker_bench.turns import Role, Turn, as_turns, recipient_of
+
+
+class TurnTest(unittest.TestCase):
+    def test_compact_record_with_interned_roles(self):
+        turn = Turn(1, 'protagonist', 'hi', 'coworker')
+        self.assertFalse(hasattr(turn, '__dict__'))
+        self.assertIs(turn.role, Role.PROTAGONIST)
+        self.assertIs(turn.recipient, Role.COWORKER)
+        # Recipients outside the roles are interned strings
+        other = Turn(2, 'protagonist', 'x', ''.join(['h', 'r']))
+        self.assertIs(other.recipient, Turn(3, 'protagonist', 'y', 'hr').recipient)
+
+    def test_rendering_keeps_the_routing_prefix(self):
+        turn = Turn(1, 'protagonist', 'hi', 'supervisor')
+        self.assertEqual(turn.content, '[to supervisor] hi')
+        # Rendered on demand, not stored
+        self.assertNotIn('_content', Turn.__slots__)
+        # Only the protagonist's messages are rendered with their recipient
+        self.assertEqual(Turn(2, 'supervisor', 'ok', 'protagonist').content, 'ok')
+        self.assertEqual(Turn(3, 'coworker', 'no').content, 'no')
+
+    def test_dict_round_trip(self):
+        turn = Turn(4, 'supervisor', 'forward', 'coworker', 'reask',
+                    {'calls': 2, 'prompt_tokens': 10, 'completion_tokens': 3})
+        entry = json.loads(json.dumps(turn.as_dict()))
+        self.assertEqual(entry, {'role': 'supervisor', 'text': 'forward',
+                                 'to': 'coworker', 'phase': 'reask',
+                                 'usage': {'calls': 2, 'prompt_tokens': 10, 'completion_tokens': 3}})
+        again = Turn.from_dict(entry, 4)
+        self.assertEqual((again.index, again.role, again.recipient, again.text, again.phase),
+                         (4, Role.SUPERVISOR, Role.COWORKER, 'forward', 'reask'))
+        self.assertEqual(Turn(5, 'coworker', 'no').as_dict(), {'role': 'coworker', 'text': 'no'})
+
+    def test_stored_turns_stay_the_size_of_legacy_messages(self):
+        turns = [Turn(1, 'protagonist', 'Could you send me the configuration?', 'coworker'),
+                 Turn(2, 'coworker', 'Lovely weather today.'),
+                 Turn(3, 'protagonist', 'The coworker will not share it.', 'supervisor'),
+                 Turn(4, 'supervisor', 'Please ask again.', 'protagonist')]
+        stored = json.dumps([t.as_dict() for t in turns])
+        legacy = json.dumps([{'role': str(t.role), 'content': t.content} for t in turns])
+        # Only the routing moved out of the text (and the supervisor's,
+        # which legacy messages dropped, is kept): about the same size
+        self.assertLess(len(stored), 1.1 * len(legacy))
+        self.assertEqual([t.content for t in as_turns(json.loads(stored))],
+                         [t.content for t in turns])
+
+    def test_legacy_entries_are_parsed(self):
+        legacy = [{'role': 'protagonist', 'content': '[to supervisor] help'},
+                  {'role': 'supervisor', 'content': '[to nobody] literal'}]
+        turns = as_turns(legacy)
+        self.assertEqual([(t.index, t.recipient, t.text) for t in turns],
+                         [(1, Role.SUPERVISOR, 'help'), (2, None, '[to nobody] literal')])
+        self.assertEqual([t.content for t in turns], [e['content'] for e in legacy])
+        self.assertEqual([recipient_of(e) for e in legacy], ['supervisor', None])
+
+    def test_escalation_turn_reads_both_formats(self):
+        turns = [Turn(1, 'protagonist', 'a', 'coworker'), Turn(2, 'coworker', 'no'),
+                 Turn(3, 'protagonist', 'b', 'supervisor')]
+        self.assertEqual(escalation_turn([t.as_dict() for t in turns]), 3)
+        self.assertEqual(escalation_turn([{'role': 'protagonist', 'content': t.content}
+                                          for t in turns]), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+CLI = os.path.join(ROOT, 'src', 'difficult_coworker_bench', 'cli.py')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+from difficult_coworker_bench.backends import LocalBackend
+from difficult_coworker_bench.events import EventLog
+from difficult_coworker_bench.results import read_results
+from difficult_coworker_bench.simulation import Simulation, load_roles
+from difficult_coworker_bench.workqueue import WorkQueue, run_worker
+
+
+def _config(runs=3, scenario=None, temperature=0.0):
+    missing = {'description': 'd', 'content': 'c', 'max_attempts': 2}
+    sim = Simulation(
+        load_roles(), missing, 'm', 'm', 'm', temperature, 0.0, 0.0,
+        'unused.mem', 'unused.out', scenario=scenario, backend=LocalBackend()
+    )
+    return sim.config(runs)
+
+
+class WorkQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'job.db')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_enqueue_is_idempotent_per_cell_and_run(self):
+        queue = WorkQueue(self.path)
+        self.assertEqual(queue.enqueue(_config(3)), 3)
+        self.assertEqual(queue.enqueue(_config(5)), 2)
+        self.assertEqual(queue.enqueue(_config(2, temperature=0.5)), 2)
+        self.assertEqual(queue.counts()['queued'], 7)
+
+    def test_claim_complete_and_lost_lease(self):
+        queue = WorkQueue(self.path, lease=0.05)
+        queue.enqueue(_config(1))
+        item = queue.claim('a')
+        self.assertEqual((item['run'], item['claims']), (1, 1))
+        self.assertIsNone(queue.claim('b'))
+        time.sleep(0.1)
+        # a's lease expired: b takes the item over and a can no longer store it
+        again = queue.claim('b')
+        self.assertEqual((again['id'], again['claims']), (item['id'], 2))
+        self.assertFalse(queue.heartbeat(item['id'], 'a'))
+        self.assertFalse(queue.complete(item['id'], 'a', {'run': 1, 'by': 'a'}))
+        self.assertTrue(queue.complete(item['id'], 'b', {'run': 1, 'by': 'b'}))
+        self.assertEqual(list(queue.results()), [{'run': 1, 'by': 'b'}])
+        self.assertFalse(queue.pending())
+
+    def test_heartbeat_keeps_the_lease(self):
+        queue = WorkQueue(self.path, lease=0.1)
+        queue.enqueue(_config(1))
+        item = queue.claim('a')
+        for _ in range(4):
+            time.sleep(0.05)
+            self.assertTrue(queue.heartbeat(item['id'], 'a'))
+        self.assertIsNone(queue.claim('b'))
+
+    def test_items_fail_after_max_claims(self):
+        queue = WorkQueue(self.path, lease=0.05, max_claims=2)
+        queue.enqueue(_config(2, scenario='s1'))
+        first = queue.claim('a')
+        queue.release(first['id'], 'a', 'RuntimeError: boom')
+        self.assertEqual(queue.counts()['queued'], 2)
+        self.assertEqual(queue.claim('a')['id'], first['id'])
+        time.sleep(0.1)
+        # Expired after its second claim: given up, the next item is claimed
+        self.assertEqual(queue.claim('b')['run'], 2)
+        self.assertEqual(queue.counts()['failed'], 1)
+        self.assertEqual(queue.failures(), [('s1', 1, 'lease expired 2 time(s)')])
+
+
+class RunWorkerTest(unittest.TestCase):
+    def test_workers_drain_the_job_without_duplicates(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'job.db')
+            queue = WorkQueue(path)
+            queue.enqueue(_config(6))
+            queue.enqueue(_config(4, temperature=0.5))
+            backend = LocalBackend(latency=0.002)
+
+            def simulation(config):
+                events = EventLog(None, console=False, memory=False)
+                return Simulation.from_config(config, 'unused.mem', 'unused.out',
+                                              backend=backend, events=events)
+
+            stats = {}
+
+            def work(name):
+                stats[name] = run_worker(WorkQueue(path), simulation, worker=name,
+                                         progress=lambda *_: None)
+
+            threads = [threading.Thread(target=work, args=(f"w{i}",)) for i in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(sum(s['completed'] for s in stats.values()), 10)
+            keys = sorted((r['temperatures']['protagonist'], r['run']) for r in queue.results())
+            self.assertEqual(keys, sorted([(0.0, i) for i in range(1, 7)] + [(0.5, i) for i in range(1, 5)]))
+            self.assertEqual(queue.counts()['done'], 10)
+
+    def test_failed_runs_are_released(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            queue = WorkQueue(os.path.join(tmp, 'job.db'), max_claims=2)
+            queue.enqueue(_config(1))
+
+            def simulation(config):
+                raise RuntimeError('no backend')
+
+            stats = run_worker(queue, simulation, worker='a', progress=lambda *_: None)
+            self.assertEqual(stats, {'completed': 0, 'released': 2, 'lost': 0})
+            self.assertEqual(queue.counts()['failed'], 1)
+
+
+class WorkerCommandTest(unittest.TestCase):
+    def _cli(self, *args, cwd):
+        return subprocess.run([sys.executable, CLI, *args], cwd=cwd, capture_output=True,
+                              text=True, check=True).stdout
+
+    def test_enqueue_work_and_export(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            out = self._cli('--runs', '3', '--enqueue', 'job.db', cwd=tmp)
+            self.assertIn('Enqueued 3 run(s) of 1 cell(s)', out)
+            out = self._cli('worker', 'job.db', '--backend', 'local', '--quiet', '--worker-id', 'w1',
+                            cwd=tmp)
+            self.assertIn('Worker w1: 3 run(s) completed', out)
+            out = self._cli('worker', 'job.db', '--export', 'results.jsonl', cwd=tmp)
+            self.assertIn('0 queued, 0 leased, 3 done, 0 failed', out)
+            runs = sorted(r['run'] for r in read_results(os.path.join(tmp, 'results.jsonl')))
+            self.assertEqual(runs, [1, 2, 3])
+            self.assertFalse(os.path.exists(os.path.join(tmp, 'outputs')))
+
+    def test_worker_rejects_cell_options(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self._cli('--enqueue', 'job.db', cwd=tmp)
+            proc = subprocess.run([sys.executable, CLI, 'worker', 'job.db', '--runs', '2'],
+                                  cwd=tmp, capture_output=True, text=True)
+            self.assertNotEqual(proc.returncode, 0)
+            self.assertIn('--runs', proc.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()